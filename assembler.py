@@ -4,13 +4,312 @@ RISC-V 32-bit Assembler - VERSIÓN CORREGIDA
 Convierte código assembly RISC-V a código máquina binario y hexadecimal
 """
 
+import io
+import os
 import re
 import sys
+import glob
+import json
+import time
+import struct
+import hashlib
 import argparse
-from typing import Dict, List, Tuple, Optional
+import tempfile
+import tracemalloc
+from collections import Counter
+from itertools import accumulate, chain, repeat
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager, redirect_stdout
+from array import array
+from preprocessor import Preprocessor, PreprocessorError
+from debuginfo import DebugInfo, build_debug_info, write_debug_info
+from hazards import HazardReport, analyze_hazards, schedule_instructions
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Set, Tuple, Optional, Union
 
-class RISCVAssembler:
+__version__ = '1.2.0'
+
+# Formatos de salida generados por defecto (ver OUTPUT_FORMATS)
+DEFAULT_FORMATS = ('bin', 'hex', 'txt')
+
+# Instrucciones que acumula assemble_stream antes de pasarlas a los sinks
+STREAM_BLOCK = 4096
+
+# Operandos %hi(label) / %lo(label) y sus variantes relativas al PC
+RELOCATION_PATTERN = re.compile(r'^%(hi|lo|pcrel_hi|pcrel_lo)\((.+)\)$')
+
+# Operando de memoria cuyo offset es un nombre: label(reg)
+MEMORY_LABEL_PATTERN = re.compile(r'^([A-Za-z_]\w*)\((\w+)\)$')
+
+# Tipos de instrucción cuyo tamaño decide la relajación (ver relax); RELAX_ALIGN
+# es un '.align' en .text, cuyo relleno depende de la dirección
+RELAX_LA, RELAX_CALL, RELAX_TAIL, RELAX_BRANCH, RELAX_ALIGN = range(5)
+
+# Sitio de un label que (todavía) no está definido en .text (ver _scan_relaxation_sites)
+RELAX_UNDEFINED = 0xFFFFFFFF
+
+# Las memos (ver RISCVAssembler.__init__) se revisan cada MEMO_PROBE fallos:
+# si desde el inicio del ensamblado aciertan menos de MEMO_MIN_HIT_RATE de
+# las consultas, se desactivan hasta el siguiente ensamblado
+MEMO_PROBE = 4096
+MEMO_MIN_HIT_RATE = 0.25
+
+# Dirección base por defecto de la sección .data
+DATA_BASE = 0x10000000
+
+# Directivas que emiten bytes en la sección .data
+DATA_DIRECTIVES = frozenset({'.word', '.byte', '.space', '.incbin'})
+
+# Instrucciones RV32C: mnemónico -> (formato de operandos, palabra base de 16
+# bits con op, funct3 y demás bits fijos)
+COMPRESSED_INSTRUCTIONS = {
+    'c.addi4spn': ('CIW', 0x0000),
+    'c.lw': ('CL', 0x4000),
+    'c.sw': ('CL', 0xC000),
+    'c.nop': ('C0', 0x0001),
+    'c.addi': ('CI', 0x0001),
+    'c.jal': ('CJ', 0x2001),
+    'c.li': ('CI', 0x4001),
+    'c.addi16sp': ('CI16SP', 0x6101),
+    'c.lui': ('CLUI', 0x6001),
+    'c.srli': ('CBSHIFT', 0x8001),
+    'c.srai': ('CBSHIFT', 0x8401),
+    'c.andi': ('CBANDI', 0x8801),
+    'c.sub': ('CA', 0x8C01),
+    'c.xor': ('CA', 0x8C21),
+    'c.or': ('CA', 0x8C41),
+    'c.and': ('CA', 0x8C61),
+    'c.j': ('CJ', 0xA001),
+    'c.beqz': ('CB', 0xC001),
+    'c.bnez': ('CB', 0xE001),
+    'c.slli': ('CSHIFT', 0x0002),
+    'c.lwsp': ('CLWSP', 0x4002),
+    'c.jr': ('CR1', 0x8002),
+    'c.mv': ('CR', 0x8002),
+    'c.ebreak': ('C0', 0x9002),
+    'c.jalr': ('CR1', 0x9002),
+    'c.add': ('CR', 0x9002),
+    'c.swsp': ('CSS', 0xC002),
+}
+
+# Instrucciones comprimidas cuyo offset depende de la distancia a un label
+COMPRESSED_JUMPS = frozenset({'c.j', 'c.jal', 'c.beqz', 'c.bnez'})
+
+# Condición opuesta de cada branch, para saltar por encima de un jal
+INVERTED_BRANCHES = {'beq': 'bne', 'bne': 'beq', 'blt': 'bge', 'bge': 'blt', 'bltu': 'bgeu', 'bgeu': 'bltu'}
+
+def hi20(addr: int) -> int:
+    """20 bits superiores de una dirección, redondeados para compensar el signo de lo12"""
+    return ((addr + 0x800) >> 12) & 0xFFFFF
+
+
+def lo12(addr: int) -> int:
+    """12 bits inferiores de una dirección, con signo"""
+    lower = addr & 0xFFF
+    return lower - 0x1000 if lower >= 0x800 else lower
+
+
+def branch_immediate(offset: int) -> int:
+    """Campos de inmediato de una instrucción tipo B para un offset relativo al PC"""
+    if offset % 2 != 0:
+        raise ValueError("Offset de branch debe ser par")
+    
+    if offset < -4096 or offset > 4094:
+        raise ValueError(f"Offset de branch fuera de rango: {offset}")
+    
+    # Codificar offset en formato B (13 bits, bit 0 siempre es 0)
+    offset = offset & 0x1FFE
+    
+    imm_12 = (offset >> 12) & 0x1
+    imm_10_5 = (offset >> 5) & 0x3F
+    imm_4_1 = (offset >> 1) & 0xF
+    imm_11 = (offset >> 11) & 0x1
+    
+    return (imm_12 << 31) | (imm_10_5 << 25) | (imm_4_1 << 8) | (imm_11 << 7)
+
+
+def jump_immediate(offset: int) -> int:
+    """Campos de inmediato de una instrucción tipo J para un offset relativo al PC"""
+    if offset % 2 != 0:
+        raise ValueError("Offset de jump debe ser par")
+    
+    if offset < -1048576 or offset > 1048574:
+        raise ValueError(f"Offset de jump fuera de rango: {offset}")
+    
+    # Codificar offset en formato J
+    offset = offset & 0x1FFFFE
+    
+    imm_20 = (offset >> 20) & 0x1
+    imm_10_1 = (offset >> 1) & 0x3FF
+    imm_11 = (offset >> 11) & 0x1
+    imm_19_12 = (offset >> 12) & 0xFF
+    
+    return (imm_20 << 31) | (imm_19_12 << 12) | (imm_11 << 20) | (imm_10_1 << 21)
+
+
+def cj_immediate(offset: int) -> int:
+    """Campos de inmediato de c.j / c.jal (formato CJ) para un offset relativo al PC"""
+    if offset % 2 != 0:
+        raise ValueError("Offset de jump debe ser par")
+    
+    if offset < -2048 or offset > 2046:
+        raise ValueError(f"Offset de jump comprimido fuera de rango: {offset}")
+    
+    # Bits 12..2 = offset[11|4|9:8|10|6|7|3:1|5]
+    offset &= 0xFFE
+    return (((offset >> 11) & 0x1) << 12 | ((offset >> 4) & 0x1) << 11 | ((offset >> 8) & 0x3) << 9
+            | ((offset >> 10) & 0x1) << 8 | ((offset >> 6) & 0x1) << 7 | ((offset >> 7) & 0x1) << 6
+            | ((offset >> 1) & 0x7) << 3 | ((offset >> 5) & 0x1) << 2)
+
+
+def cb_immediate(offset: int) -> int:
+    """Campos de inmediato de c.beqz / c.bnez (formato CB) para un offset relativo al PC"""
+    if offset % 2 != 0:
+        raise ValueError("Offset de branch debe ser par")
+    
+    if offset < -256 or offset > 254:
+        raise ValueError(f"Offset de branch comprimido fuera de rango: {offset}")
+    
+    # Bits 12..10 = offset[8|4:3], bits 6..2 = offset[7:6|2:1|5]
+    offset &= 0x1FE
+    return (((offset >> 8) & 0x1) << 12 | ((offset >> 3) & 0x3) << 10 | ((offset >> 6) & 0x3) << 5
+            | ((offset >> 1) & 0x3) << 3 | ((offset >> 5) & 0x1) << 2)
+
+
+def mixed_bytes(codes: Sequence[int], sizes: Sequence[int]) -> bytes:
+    """Imagen little-endian de instrucciones de 2 y 4 bytes (RV32C)"""
+    return b''.join([code.to_bytes(size, byteorder='little') for code, size in zip(codes, sizes)])
+
+
+class AssemblyError(ValueError):
+    """
+    Error de ensamblado con su ubicación: la línea de origen (archivo, línea y
+    macro/.rept tras el preprocesador) o la dirección de la instrucción
+    """
+    
+    def __init__(self, message: str, line: Optional[int] = None, address: Optional[int] = None,
+                 filename: Optional[str] = None, context: Optional[str] = None,
+                 location: Optional[str] = None):
+        if location is None and address is not None:
+            location = f"dirección 0x{address:08x}"
+        super().__init__(f"Error en {location}: {message}" if location else message)
+        self.message = message
+        self.line = line
+        self.address = address
+        self.filename = filename
+        self.context = context
+
+
+class AssemblyResult:
+    """
+    Resultado de RISCVAssembler.assemble:
+    - code: palabras de 32 bits (array 'I') desde la dirección 0
+    - labels: label -> dirección
+    - parsed_lines: instrucción real de cada palabra
+    - data: imagen de la sección .data, que empieza en data_base
+    - debug_info: tablas de líneas y símbolos (con assemble(..., debug=True))
+    - sizes: bytes de cada instrucción (2 o 4) si se comprimió (RV32C), o None
+    """
+    
+    def __init__(self, code: array, labels: Dict[str, int],
+                 parsed_lines: List[Tuple[Optional[str], str, List[str]]],
+                 data: bytes = b'', data_base: int = DATA_BASE,
+                 debug_info: Optional[DebugInfo] = None, sizes: Optional[bytes] = None):
+        self.code = code
+        self.labels = labels
+        self.parsed_lines = parsed_lines
+        self.data = data
+        self.data_base = data_base
+        self.debug_info = debug_info
+        self.sizes = sizes
+    
+    @property
+    def binary(self) -> bytes:
+        """Código en binario little-endian, igual que el archivo .bin"""
+        if self.sizes is not None:
+            return mixed_bytes(self.code, self.sizes)
+        words = self.code
+        if sys.byteorder == 'big':
+            words = array('I', words)
+            words.byteswap()
+        return words.tobytes()
+    
+    @property
+    def listing(self) -> List[str]:
+        """Texto de cada instrucción ('addi x1, x0, 10')"""
+        return [f"{instruction} {', '.join(operands)}" for _, instruction, operands in self.parsed_lines]
+    
+    def render(self, name: str) -> Union[bytes, str]:
+        """Contenido del archivo de salida del formato `name` (ver OUTPUT_FORMATS), sin escribirlo"""
+        _, mode, sink_class, _ = OUTPUT_FORMATS[name]
+        f = io.BytesIO() if 'b' in mode else io.StringIO()
+        sink = sink_class(f)
+        sink.begin(self.labels)
+        sink.write_many(0, self.code, self.parsed_lines, self.sizes)
+        sink.finish()
+        return f.getvalue()
+
+
+class AssemblyStats:
+    """
+    Estadísticas de un ensamblado: segundos por fase (first_pass y sus
+    subfases, peephole, second_pass, cada formato de salida como write.<fmt>),
+    líneas e instrucciones procesadas y, con profile=True en assemble_file,
+    el histograma de mnemónicos y el pico de memoria medido con tracemalloc.
+    """
+    
     def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.lines = 0
+        self.instructions = 0
+        self.total_seconds = 0.0
+        self.histogram: Dict[str, int] = {}
+        self.peak_memory: Optional[int] = None
+    
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+    
+    @contextmanager
+    def phase(self, name: str):
+        """Acumula en `name` el tiempo del bloque with"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+    
+    def to_dict(self) -> Dict:
+        total = self.total_seconds
+        return {
+            'version': __version__,
+            'phases': self.phases,
+            'total_seconds': total,
+            'lines': self.lines,
+            'instructions': self.instructions,
+            'lines_per_second': self.lines / total if total else 0.0,
+            'instructions_per_second': self.instructions / total if total else 0.0,
+            'histogram': dict(sorted(self.histogram.items(), key=lambda item: -item[1])),
+            'peak_memory_bytes': self.peak_memory,
+            # Con tracemalloc activo los tiempos son varias veces mayores
+            'tracemalloc': self.peak_memory is not None,
+        }
+    
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+    
+    def summary(self) -> List[str]:
+        """Resumen legible, una línea por fase"""
+        rows = [f"  {name:<20} {seconds * 1000:10.1f} ms" for name, seconds in self.phases.items()]
+        data = self.to_dict()
+        rows.append(f"  {'total':<20} {self.total_seconds * 1000:10.1f} ms  "
+                    f"({data['lines_per_second']:,.0f} líneas/s, {data['instructions_per_second']:,.0f} instrucciones/s)")
+        if self.peak_memory is not None:
+            rows.append(f"  {'pico de memoria':<20} {self.peak_memory / (1024 * 1024):10.1f} MB  "
+                        f"(tiempos medidos con tracemalloc activo)")
+        return rows
+
+
+class RISCVAssembler:
+    def __init__(self, memo_size: int = 65536):
         # Mapeo de registros
         self.registers = {
             'x0': 0, 'x1': 1, 'x2': 2, 'x3': 3, 'x4': 4, 'x5': 5, 'x6': 6, 'x7': 7,
@@ -92,8 +391,76 @@ class RISCVAssembler:
             'j', 'jr', 'ret', 'call', 'tail', 'li', 'la'
         }
         
+        # Branches (reales y pseudo) -> número de operandos, para la relajación
+        self._branch_arity = {name: 3 for name, info in self.instructions.items() if info['type'] == 'B'}
+        self._branch_arity.update({name: 2 for name in ('beqz', 'bnez', 'blez', 'bgez', 'bltz', 'bgtz')})
+        
+        # Tabla de codificación precompilada: mnemónico -> (codificador, palabra base)
+        self.encoding_table = self._build_encoding_table()
+        
+        # Instrucciones comprimidas (RV32C), con su propia tabla: sólo las
+        # codifica second_pass tras compress (ver instruction_sizes)
+        self.compressed_table = self._build_compressed_table()
+
+        # Índice inverso para decodificar: (opcode, funct3, extra) -> mnemónico
+        self.decode_index, self._decode_imm_opcodes = self._build_decode_index()
+
         self.labels = {}  # Para almacenar labels y sus direcciones
         self.current_address = 0
+        
+        # Código reubicable (archivos objeto): 'la' siempre como lui + addi con %hi/%lo
+        self.relocatable = False
+        
+        # Secciones y directivas: constantes de .equ, imagen de .data (a partir
+        # de data_base), labels de .data, relleno de cada '.align' en .text
+        # (índice de la instrucción alineada -> (límite en bytes, nops)) y
+        # directorio desde el que se resuelven las rutas de .incbin
+        self.constants: Dict[str, int] = {}
+        self.data_base = DATA_BASE
+        self.data_image = bytearray()
+        self.data_labels = set()
+        self.text_alignments: Dict[int, Tuple[int, int]] = {}
+        self.source_dir = ''
+        
+        # Preprocesador de la ejecución en curso (.include, .macro, .rept) y
+        # nombre del fuente principal, para el origen de cada línea en los errores
+        self.preprocessor: Optional[Preprocessor] = None
+        self.source_name: Optional[str] = None
+        
+        # Línea generada (numeración del preprocesador) de cada instrucción de
+        # parsed_lines; peephole la mantiene al eliminar instrucciones
+        self.line_table = array('I')
+        
+        # RV32C: first_pass reserva 4 bytes por instrucción; compress fija el
+        # tamaño real (2 o 4) de cada una en instruction_sizes (None si no se
+        # comprimió) y deja el resumen en compress_stats
+        self.has_compressed = False
+        self.instruction_sizes: Optional[bytearray] = None
+        self.compress_stats: Dict[str, int] = {}
+        
+        # Tamaño mínimo (en instrucciones) para codificar en paralelo en second_pass
+        self.parallel_threshold = 100000
+        
+        # Memoización acotada de líneas repetidas: línea -> tokens, y
+        # (mnemónico, operandos) -> palabra para instrucciones que no dependen
+        # de la dirección (todo salvo branches y jal). Son dicts que se vacían
+        # al llenarse, y cada una se desactiva durante el resto del ensamblado
+        # si casi no acierta (ver MEMO_PROBE). memo_size=0 las desactiva.
+        self.memo_size = memo_size
+        self._line_memo: Dict[str, Tuple[Optional[str], str, List[str]]] = {}
+        self._word_memo: Dict[Tuple[str, ...], int] = {}
+        self._memoizable = frozenset(
+            name for name, info in self.instructions.items() if info['type'] not in ('B', 'J')
+        ) if memo_size > 0 else frozenset()
+        self._memo_mnemonics = self._memoizable
+        self._line_memo_active = memo_size > 0
+        self.memo_stats = {'line_hits': 0, 'line_misses': 0, 'word_hits': 0, 'word_misses': 0}
+        self._memo_start = dict(self.memo_stats)
+        self.peephole_stats: Dict[str, int] = {}
+        self.schedule_stats: Dict[str, int] = {}
+        
+        # Tiempos por fase y contadores del último assemble_file (ver AssemblyStats)
+        self.stats = AssemblyStats()
 
     def parse_immediate(self, imm_str: str) -> int:
         """Convierte string de inmediato a entero"""
@@ -105,6 +472,9 @@ class RISCVAssembler:
         if not imm_str:
             return 0
         
+        if imm_str.startswith('%'):
+            return self.resolve_relocation(imm_str)
+        
         try:
             if imm_str.startswith('0x') or imm_str.startswith('0X'):
                 return int(imm_str, 16)
@@ -115,8 +485,56 @@ class RISCVAssembler:
             else:
                 return int(imm_str)
         except ValueError:
+            if imm_str in self.constants:
+                return self.constants[imm_str]
             raise ValueError(f"Inmediato inválido: '{imm_str}'")
 
+    def resolve_relocation(self, operand: str) -> int:
+        """
+        Evalúa %hi(label) y %lo(label): los 20 bits superiores (redondeados
+        para compensar el signo de %lo) y los 12 inferiores con signo.
+        %pcrel_hi(label) y %pcrel_lo(label) hacen lo mismo con la distancia al
+        label desde el auipc: el de %pcrel_hi, y en %pcrel_lo el de la
+        instrucción anterior (la pareja auipc + jalr/addi va siempre seguida)
+        """
+        match = RELOCATION_PATTERN.match(operand)
+        if not match:
+            raise ValueError(f"Inmediato inválido: '{operand}'")
+        
+        kind, label = match.group(1), match.group(2).strip()
+        if label not in self.labels:
+            raise ValueError(f"Label no definido: {label}")
+        
+        addr = self.labels[label]
+        if kind == 'hi':
+            return hi20(addr)
+        if kind == 'lo':
+            return lo12(addr)
+        if kind == 'pcrel_hi':
+            return hi20(addr - self.current_address)
+        return lo12(addr - (self.current_address - 4))
+
+    def label_reference(self, instruction: str, operands: List[str]) -> Optional[str]:
+        """Label del que depende la codificación de una instrucción real, si lo hay"""
+        kind = self.instructions[instruction]['type']
+        if kind == 'B':
+            return operands[2] if len(operands) == 3 and operands[2][:1] != '.' else None
+        if kind == 'J':
+            return operands[-1] if 1 <= len(operands) <= 2 and operands[-1][:1] != '.' else None
+        if operands and operands[-1].startswith('%'):
+            match = RELOCATION_PATTERN.match(operands[-1])
+            return match.group(2).strip() if match else None
+        return None
+
+    def memory_label(self, operands: List[str]) -> Optional[str]:
+        """Label usado como offset en un operando de memoria label(reg), si lo hay"""
+        if not operands:
+            return None
+        match = MEMORY_LABEL_PATTERN.match(operands[-1].strip())
+        if match is None or match.group(1) in self.constants:
+            return None
+        return match.group(1)
+
     def get_register_number(self, reg: str) -> int:
         """Convierte nombre de registro a número"""
         reg = reg.strip().lower()
@@ -157,8 +575,64 @@ class RISCVAssembler:
         
         return offset, reg_num
 
-    def encode_r_type(self, info: Dict, operands: List[str]) -> int:
-        """Codifica instrucciones tipo R"""
+    def _base_word(self, info: Dict) -> int:
+        """Combina opcode, funct3, funct7 e inmediato fijo en la palabra base"""
+        word = info['opcode'] | (info.get('funct3', 0) << 12) | (info.get('funct7', 0) << 25)
+        return word | (info.get('imm', 0) << 20)
+
+    def _encoder_for(self, info: Dict) -> Callable[[int, List[str]], int]:
+        """Selecciona el codificador especializado según el formato de operandos"""
+        kind = info['type']
+        if kind == 'I':
+            if 'funct7' in info:  # Shifts inmediatos (slli, srli, srai)
+                return self._encode_shift
+            if 'imm' in info:  # ecall, ebreak
+                return self._encode_system
+            return self._encode_i
+        encoders = {
+            'R': self._encode_r,
+            'S': self._encode_s,
+            'B': self._encode_b,
+            'U': self._encode_u,
+            'J': self._encode_j,
+        }
+        if kind not in encoders:
+            raise ValueError(f"Tipo de instrucción desconocido: {kind}")
+        return encoders[kind]
+
+    def _build_encoding_table(self) -> Dict[str, Tuple[Callable[[int, List[str]], int], int]]:
+        """Compila la tabla mnemónico -> (codificador, palabra base)"""
+        return {name: (self._encoder_for(info), self._base_word(info))
+                for name, info in self.instructions.items()}
+
+    def _build_decode_index(self) -> Tuple[Dict[Tuple[int, Optional[int], Optional[int]], str], frozenset]:
+        """
+        Invierte la tabla de instrucciones. La clave es (opcode, funct3, extra),
+        con None en los campos que el formato no usa; extra es funct7 en tipo R
+        y shifts, y el inmediato fijo (bits 31:20) en ecall/ebreak.
+        Retorna el índice y los opcodes cuyo extra es el inmediato.
+        """
+        index = {}
+        imm_opcodes = set()
+        for name, info in self.instructions.items():
+            if 'imm' in info:
+                extra = info['imm']
+                imm_opcodes.add(info['opcode'])
+            else:
+                extra = info.get('funct7')
+            index[(info['opcode'], info.get('funct3'), extra)] = name
+        return index, frozenset(imm_opcodes)
+
+    def decode_mnemonic(self, word: int) -> Optional[str]:
+        """Mnemónico de una palabra de 32 bits, o None si no es una instrucción RV32I"""
+        opcode = word & 0x7F
+        funct3 = (word >> 12) & 0x7
+        extra = word >> 20 if opcode in self._decode_imm_opcodes else word >> 25
+        index = self.decode_index
+        return (index.get((opcode, funct3, extra)) or index.get((opcode, funct3, None))
+                or index.get((opcode, None, None)))
+
+    def _encode_r(self, base: int, operands: List[str]) -> int:
         if len(operands) != 3:
             raise ValueError("Instrucciones tipo R requieren 3 operandos")
         
@@ -166,82 +640,63 @@ class RISCVAssembler:
         rs1 = self.get_register_number(operands[1])
         rs2 = self.get_register_number(operands[2])
         
-        instruction = (info['funct7'] << 25) | (rs2 << 20) | (rs1 << 15) | \
-                     (info['funct3'] << 12) | (rd << 7) | info['opcode']
-        
-        return instruction & 0xFFFFFFFF
+        return base | (rs2 << 20) | (rs1 << 15) | (rd << 7)
 
-    def encode_i_type(self, info: Dict, operands: List[str]) -> int:
-        """Codifica instrucciones tipo I - VERSIÓN CORREGIDA"""
+    def _encode_i(self, base: int, operands: List[str]) -> int:
         if len(operands) < 2:
             raise ValueError("Instrucciones tipo I requieren al menos 2 operandos")
         
         rd = self.get_register_number(operands[0])
+        memory_operand = operands[-1]
         
-        # Manejar diferentes formatos de instrucciones I
-        if 'funct7' in info:  # Shifts inmediatos (slli, srli, srai)
-            rs1 = self.get_register_number(operands[1])
-            shamt = self.parse_immediate(operands[2])
-            if shamt < 0 or shamt > 31:
-                raise ValueError("Shift amount debe estar entre 0 y 31")
-            
-            imm = (info['funct7'] << 5) | shamt
-            
-        elif len(operands) >= 2 and '(' in operands[-1]:  # Load instructions: lw x1, offset(x2)
-            # PARSING CORREGIDO para loads
-            memory_operand = operands[-1]  # El último operando es el de memoria
-            
+        if '(' in memory_operand and memory_operand[0] != '%':  # Loads y jalr: lw x1, offset(x2)
             try:
-                offset, rs1 = self.parse_memory_operand(memory_operand)
-                imm = offset
+                imm, rs1 = self.parse_memory_operand(memory_operand)
             except Exception as e:
                 raise ValueError(f"Error parseando operando de memoria '{memory_operand}': {e}")
-                
         elif len(operands) == 3:  # Instrucciones aritméticas inmediatas
             rs1 = self.get_register_number(operands[1])
             imm = self.parse_immediate(operands[2])
-            
-        elif len(operands) == 2:  # jalr x1, x2 o jalr x1, offset(x2)
-            if '(' in operands[1]:  # jalr rd, offset(rs1)
-                try:
-                    offset, rs1 = self.parse_memory_operand(operands[1])
-                    imm = offset
-                except:
-                    rs1 = self.get_register_number(operands[1])
-                    imm = 0
-            else:  # jalr rd, rs1
-                rs1 = self.get_register_number(operands[1])
-                imm = 0
-            
+        elif len(operands) == 2:  # jalr rd, rs1
+            rs1 = self.get_register_number(operands[1])
+            imm = 0
         else:
             rs1 = 0
-            imm = info.get('imm', 0)  # Para ecall, ebreak
+            imm = 0
         
         # Verificar rango del inmediato
         if imm < -2048 or imm > 2047:
             raise ValueError(f"Inmediato fuera de rango (-2048 a 2047): {imm}")
         
-        # Convertir a 12 bits con signo
-        imm = imm & 0xFFF
+        return base | ((imm & 0xFFF) << 20) | (rs1 << 15) | (rd << 7)
+
+    def _encode_shift(self, base: int, operands: List[str]) -> int:
+        if len(operands) != 3:
+            raise ValueError("Shifts inmediatos requieren 3 operandos")
         
-        instruction = (imm << 20) | (rs1 << 15) | (info['funct3'] << 12) | \
-                    (rd << 7) | info['opcode']
+        rd = self.get_register_number(operands[0])
+        rs1 = self.get_register_number(operands[1])
+        shamt = self.parse_immediate(operands[2])
+        if shamt < 0 or shamt > 31:
+            raise ValueError("Shift amount debe estar entre 0 y 31")
         
-        return instruction & 0xFFFFFFFF
+        # funct7 ya está en los bits [31:25] de la palabra base
+        return base | (shamt << 20) | (rs1 << 15) | (rd << 7)
 
-    def encode_s_type(self, info: Dict, operands: List[str]) -> int:
-        """Codifica instrucciones tipo S - VERSIÓN CORREGIDA"""
+    def _encode_system(self, base: int, operands: List[str]) -> int:
+        if operands:
+            raise ValueError("Instrucciones de sistema no admiten operandos")
+        return base
+
+    def _encode_s(self, base: int, operands: List[str]) -> int:
         if len(operands) != 2:
             raise ValueError("Instrucciones tipo S requieren 2 operandos")
         
         rs2 = self.get_register_number(operands[0])  # Registro fuente
-        
-        # PARSING CORREGIDO para stores
         memory_operand = operands[1]
         
         try:
-            offset, rs1 = self.parse_memory_operand(memory_operand)
-            imm = offset
+            imm, rs1 = self.parse_memory_operand(memory_operand)
         except Exception as e:
             raise ValueError(f"Error parseando operando de memoria '{memory_operand}': {e}")
         
@@ -250,53 +705,28 @@ class RISCVAssembler:
         
         # Dividir inmediato en imm[11:5] y imm[4:0]
         imm = imm & 0xFFF
-        imm_high = (imm >> 5) & 0x7F
-        imm_low = imm & 0x1F
-        
-        instruction = (imm_high << 25) | (rs2 << 20) | (rs1 << 15) | \
-                    (info['funct3'] << 12) | (imm_low << 7) | info['opcode']
-        
-        return instruction & 0xFFFFFFFF
+        return base | ((imm >> 5) << 25) | (rs2 << 20) | (rs1 << 15) | ((imm & 0x1F) << 7)
 
-    def encode_b_type(self, info: Dict, operands: List[str]) -> int:
-        """Codifica instrucciones tipo B"""
+    def _encode_b(self, base: int, operands: List[str]) -> int:
         if len(operands) != 3:
             raise ValueError("Instrucciones tipo B requieren 3 operandos")
         
         rs1 = self.get_register_number(operands[0])
         rs2 = self.get_register_number(operands[1])
         
-        # Calcular offset del label
+        # Calcular offset del label ('.+8' es relativo a esta instrucción)
         label = operands[2]
         if label in self.labels:
-            target_addr = self.labels[label]
-            offset = target_addr - self.current_address
+            offset = self.labels[label] - self.current_address
+        elif label[:1] == '.':
+            offset = self.parse_immediate(label[1:])
         else:
             # Si no encontramos el label, asumimos offset 0 (primera pasada)
             offset = 0
         
-        if offset % 2 != 0:
-            raise ValueError("Offset de branch debe ser par")
-        
-        if offset < -4096 or offset > 4094:
-            raise ValueError(f"Offset de branch fuera de rango: {offset}")
-        
-        # Codificar offset en formato B
-        offset = offset & 0x1FFE  # 13 bits, bit 0 siempre es 0
-        
-        imm_12 = (offset >> 12) & 0x1
-        imm_10_5 = (offset >> 5) & 0x3F
-        imm_4_1 = (offset >> 1) & 0xF
-        imm_11 = (offset >> 11) & 0x1
-        
-        instruction = (imm_12 << 31) | (imm_10_5 << 25) | (rs2 << 20) | \
-                     (rs1 << 15) | (info['funct3'] << 12) | (imm_4_1 << 8) | \
-                     (imm_11 << 7) | info['opcode']
-        
-        return instruction & 0xFFFFFFFF
+        return base | branch_immediate(offset) | (rs2 << 20) | (rs1 << 15)
 
-    def encode_u_type(self, info: Dict, operands: List[str]) -> int:
-        """Codifica instrucciones tipo U"""
+    def _encode_u(self, base: int, operands: List[str]) -> int:
         if len(operands) != 2:
             raise ValueError("Instrucciones tipo U requieren 2 operandos")
         
@@ -306,12 +736,9 @@ class RISCVAssembler:
         if imm < 0 or imm > 0xFFFFF:
             raise ValueError(f"Inmediato fuera de rango (0 a 0xFFFFF): {imm}")
         
-        instruction = (imm << 12) | (rd << 7) | info['opcode']
-        
-        return instruction & 0xFFFFFFFF
+        return base | (imm << 12) | (rd << 7)
 
-    def encode_j_type(self, info: Dict, operands: List[str]) -> int:
-        """Codifica instrucciones tipo J"""
+    def _encode_j(self, base: int, operands: List[str]) -> int:
         if len(operands) < 1 or len(operands) > 2:
             raise ValueError("Instrucciones tipo J requieren 1 o 2 operandos")
         
@@ -324,32 +751,218 @@ class RISCVAssembler:
         
         # Calcular offset del label
         if label in self.labels:
-            target_addr = self.labels[label]
-            offset = target_addr - self.current_address
+            offset = self.labels[label] - self.current_address
+        elif label[:1] == '.':
+            offset = self.parse_immediate(label[1:])
         else:
             offset = 0  # Primera pasada
         
-        if offset % 2 != 0:
-            raise ValueError("Offset de jump debe ser par")
-        
-        if offset < -1048576 or offset > 1048574:
-            raise ValueError(f"Offset de jump fuera de rango: {offset}")
-        
-        # Codificar offset en formato J
-        offset = offset & 0x1FFFFE
-        
-        imm_20 = (offset >> 20) & 0x1
-        imm_10_1 = (offset >> 1) & 0x3FF
-        imm_11 = (offset >> 11) & 0x1
-        imm_19_12 = (offset >> 12) & 0xFF
-        
-        instruction = (imm_20 << 31) | (imm_19_12 << 12) | (imm_11 << 20) | \
-                     (imm_10_1 << 21) | (rd << 7) | info['opcode']
-        
-        return instruction & 0xFFFFFFFF
+        return base | jump_immediate(offset) | (rd << 7)
+
+    def encode_r_type(self, info: Dict, operands: List[str]) -> int:
+        """Codifica instrucciones tipo R"""
+        return self._encode_r(self._base_word(info), operands)
+
+    def encode_i_type(self, info: Dict, operands: List[str]) -> int:
+        """Codifica instrucciones tipo I (aritméticas, loads, shifts, jalr y sistema)"""
+        return self._encoder_for(info)(self._base_word(info), operands)
+
+    def encode_s_type(self, info: Dict, operands: List[str]) -> int:
+        """Codifica instrucciones tipo S"""
+        return self._encode_s(self._base_word(info), operands)
+
+    def encode_b_type(self, info: Dict, operands: List[str]) -> int:
+        """Codifica instrucciones tipo B"""
+        return self._encode_b(self._base_word(info), operands)
+
+    def encode_u_type(self, info: Dict, operands: List[str]) -> int:
+        """Codifica instrucciones tipo U"""
+        return self._encode_u(self._base_word(info), operands)
+
+    def encode_j_type(self, info: Dict, operands: List[str]) -> int:
+        """Codifica instrucciones tipo J"""
+        return self._encode_j(self._base_word(info), operands)
+
+    def _build_compressed_table(self) -> Dict[str, Tuple[Callable[[int, List[str]], int], int]]:
+        """Compila la tabla mnemónico -> (codificador, palabra base) de las instrucciones RV32C"""
+        encoders = {
+            'C0': self._encode_c0, 'CI': self._encode_ci, 'CI16SP': self._encode_ci16sp,
+            'CLUI': self._encode_clui, 'CSHIFT': self._encode_cshift, 'CBSHIFT': self._encode_cbshift,
+            'CBANDI': self._encode_cbandi, 'CA': self._encode_ca, 'CR': self._encode_cr,
+            'CR1': self._encode_cr1, 'CIW': self._encode_ciw, 'CL': self._encode_cl,
+            'CLWSP': self._encode_clwsp, 'CSS': self._encode_css, 'CJ': self._encode_cj,
+            'CB': self._encode_cb,
+        }
+        return {name: (encoders[kind], base) for name, (kind, base) in COMPRESSED_INSTRUCTIONS.items()}
+
+    def _compressed_register(self, operand: str) -> int:
+        """Registro de 3 bits de los formatos comprimidos (x8..x15), ya restado 8"""
+        reg = self.get_register_number(operand)
+        if not 8 <= reg <= 15:
+            raise ValueError(f"Registro no admitido en instrucción comprimida (x8 a x15): {operand.strip()}")
+        return reg - 8
+
+    def _compressed_nonzero(self, operand: str) -> int:
+        reg = self.get_register_number(operand)
+        if reg == 0:
+            raise ValueError("x0 no admitido en esta instrucción comprimida")
+        return reg
+
+    def _compressed_operands(self, operands: List[str], count: int):
+        if len(operands) != count:
+            raise ValueError(f"Instrucción comprimida requiere {count} operandos")
+
+    def _compressed_memory(self, operand: str, limit: int) -> Tuple[int, int]:
+        """offset(registro) con offset múltiplo de 4 entre 0 y limit"""
+        offset, reg = self.parse_memory_operand(operand)
+        if offset % 4 or not 0 <= offset <= limit:
+            raise ValueError(f"Offset fuera de rango (múltiplo de 4 entre 0 y {limit}): {offset}")
+        return offset, reg
+
+    def _compressed_offset(self, target: str) -> int:
+        """Offset relativo al PC de un label o de '.±N' (0 si el label no existe, como en tipo B/J)"""
+        if target in self.labels:
+            return self.labels[target] - self.current_address
+        if target[:1] == '.':
+            return self.parse_immediate(target[1:])
+        return 0
+
+    def _encode_c0(self, base: int, operands: List[str]) -> int:
+        # c.nop, c.ebreak
+        if operands:
+            raise ValueError("c.nop y c.ebreak no admiten operandos")
+        return base
+
+    def _encode_ci(self, base: int, operands: List[str]) -> int:
+        # c.addi rd, imm / c.li rd, imm
+        self._compressed_operands(operands, 2)
+        rd = self._compressed_nonzero(operands[0])
+        imm = self.parse_immediate(operands[1])
+        if not -32 <= imm <= 31 or (imm == 0 and base == COMPRESSED_INSTRUCTIONS['c.addi'][1]):
+            raise ValueError(f"Inmediato fuera de rango (-32 a 31, distinto de 0 en c.addi): {imm}")
+        return base | ((imm >> 5) & 0x1) << 12 | rd << 7 | (imm & 0x1F) << 2
+
+    def _encode_ci16sp(self, base: int, operands: List[str]) -> int:
+        # c.addi16sp sp, imm
+        self._compressed_operands(operands, 2)
+        if self.get_register_number(operands[0]) != 2:
+            raise ValueError("c.addi16sp sólo opera sobre sp")
+        imm = self.parse_immediate(operands[1])
+        if imm == 0 or imm % 16 or not -512 <= imm <= 496:
+            raise ValueError(f"Inmediato fuera de rango (múltiplo de 16 entre -512 y 496, distinto de 0): {imm}")
+        return (base | ((imm >> 9) & 0x1) << 12 | ((imm >> 4) & 0x1) << 6 | ((imm >> 6) & 0x1) << 5
+                | ((imm >> 7) & 0x3) << 3 | ((imm >> 5) & 0x1) << 2)
+
+    def _encode_clui(self, base: int, operands: List[str]) -> int:
+        # c.lui rd, imm (los 20 bits superiores, como en lui)
+        self._compressed_operands(operands, 2)
+        rd = self.get_register_number(operands[0])
+        if rd in (0, 2):
+            raise ValueError("c.lui no admite x0 ni sp")
+        imm = self.parse_immediate(operands[1])
+        if not (1 <= imm <= 31 or 0xFFFE0 <= imm <= 0xFFFFF or -32 <= imm <= -1):
+            raise ValueError(f"Inmediato fuera de rango (1 a 31 o 0xfffe0 a 0xfffff): {imm}")
+        return base | ((imm >> 5) & 0x1) << 12 | rd << 7 | (imm & 0x1F) << 2
 
-    def expand_pseudo_instruction(self, instruction: str, operands: List[str]) -> List[Tuple[str, List[str]]]:
-        """Expande pseudo-instrucciones a instrucciones reales"""
+    def _shift_amount(self, operand: str) -> int:
+        shamt = self.parse_immediate(operand)
+        if not 1 <= shamt <= 31:
+            raise ValueError("Shift amount debe estar entre 1 y 31")
+        return shamt
+
+    def _encode_cshift(self, base: int, operands: List[str]) -> int:
+        # c.slli rd, shamt
+        self._compressed_operands(operands, 2)
+        return base | self._compressed_nonzero(operands[0]) << 7 | self._shift_amount(operands[1]) << 2
+
+    def _encode_cbshift(self, base: int, operands: List[str]) -> int:
+        # c.srli / c.srai rd', shamt
+        self._compressed_operands(operands, 2)
+        return base | self._compressed_register(operands[0]) << 7 | self._shift_amount(operands[1]) << 2
+
+    def _encode_cbandi(self, base: int, operands: List[str]) -> int:
+        # c.andi rd', imm
+        self._compressed_operands(operands, 2)
+        rd = self._compressed_register(operands[0])
+        imm = self.parse_immediate(operands[1])
+        if not -32 <= imm <= 31:
+            raise ValueError(f"Inmediato fuera de rango (-32 a 31): {imm}")
+        return base | ((imm >> 5) & 0x1) << 12 | rd << 7 | (imm & 0x1F) << 2
+
+    def _encode_ca(self, base: int, operands: List[str]) -> int:
+        # c.sub / c.xor / c.or / c.and rd', rs2'
+        self._compressed_operands(operands, 2)
+        return base | self._compressed_register(operands[0]) << 7 | self._compressed_register(operands[1]) << 2
+
+    def _encode_cr(self, base: int, operands: List[str]) -> int:
+        # c.mv / c.add rd, rs2
+        self._compressed_operands(operands, 2)
+        return base | self._compressed_nonzero(operands[0]) << 7 | self._compressed_nonzero(operands[1]) << 2
+
+    def _encode_cr1(self, base: int, operands: List[str]) -> int:
+        # c.jr / c.jalr rs1
+        self._compressed_operands(operands, 1)
+        return base | self._compressed_nonzero(operands[0]) << 7
+
+    def _encode_ciw(self, base: int, operands: List[str]) -> int:
+        # c.addi4spn rd', sp, imm
+        self._compressed_operands(operands, 3)
+        rd = self._compressed_register(operands[0])
+        if self.get_register_number(operands[1]) != 2:
+            raise ValueError("c.addi4spn sólo suma a sp")
+        imm = self.parse_immediate(operands[2])
+        if imm % 4 or not 4 <= imm <= 1020:
+            raise ValueError(f"Inmediato fuera de rango (múltiplo de 4 entre 4 y 1020): {imm}")
+        return (base | ((imm >> 4) & 0x3) << 11 | ((imm >> 6) & 0xF) << 7 | ((imm >> 2) & 0x1) << 6
+                | ((imm >> 3) & 0x1) << 5 | rd << 2)
+
+    def _encode_cl(self, base: int, operands: List[str]) -> int:
+        # c.lw rd', offset(rs1') / c.sw rs2', offset(rs1')
+        self._compressed_operands(operands, 2)
+        reg = self._compressed_register(operands[0])
+        offset, rs1 = self._compressed_memory(operands[1], 124)
+        if not 8 <= rs1 <= 15:
+            raise ValueError(f"Registro base no admitido en instrucción comprimida (x8 a x15): x{rs1}")
+        return (base | ((offset >> 3) & 0x7) << 10 | (rs1 - 8) << 7 | ((offset >> 2) & 0x1) << 6
+                | ((offset >> 6) & 0x1) << 5 | reg << 2)
+
+    def _encode_clwsp(self, base: int, operands: List[str]) -> int:
+        # c.lwsp rd, offset(sp)
+        self._compressed_operands(operands, 2)
+        rd = self._compressed_nonzero(operands[0])
+        offset, rs1 = self._compressed_memory(operands[1], 252)
+        if rs1 != 2:
+            raise ValueError("c.lwsp sólo carga relativo a sp")
+        return base | ((offset >> 5) & 0x1) << 12 | rd << 7 | ((offset >> 2) & 0x7) << 4 | ((offset >> 6) & 0x3) << 2
+
+    def _encode_css(self, base: int, operands: List[str]) -> int:
+        # c.swsp rs2, offset(sp)
+        self._compressed_operands(operands, 2)
+        rs2 = self.get_register_number(operands[0])
+        offset, rs1 = self._compressed_memory(operands[1], 252)
+        if rs1 != 2:
+            raise ValueError("c.swsp sólo almacena relativo a sp")
+        return base | ((offset >> 2) & 0xF) << 9 | ((offset >> 6) & 0x3) << 7 | rs2 << 2
+
+    def _encode_cj(self, base: int, operands: List[str]) -> int:
+        # c.j / c.jal destino
+        self._compressed_operands(operands, 1)
+        return base | cj_immediate(self._compressed_offset(operands[0]))
+
+    def _encode_cb(self, base: int, operands: List[str]) -> int:
+        # c.beqz / c.bnez rs1', destino
+        self._compressed_operands(operands, 2)
+        rs1 = self._compressed_register(operands[0])
+        return base | cb_immediate(self._compressed_offset(operands[1])) | rs1 << 7
+
+    def expand_pseudo_instruction(self, instruction: str, operands: List[str],
+                                  labels: Optional[Dict[str, int]] = None) -> List[Tuple[str, List[str]]]:
+        """
+        Expande pseudo-instrucciones a instrucciones reales
+        labels: labels visibles para 'la' (por defecto self.labels)
+        """
+        if labels is None:
+            labels = self.labels
         pseudo_expansions = []
         
         if instruction == 'nop':
@@ -449,8 +1062,12 @@ class RISCVAssembler:
             rd = operands[0]
             label = operands[1]
             
-            if label in self.labels:
-                addr = self.labels[label]
+            if self.relocatable:
+                # La dirección final se conoce al enlazar: siempre lui + addi
+                pseudo_expansions.append(('lui', [rd, f"%hi({label})"]))
+                pseudo_expansions.append(('addi', [rd, rd, f"%lo({label})"]))
+            elif label in labels:
+                addr = labels[label]
                 if -2048 <= addr <= 2047:
                     pseudo_expansions.append(('addi', [rd, 'x0', str(addr)]))
                 else:
@@ -490,190 +1107,2183 @@ class RISCVAssembler:
         return pseudo_expansions
 
     def tokenize_line(self, line: str) -> Tuple[Optional[str], str, List[str]]:
-        """Tokeniza una línea de assembly - VERSIÓN MEJORADA"""
+        """Tokeniza una línea de assembly en (label, instrucción, operandos)"""
         # Remover comentarios
-        line = line.split('#')[0].strip()
+        if '#' in line:
+            line = line[:line.index('#')]
         
-        if not line:
-            return None, '', []
-        
-        # Buscar label - CORREGIDO para manejar labels con caracteres especiales
+        # Buscar label (puede contener caracteres especiales, p. ej. 'sum(int, int):')
         label = None
         if ':' in line:
-            parts = line.split(':', 1)
-            label = parts[0].strip()
-            line = parts[1].strip()
-        
-        if not line:
-            return label, '', []
+            label, _, line = line.partition(':')
+            label = label.strip()
         
         # Separar instrucción y operandos
         parts = line.split(None, 1)
-        instruction = parts[0].lower()
+        if not parts:
+            return label, '', []
         
+        instruction = parts[0].lower()
+        if len(parts) == 1:
+            return label, instruction, []
+        
+        operand_str = parts[1]
+        if '(' not in operand_str and ')' not in operand_str:
+            # Caso común: sin paréntesis, basta con separar por comas
+            operands = [op.strip() for op in operand_str.split(',')]
+            if '' in operands:
+                operands = [op for op in operands if op]
+            return label, instruction, operands
+        
+        # Con paréntesis, las comas internas no separan operandos: se unen los
+        # trozos mientras la cuenta de paréntesis abiertos no vuelva a cero
         operands = []
-        if len(parts) > 1:
-            # MEJOR parsing de operandos - CORREGIDO
-            operand_str = parts[1]
-            
-            operands = []
-            current_operand = ""
-            paren_count = 0
-            
-            for char in operand_str + ",":
-                if char == ',' and paren_count == 0:
-                    if current_operand.strip():
-                        operands.append(current_operand.strip())
-                    current_operand = ""
-                else:
-                    if char == '(':
-                        paren_count += 1
-                    elif char == ')':
-                        paren_count -= 1
-                    current_operand += char
+        pending = []
+        depth = 0
+        for piece in operand_str.split(','):
+            pending.append(piece)
+            depth += piece.count('(') - piece.count(')')
+            if depth == 0:
+                operand = ','.join(pending).strip()
+                if operand:
+                    operands.append(operand)
+                pending = []
         
         return label, instruction, operands
 
-    def first_pass(self, lines: List[str]) -> List[Tuple[Optional[str], str, List[str]]]:
-        """Primera pasada: recopilar labels y expandir pseudo-instrucciones"""
-        parsed_lines = []
+    def _tokenize_memo(self, line: str) -> Tuple[Optional[str], str, List[str]]:
+        """
+        tokenize_line con memoización por línea. Las líneas repetidas comparten
+        la misma lista de operandos, que no debe modificarse.
+        """
+        if not self._line_memo_active:
+            return self.tokenize_line(line)
+        memo = self._line_memo
+        tokens = memo.get(line)
+        if tokens is not None:
+            self.memo_stats['line_hits'] += 1
+            return tokens
+        
+        stats = self.memo_stats
+        stats['line_misses'] += 1
+        tokens = self.tokenize_line(line)
+        if len(memo) >= self.memo_size:
+            memo.clear()
+        memo[line] = tokens
+        if stats['line_misses'] % MEMO_PROBE == 0 and self._memo_hit_rate_low('line'):
+            self._line_memo_active = False
+            memo.clear()
+        return tokens
+
+    def _memo_hit_rate_low(self, kind: str) -> bool:
+        """Si la memo de 'line' o 'word' acierta poco desde el inicio del ensamblado"""
+        hits = self.memo_stats[f'{kind}_hits'] - self._memo_start[f'{kind}_hits']
+        misses = self.memo_stats[f'{kind}_misses'] - self._memo_start[f'{kind}_misses']
+        return hits < (hits + misses) * MEMO_MIN_HIT_RATE
+
+    def _reset_line_memo(self):
+        """Reactiva la memo de líneas al empezar un recorrido del fuente (conserva su contenido)"""
+        self._line_memo_active = self.memo_size > 0
+        self._memo_start['line_hits'] = self.memo_stats['line_hits']
+        self._memo_start['line_misses'] = self.memo_stats['line_misses']
+
+    def _reset_word_memo(self):
+        """
+        Vacía y reactiva la memo de palabras: las palabras memoizadas dependen
+        de los labels (%hi/%lo, offsets con label)
+        """
+        self._word_memo.clear()
+        self._memo_mnemonics = self._memoizable
+        self._memo_start['word_hits'] = self.memo_stats['word_hits']
+        self._memo_start['word_misses'] = self.memo_stats['word_misses']
+
+    def tokenize_source(self, lines: Iterable[str]) -> Iterator[Tuple[Optional[str], str, List[str]]]:
+        """
+        Tokens de un fuente tras el preprocesador (.include, .macro, .rept),
+        una entrada por línea generada. Crea el preprocesador de la ejecución
+        si no existe; su caché de archivos incluidos dura toda la ejecución.
+        """
+        if self.preprocessor is None:
+            self.preprocessor = Preprocessor(self._tokenize_memo, self.source_dir, self.source_name)
+        self._reset_line_memo()
+        return self.preprocessor.process(lines)
+
+    def _line_error(self, line_num: int, e: Exception) -> AssemblyError:
+        """AssemblyError de la línea generada line_num, con su origen en el fuente"""
+        if self.preprocessor is None:
+            return AssemblyError(str(e), line_num, location=f"línea {line_num}")
+        filename, line, context = self.preprocessor.locate(line_num)
+        return AssemblyError(str(e), line, filename=filename, context=context,
+                             location=self.describe_line(line_num))
+
+    def describe_line(self, line_num: int) -> str:
+        """'línea N' del fuente original de la línea generada line_num"""
+        if self.preprocessor is None:
+            return f"línea {line_num}"
+        return self.preprocessor.describe(line_num)
+
+    def _encode_word(self, instruction: str, operands: List[str]) -> int:
+        """Codifica una instrucción real en self.current_address, memoizando si no depende de la dirección"""
+        encoder, base = self.encoding_table[instruction]
+        if instruction not in self._memo_mnemonics:
+            return encoder(base, operands)
+        
+        memo = self._word_memo
+        key = (instruction, *operands)
+        code = memo.get(key)
+        if code is not None:
+            self.memo_stats['word_hits'] += 1
+            return code
+        
+        stats = self.memo_stats
+        stats['word_misses'] += 1
+        code = encoder(base, operands)
+        if operands and operands[-1].startswith('%pcrel'):
+            return code  # Depende de la dirección
+        if len(memo) >= self.memo_size:
+            memo.clear()
+        memo[key] = code
+        if stats['word_misses'] % MEMO_PROBE == 0 and self._memo_hit_rate_low('word'):
+            self._memo_mnemonics = frozenset()
+            memo.clear()
+        return code
+
+    def memo_hit_rates(self) -> Dict[str, float]:
+        """Tasa de aciertos de las memos de líneas y de palabras (0.0 a 1.0)"""
+        rates = {}
+        for kind in ('line', 'word'):
+            hits = self.memo_stats[f'{kind}_hits']
+            total = hits + self.memo_stats[f'{kind}_misses']
+            rates[kind] = hits / total if total else 0.0
+        return rates
+
+    def define_constant(self, operands: List[str]):
+        """.equ NOMBRE, valor: el valor puede usar constantes ya definidas"""
+        if len(operands) != 2:
+            raise ValueError(".equ requiere un nombre y un valor")
+        name, value = operands
+        value = self.parse_immediate(value)
+        if self.constants.get(name, value) != value:
+            raise ValueError(f"Constante redefinida: {name}")
+        self.constants[name] = value
+
+    def _align_boundary(self, operands: List[str]) -> int:
+        """.align N: alineación a 2**N bytes"""
+        if len(operands) != 1:
+            raise ValueError(".align requiere un operando")
+        exponent = self.parse_immediate(operands[0])
+        if not 0 <= exponent <= 16:
+            raise ValueError(f".align fuera de rango (0-16): {exponent}")
+        return 1 << exponent
+
+    def _space_arguments(self, operands: List[str]) -> Tuple[int, int]:
+        """.space N[, relleno] -> (bytes, valor de relleno)"""
+        if not 1 <= len(operands) <= 2:
+            raise ValueError(".space requiere un tamaño y opcionalmente un valor de relleno")
+        size = self.parse_immediate(operands[0])
+        fill = self.parse_immediate(operands[1]) if len(operands) == 2 else 0
+        if size < 0 or not 0 <= fill <= 255:
+            raise ValueError(f".space inválido: {', '.join(operands)}")
+        return size, fill
+
+    def _incbin_path(self, operands: List[str]) -> str:
+        """Ruta de .incbin "archivo", relativa al directorio del fuente"""
+        if len(operands) != 1:
+            raise ValueError(".incbin requiere una ruta")
+        return os.path.join(self.source_dir, operands[0].strip('"\''))
+
+    def _data_values(self, operands: List[str], labels: Dict[str, int], low: int, high: int) -> List[int]:
+        """Valores de .word/.byte: enteros, constantes o labels"""
+        try:
+            values = [int(operand, 0) for operand in operands]
+        except ValueError:
+            values = [labels[operand] if operand in labels else self.parse_immediate(operand)
+                      for operand in operands]
+        if values and (min(values) < low or max(values) > high):
+            raise ValueError(f"Valor fuera de rango ({low}..{high})")
+        return values
+
+    def data_size(self, directive: str, operands: List[str]) -> int:
+        """Bytes que ocupa una directiva de datos, sin evaluar sus valores"""
+        if directive == '.word':
+            return 4 * len(operands)
+        if directive == '.byte':
+            return len(operands)
+        if directive == '.space':
+            return self._space_arguments(operands)[0]
+        return os.path.getsize(self._incbin_path(operands))
+
+    def emit_data(self, directive: str, operands: List[str], labels: Dict[str, int]):
+        """Añade a data_image los bytes de una directiva de datos, en bloque"""
+        if directive == '.word':
+            values = self._data_values(operands, labels, -(1 << 31), (1 << 32) - 1)
+            self.data_image += struct.pack(f'<{len(values)}I', *[value & 0xFFFFFFFF for value in values])
+        elif directive == '.byte':
+            values = self._data_values(operands, labels, -128, 255)
+            self.data_image += bytes([value & 0xFF for value in values])
+        elif directive == '.space':
+            size, fill = self._space_arguments(operands)
+            self.data_image += bytes([fill]) * size
+        else:
+            with open(self._incbin_path(operands), 'rb') as f:
+                self.data_image += f.read()
+
+    def _iter_instructions(self, tokens: Iterable[Tuple[Optional[str], str, List[str]]],
+                           labels: Dict[str, int],
+                           relaxation: Optional[Tuple[bytearray, Dict[str, int]]] = None
+                           ) -> Iterator[Tuple[Optional[str], str, List[str]]]:
+        """
+        Recorre las líneas ya tokenizadas, registra sus labels en `labels` y
+        genera las instrucciones reales ya expandidas. Mientras se consume cada
+        instrucción, self.current_address contiene su dirección.
+        relaxation: (tamaños, labels finales) calculados por relax; sin ella las
+        pseudo-instrucciones se expanden con los labels ya vistos y sólo se
+        admiten las directivas .text y .equ (código reubicable)
+        Las directivas de datos se acumulan en data_image; '.align' en .text
+        genera nops de relleno.
+        """
         self.current_address = 0
-        
-        for line_num, line in enumerate(lines, 1):
+        self.data_image = bytearray()
+        self.data_labels = set()
+        self.text_alignments = {}
+        line_table = self.line_table = array('I')
+        sizes, final_labels = relaxation if relaxation is not None else (None, None)
+        site = 0
+        in_data = False
+
+        for line_num, (label, instruction, operands) in enumerate(tokens, 1):
             try:
-                label, instruction, operands = self.tokenize_line(line)
-                
                 # Registrar label si existe
                 if label:
-                    if label in self.labels:
+                    if label in labels:
                         raise ValueError(f"Label duplicado: {label}")
-                    self.labels[label] = self.current_address
-                
+                    if in_data:
+                        labels[label] = self.data_base + len(self.data_image)
+                        self.data_labels.add(label)
+                    else:
+                        labels[label] = self.current_address
+
+                # Directivas
+                if instruction[:1] == '.':
+                    if instruction == '.text':
+                        in_data = False
+                    elif instruction == '.equ':
+                        self.define_constant(operands)
+                    elif sizes is None:
+                        raise ValueError(f"Directiva no soportada en código reubicable: {instruction}")
+                    elif instruction == '.data':
+                        in_data = True
+                    elif instruction == '.align':
+                        boundary = self._align_boundary(operands)
+                        if in_data:
+                            self.data_image += bytes(-(self.data_base + len(self.data_image)) % boundary)
+                        else:
+                            site += 1
+                            padding = (-self.current_address) % boundary // 4
+                            for _ in range(padding):
+                                line_table.append(line_num)
+                                yield None, 'addi', ['x0', 'x0', '0']
+                                self.current_address += 4
+                            index = self.current_address // 4
+                            previous = self.text_alignments.get(index, (1, 0))
+                            self.text_alignments[index] = (max(previous[0], boundary), previous[1] + padding)
+                    elif instruction in DATA_DIRECTIVES:
+                        if not in_data:
+                            raise ValueError(f"{instruction} sólo se admite en la sección .data")
+                        self.emit_data(instruction, operands, final_labels)
+                    else:
+                        raise ValueError(f"Directiva desconocida: {instruction}")
+
                 # Si hay instrucción, procesarla
-                if instruction:
-                    if instruction in self.pseudo_instructions:
+                elif instruction:
+                    if in_data:
+                        raise ValueError(f"Instrucción en la sección .data: {instruction}")
+                    relaxed = self.relaxation_site(instruction, operands) if sizes is not None else None
+                    if relaxed is not None:
+                        expanded = self.relaxed_expansion(relaxed[0], instruction, operands,
+                                                          sizes[site], final_labels)
+                        site += 1
+                        entry_label = label if instruction in self.instructions else None
+                        for exp_inst, exp_ops in expanded:
+                            line_table.append(line_num)
+                            yield entry_label, exp_inst, exp_ops
+                            entry_label = None
+                            self.current_address += 4
+                    elif instruction in self.pseudo_instructions:
                         # Expandir pseudo-instrucción
-                        expanded = self.expand_pseudo_instruction(instruction, operands)
+                        expanded = self.expand_pseudo_instruction(instruction, operands, labels)
                         for exp_inst, exp_ops in expanded:
-                            parsed_lines.append((None, exp_inst, exp_ops))
+                            line_table.append(line_num)
+                            yield None, exp_inst, exp_ops
                             self.current_address += 4
                     elif instruction in self.instructions:
-                        parsed_lines.append((label, instruction, operands))
+                        line_table.append(line_num)
+                        yield label, instruction, operands
+                        self.current_address += 4
+                    elif instruction in self.compressed_table:
+                        # Ocupa 4 bytes hasta que compress fije las direcciones
+                        if sizes is None:
+                            raise ValueError(f"Instrucción comprimida no soportada en código reubicable: {instruction}")
+                        self.has_compressed = True
+                        line_table.append(line_num)
+                        yield label, instruction, operands
                         self.current_address += 4
                     else:
                         raise ValueError(f"Instrucción desconocida: {instruction}")
                 
             except Exception as e:
-                raise ValueError(f"Error en línea {line_num}: {e}")
+                raise self._line_error(line_num, e)
+
+    def relaxation_site(self, instruction: str, operands: List[str]) -> Optional[Tuple[int, str]]:
+        """
+        (tipo, label) si el tamaño de la instrucción depende de las direcciones
+        finales: 'la', 'call', 'tail' y los branches (reales o pseudo) a un label
+        """
+        if instruction in self._branch_arity:
+            if len(operands) == self._branch_arity[instruction] and operands[-1][:1] != '.':
+                return RELAX_BRANCH, operands[-1]
+            return None
+        if instruction == 'la':
+            return (RELAX_LA, operands[1]) if len(operands) == 2 else None
+        if instruction == 'call' or instruction == 'tail':
+            if len(operands) == 1:
+                return (RELAX_CALL if instruction == 'call' else RELAX_TAIL), operands[0]
+        return None
+
+    def relaxed_expansion(self, kind: int, instruction: str, operands: List[str], size: int,
+                          labels: Dict[str, int]) -> List[Tuple[str, List[str]]]:
+        """Expansión de una instrucción relajada con el tamaño (1 o 2 palabras) elegido"""
+        if kind == RELAX_LA:
+            rd, label = operands
+            if size == 1:
+                return [('addi', [rd, 'x0', f"%lo({label})"])]
+            return [('lui', [rd, f"%hi({label})"]), ('addi', [rd, rd, f"%lo({label})"])]
+        
+        if kind == RELAX_CALL or kind == RELAX_TAIL:
+            label = operands[0]
+            rd, scratch = ('ra', 'ra') if kind == RELAX_CALL else ('x0', 't1')
+            if size == 1:
+                return [('jal', [rd, label])]
+            return [('auipc', [scratch, f"%pcrel_hi({label})"]),
+                    ('jalr', [rd, scratch, f"%pcrel_lo({label})"])]
+        
+        if instruction in self.pseudo_instructions:
+            (instruction, operands), = self.expand_pseudo_instruction(instruction, operands)
+        if size == 1:
+            return [(instruction, operands)]
+        # Branch fuera de rango: condición invertida que salta el jal
+        rs1, rs2, label = operands
+        return [(INVERTED_BRANCHES[instruction], [rs1, rs2, '.+8']), ('jal', ['x0', label])]
+
+    def _scan_relaxation_sites(self, tokens: Iterable[Tuple[Optional[str], str, List[str]]]) -> Tuple:
+        """
+        Recorre el programa con todas las instrucciones relajables en su forma
+        corta y define las constantes de .equ. Para que --stream tenga memoria
+        acotada los sitios se guardan en arrays paralelos (9 bytes por sitio):
+        - addresses / kinds: dirección y tipo de cada sitio
+        - targets: índice del label destino, o el límite de un '.align' en .text
+        - label_ids: nombre -> índice de cada label de .text o destino de un sitio
+        - label_addresses / label_sites: dirección y número de sitios anteriores
+          de cada label de .text (RELAX_UNDEFINED si no lo es)
+        - text_order: índices de los labels de .text en orden de definición
+        - data_positions: dirección de los labels de .data, que no depende de
+          la relajación
+        """
+        self.constants = {}
+        addresses = array('I')
+        kinds = bytearray()
+        targets = array('I')
+        label_ids: Dict[str, int] = {}
+        label_addresses = array('I')
+        label_sites = array('I')
+        text_order = array('I')
+        data_positions = {}
+        
+        def label_id(name: str) -> int:
+            index = label_ids.get(name)
+            if index is None:
+                index = label_ids[name] = len(label_sites)
+                label_addresses.append(0)
+                label_sites.append(RELAX_UNDEFINED)
+            return index
+        
+        address = 0
+        data_address = self.data_base
+        in_data = False
+        for line_num, (label, instruction, operands) in enumerate(tokens, 1):
+            if label and label not in data_positions:
+                index = label_id(label)
+                if label_sites[index] == RELAX_UNDEFINED:
+                    if in_data:
+                        data_positions[label] = data_address
+                    else:
+                        label_addresses[index] = address
+                        label_sites[index] = len(kinds)
+                        text_order.append(index)
+            if not instruction:
+                continue
+            try:
+                if instruction[0] == '.':
+                    # Las directivas inválidas se informan al expandir
+                    if instruction == '.text' or instruction == '.data':
+                        in_data = instruction == '.data'
+                    elif instruction == '.equ':
+                        self.define_constant(operands)
+                    elif instruction == '.align':
+                        boundary = self._align_boundary(operands)
+                        if in_data:
+                            data_address += -data_address % boundary
+                        else:
+                            addresses.append(address)
+                            kinds.append(RELAX_ALIGN)
+                            targets.append(boundary)
+                    elif in_data and instruction in DATA_DIRECTIVES:
+                        data_address += self.data_size(instruction, operands)
+                    continue
+                if in_data:
+                    continue
+                relaxed = self.relaxation_site(instruction, operands)
+                if relaxed is not None:
+                    addresses.append(address)
+                    kinds.append(relaxed[0])
+                    targets.append(label_id(relaxed[1]))
+                elif instruction == 'li':
+                    # Las constantes de .equ deben estar definidas antes del li
+                    address += 4 * (len(self.expand_pseudo_instruction(instruction, operands)) - 1)
+            except Exception as e:
+                raise self._line_error(line_num, e)
+            address += 4
+        return (addresses, kinds, targets, label_ids, label_addresses, label_sites, text_order,
+                data_positions)
+
+    def _relaxation_shifts(self, addresses: array, kinds: bytearray, targets: array, sizes: bytearray,
+                           aligned: bool) -> array:
+        """
+        Bytes añadidos antes de cada sitio (y al final) con los tamaños actuales;
+        con '.align' en .text el relleno depende de la dirección ya desplazada
+        """
+        if not aligned:
+            return array('I', accumulate((4 * (size - 1) for size in sizes), initial=0))
+        shifts = array('I', [0])
+        shift = 0
+        for address, kind, boundary, size in zip(addresses, kinds, targets, sizes):
+            if kind == RELAX_ALIGN:
+                shift += -(address + shift) % boundary
+            else:
+                shift += 4 * (size - 1)
+            shifts.append(shift)
+        return shifts
+
+    def relax(self, tokens: Iterable[Tuple[Optional[str], str, List[str]]]) -> Tuple[bytearray, Dict[str, int]]:
+        """
+        Relajación iterativa: empieza con todas las instrucciones relajables en
+        su forma de una palabra y agranda a dos las que no alcanzan su destino
+        ('la' fuera de -2048..2047, call/tail fuera del rango de jal, branches
+        fuera de ±4 KiB) hasta que las direcciones no cambian. Los tamaños sólo
+        crecen, así que el proceso termina. El relleno de los '.align' de .text
+        se recalcula en cada iteración.
+        Retorna (tamaño de cada sitio, dirección final de cada label).
+        """
+        (addresses, kinds, targets, label_ids, label_addresses, label_sites, text_order,
+         data_positions) = self._scan_relaxation_sites(tokens)
+        sizes = bytearray([1]) * len(kinds)
+        aligned = RELAX_ALIGN in kinds
+        # Destinos en .data de 'la' (su dirección es fija)
+        data_targets = {label_ids[name]: address for name, address in data_positions.items() if name in label_ids}
+        
+        changed = True
+        while changed:
+            changed = False
+            shifts = self._relaxation_shifts(addresses, kinds, targets, sizes, aligned)
+            for index, kind in enumerate(kinds):
+                if sizes[index] == 2 or kind == RELAX_ALIGN:
+                    continue
+                label = targets[index]
+                before = label_sites[label]
+                if before != RELAX_UNDEFINED:
+                    target = label_addresses[label] + shifts[before]
+                elif label in data_targets:
+                    target = data_targets[label]
+                else:
+                    continue
+                pc = addresses[index] + shifts[index]
+                if kind == RELAX_LA:
+                    fits = -2048 <= target <= 2047
+                elif kind == RELAX_BRANCH:
+                    fits = -4096 <= target - pc <= 4094
+                else:
+                    fits = -1048576 <= target - pc <= 1048574
+                if not fits:
+                    sizes[index] = 2
+                    changed = True
+        
+        shifts = self._relaxation_shifts(addresses, kinds, targets, sizes, aligned)
+        names = list(label_ids)
+        labels = {names[index]: label_addresses[index] + shifts[label_sites[index]] for index in text_order}
+        labels.update(data_positions)
+        return sizes, labels
+
+    def first_pass(self, lines: List[str]) -> List[Tuple[Optional[str], str, List[str]]]:
+        """
+        Primera pasada: recopilar labels y expandir pseudo-instrucciones,
+        con el tamaño de 'la', call/tail y branches decidido por relax
+        (en modo reubicable, sin relajación)
+        Los tiempos de cada etapa se acumulan en stats (first_pass.tokenize,
+        first_pass.relax y first_pass.expand).
+        """
+        self.preprocessor = None
+        self.labels = {}
+        self.has_compressed = False
+        self.instruction_sizes = None
+        with self.stats.phase('first_pass.tokenize'):
+            try:
+                tokens = list(self.tokenize_source(lines))
+            except PreprocessorError as e:
+                raise AssemblyError(e.message, e.line, filename=e.filename, context=e.context,
+                                    location=e.location)
+        self.stats.lines += len(tokens)
+        relaxation = None
+        if self.relocatable:
+            self.constants = {}
+        else:
+            with self.stats.phase('first_pass.relax'):
+                relaxation = self.relax(tokens)
+        with self.stats.phase('first_pass.expand'):
+            return list(self._iter_instructions(tokens, self.labels, relaxation))
+
+    def _feed_sinks(self, sinks: List['OutputSink'], method: str, *args):
+        """Llama a un método de cada sink acumulando su tiempo en stats (write.<formato>)"""
+        for sink in sinks:
+            with self.stats.phase(f"write.{sink.name}"):
+                getattr(sink, method)(*args)
+
+    def _known_register(self, operand: str) -> Optional[int]:
+        """Número de registro, o None si el operando no es un registro"""
+        return self.registers.get(operand.strip().lower())
+
+    def _known_immediate(self, operand: str) -> Optional[int]:
+        """Valor de un inmediato ya conocido, o None (%hi/%lo, labels, texto inválido)"""
+        if operand[:1] == '%':
+            return None
+        try:
+            return self.parse_immediate(operand)
+        except ValueError:
+            return None
+
+    def peephole(self, parsed_lines: List[Tuple[Optional[str], str, List[str]]]
+                 ) -> List[Tuple[Optional[str], str, List[str]]]:
+        """
+        Optimización opcional (-O) entre las dos pasadas:
+        - elimina 'add x, x, x0' (mv x, x) y 'addi x, x, 0' (el nop canónico
+          'addi x0, x0, 0' se conserva)
+        - convierte 'lui' + 'addi' sobre el mismo registro en un solo 'addi'
+          cuando el valor cabe en 12 bits y no hay un label entre las dos
+        - elimina saltos y branches a la instrucción siguiente ('jal x0' o 'j';
+          un 'jal' que guarda la dirección de retorno se conserva)
+        Repite hasta que no cambia nada y corrige self.labels. Las instrucciones
+        dentro del alcance de un destino relativo ('.+N') no se tocan y el
+        relleno de los '.align' de .text se recalcula.
+        El número de instrucciones eliminadas de cada tipo queda en peephole_stats.
+        No admite instrucciones comprimidas escritas (c.*): se aplica antes de compress.
+        """
+        if self.has_compressed:
+            raise ValueError("-O no está disponible con instrucciones comprimidas (c.*)")
+        stats = {'mv': 0, 'addi_0': 0, 'lui_addi': 0, 'jump_next': 0}
+        lines = list(parsed_lines)
+        while True:
+            lines, removed = self._peephole_round(lines, stats)
+            if not removed:
+                break
+        self.peephole_stats = stats
+        return lines
+
+    def _peephole_round(self, lines: List[Tuple[Optional[str], str, List[str]]],
+                        stats: Dict[str, int]) -> Tuple[List[Tuple[Optional[str], str, List[str]]], int]:
+        """Una pasada del optimizador; retorna (líneas nuevas, instrucciones eliminadas)"""
+        register = self._known_register
+        immediate = self._known_immediate
+
+        labeled = {address // 4 for name, address in self.labels.items() if name not in self.data_labels}
+        alignments = self.text_alignments
+        padding = set()
+        for aligned, (_, count) in alignments.items():
+            padding.update(range(aligned - count, aligned))
+        pinned = set()
+        for index, (_, instruction, operands) in enumerate(lines):
+            if operands and operands[-1][:1] == '.' and self.instructions[instruction]['type'] in ('B', 'J'):
+                offset = immediate(operands[-1][1:])
+                if offset is not None:
+                    # Hacia delante el destino puede desaparecer (ocupa su sitio la siguiente)
+                    target = index + offset // 4
+                    pinned.update(range(index, target) if target > index else range(target, index + 1))
+
+        line_table = self.line_table
+        if len(line_table) != len(lines):
+            line_table = array('I', bytes(4 * len(lines)))  # líneas sin origen conocido
+        result = []
+        result_lines = array('I')
+        shifts = []  # shifts[i]: instrucciones que se desplaza hacia atrás la instrucción i
+        new_alignments = {}
+        removed = 0
+        pending_label = None
+
+        def realign(aligned):
+            # Relleno nuevo para que la instrucción alineada conserve su límite; se
+            # atribuye a la línea del relleno anterior (el '.align') o a la alineada
+            boundary, old_count = alignments[aligned]
+            count = -4 * len(result) % boundary // 4
+            source = aligned - 1 if old_count or aligned == len(lines) else aligned
+            line = line_table[source] if 0 <= source < len(line_table) else 0
+            result.extend((None, 'addi', ['x0', 'x0', '0']) for _ in range(count))
+            result_lines.extend([line] * count)
+            new_alignments[len(result)] = (boundary, count)
+
+        index = 0
+        while index < len(lines):
+            if index in alignments:
+                realign(index)
+            if index in padding:
+                shifts.append(index - len(result))
+                index += 1
+                continue
+            label, instruction, operands = lines[index]
+            kind = None
+            replacement = None
+            if index not in pinned:
+                if instruction == 'add' and len(operands) == 3:
+                    rd, rs1, rs2 = map(register, operands)
+                    if rd is not None and rd != 0 and (rd, 0) in ((rs1, rs2), (rs2, rs1)):
+                        kind = 'mv'
+                elif instruction == 'addi' and len(operands) == 3:
+                    rd, rs1 = register(operands[0]), register(operands[1])
+                    if rd is not None and rd != 0 and rd == rs1 and immediate(operands[2]) == 0:
+                        kind = 'addi_0'
+                elif (instruction == 'lui' and len(operands) == 2 and index + 1 < len(lines)
+                      and index + 1 not in labeled and index + 1 not in pinned
+                      and index + 1 not in alignments):
+                    _, next_instruction, next_operands = lines[index + 1]
+                    rd = register(operands[0])
+                    if (next_instruction == 'addi' and len(next_operands) == 3 and rd is not None and rd != 0
+                            and register(next_operands[0]) == rd and register(next_operands[1]) == rd):
+                        upper, lower = immediate(operands[1]), immediate(next_operands[2])
+                        if upper is not None and lower is not None:
+                            value = ((upper << 12) + lower) & 0xFFFFFFFF
+                            value = value - (1 << 32) if value & 0x80000000 else value
+                            if -2048 <= value <= 2047:
+                                kind = 'lui_addi'
+                                replacement = (label, 'addi', [next_operands[0], 'x0', str(value)])
+                elif instruction in self.instructions and operands:
+                    info_type = self.instructions[instruction]['type']
+                    links = info_type == 'J' and (len(operands) == 1 or register(operands[0]) != 0)
+                    if (info_type == 'B' and len(operands) == 3) or (info_type == 'J' and not links):
+                        if self.labels.get(operands[-1]) == 4 * (index + 1):
+                            kind = 'jump_next'
+
+            if kind is None:
+                shifts.append(index - len(result))
+                if pending_label is not None and label is None:
+                    label, pending_label = pending_label, None
+                result.append((label, instruction, operands))
+                result_lines.append(line_table[index])
+                index += 1
+                continue
+
+            stats[kind] += 1
+            removed += 1
+            shifts.append(index - len(result))
+            if replacement is not None:
+                # El addi desaparece; el lui pasa a ser el addi con el valor completo
+                shifts.append(index - len(result))
+                result.append(replacement)
+                result_lines.append(line_table[index])
+                index += 2
+            else:
+                if label is not None:
+                    pending_label = label
+                index += 1
+        if len(lines) in alignments:
+            realign(len(lines))
+        shifts.append(len(lines) - len(result))
+
+        self.text_alignments = new_alignments
+        self.line_table = result_lines
+        self.labels = {name: address if name in self.data_labels else address - 4 * shifts[address // 4]
+                       for name, address in self.labels.items()}
+        return result, removed
+
+    def compressed_form(self, instruction: str, operands: List[str]) -> Optional[Tuple[str, List[str]]]:
+        """
+        Forma RV32C (mnemónico, operandos) equivalente a una instrucción real,
+        o None si no tiene. Los saltos y branches se proponen sin comprobar su
+        alcance, que decide compress.
+        """
+        register = self._known_register
+        immediate = self._known_immediate
+        count = len(operands)
+        
+        if instruction == 'addi' and count == 3:
+            rd, rs1, imm = register(operands[0]), register(operands[1]), immediate(operands[2])
+            if rd is None or rs1 is None or imm is None:
+                return None
+            if rd == 0:
+                return ('c.nop', []) if rs1 == 0 and imm == 0 else None
+            if rd == rs1 and imm != 0 and -32 <= imm <= 31:
+                return 'c.addi', [operands[0], operands[2]]
+            if rd == rs1 == 2 and imm != 0 and imm % 16 == 0 and -512 <= imm <= 496:
+                return 'c.addi16sp', [operands[0], operands[2]]
+            if rs1 == 0 and -32 <= imm <= 31:
+                return 'c.li', [operands[0], operands[2]]
+            if rs1 == 2 and 8 <= rd <= 15 and imm % 4 == 0 and 4 <= imm <= 1020:
+                return 'c.addi4spn', operands
+            if rs1 != 0 and imm == 0:
+                return 'c.mv', [operands[0], operands[1]]
+            return None
+        
+        if instruction == 'add' and count == 3:
+            rd, rs1, rs2 = map(register, operands)
+            if not rd or rs1 is None or rs2 is None:
+                return None
+            if rs1 == 0 and rs2 != 0:
+                return 'c.mv', [operands[0], operands[2]]
+            if rs2 == 0 and rs1 != 0:
+                return 'c.mv', [operands[0], operands[1]]
+            if rs1 == rd and rs2 != 0:
+                return 'c.add', [operands[0], operands[2]]
+            if rs2 == rd and rs1 != 0:
+                return 'c.add', [operands[0], operands[1]]
+            return None
+        
+        if instruction in ('sub', 'xor', 'or', 'and') and count == 3:
+            rd, rs1, rs2 = map(register, operands)
+            if all(reg is not None and 8 <= reg <= 15 for reg in (rd, rs1, rs2)):
+                if rd == rs1:
+                    return 'c.' + instruction, [operands[0], operands[2]]
+                if rd == rs2 and instruction != 'sub':
+                    return 'c.' + instruction, [operands[0], operands[1]]
+            return None
+        
+        if instruction in ('andi', 'slli', 'srli', 'srai') and count == 3:
+            rd, rs1, imm = register(operands[0]), register(operands[1]), immediate(operands[2])
+            if rd is None or rd != rs1 or imm is None:
+                return None
+            if instruction == 'andi':
+                fits = 8 <= rd <= 15 and -32 <= imm <= 31
+            else:
+                fits = 1 <= imm <= 31 and (rd != 0 if instruction == 'slli' else 8 <= rd <= 15)
+            return ('c.' + instruction, [operands[0], operands[2]]) if fits else None
+        
+        if instruction == 'lui' and count == 2:
+            rd, imm = register(operands[0]), immediate(operands[1])
+            if rd not in (None, 0, 2) and imm is not None and (1 <= imm <= 31 or 0xFFFE0 <= imm <= 0xFFFFF):
+                return 'c.lui', operands
+            return None
+        
+        if instruction in ('lw', 'sw') and count == 2:
+            # Sólo offsets numéricos: un offset con label depende de las direcciones
+            text, _, rest = operands[1].partition('(')
+            reg, base, offset = register(operands[0]), register(rest.rstrip(') ')), immediate(text)
+            if reg is None or base is None or offset is None or offset % 4:
+                return None
+            if base == 2 and 0 <= offset <= 252 and (reg != 0 or instruction == 'sw'):
+                return ('c.lwsp' if instruction == 'lw' else 'c.swsp'), operands
+            if 8 <= reg <= 15 and 8 <= base <= 15 and 0 <= offset <= 124:
+                return 'c.' + instruction, operands
+            return None
+        
+        if instruction == 'jal' and count in (1, 2):
+            rd = 1 if count == 1 else register(operands[0])
+            if rd == 0 or rd == 1:
+                return ('c.j' if rd == 0 else 'c.jal'), [operands[-1]]
+            return None
+        
+        if instruction == 'jalr' and count in (2, 3):
+            rd = register(operands[0])
+            if count == 3:
+                rs1, imm = register(operands[1]), immediate(operands[2])
+            elif '(' in operands[1]:
+                text, _, rest = operands[1].partition('(')
+                rs1, imm = register(rest.rstrip(') ')), immediate(text)
+            else:
+                rs1, imm = register(operands[1]), 0
+            if (rd == 0 or rd == 1) and rs1 and imm == 0:
+                return ('c.jr' if rd == 0 else 'c.jalr'), [f"x{rs1}"]
+            return None
+        
+        if instruction in ('beq', 'bne') and count == 3:
+            rs1, rs2 = register(operands[0]), register(operands[1])
+            if rs2 == 0 and rs1 is not None and 8 <= rs1 <= 15:
+                reg = operands[0]
+            elif rs1 == 0 and rs2 is not None and 8 <= rs2 <= 15:
+                reg = operands[1]
+            else:
+                return None
+            return ('c.beqz' if instruction == 'beq' else 'c.bnez'), [reg, operands[2]]
         
-        return parsed_lines
+        if instruction == 'ebreak' and not operands:
+            return 'c.ebreak', []
+        return None
+
+    def compress(self, parsed_lines: List[Tuple[Optional[str], str, List[str]]],
+                 auto: bool = True) -> List[Tuple[Optional[str], str, List[str]]]:
+        """
+        Paso RV32C entre las dos pasadas: fija las direcciones de un programa
+        con instrucciones de 2 bytes (las c.* escritas y, con auto, las reales
+        que admiten forma comprimida, ver compressed_form).
+        first_pass reserva 4 bytes por instrucción; aquí se recalculan las
+        direcciones, los labels de .text y el relleno de los '.align' (c.nop si
+        el hueco no es múltiplo de 4). Los saltos y branches comprimidos que no
+        alcanzan su destino vuelven a 32 bits hasta que nada cambia (los
+        tamaños sólo crecen, así que termina). Los destinos relativos ('.±N')
+        se miden sobre el programa tal como se escribió (c.* de 2 bytes) y se
+        corrigen con las direcciones nuevas.
+        Deja el tamaño de cada instrucción en instruction_sizes y el resumen
+        en compress_stats.
+        """
+        count = len(parsed_lines)
+        alignments = self.text_alignments
+        padding = set()
+        for aligned, (_, pad_count) in alignments.items():
+            padding.update(range(aligned - pad_count, aligned))
+        line_table = self.line_table
+        if len(line_table) != count:
+            line_table = array('I', bytes(4 * count))
+        text_labels = {name: address // 4 for name, address in self.labels.items()
+                       if name not in self.data_labels}
+        
+        # Destino ('.±N' o label de .text) de cada salto, como índice de instrucción
+        written = [0]
+        for _, instruction, _ in parsed_lines:
+            written.append(written[-1] + (2 if instruction in self.compressed_table else 4))
+        positions = {address: index for index, address in enumerate(written)}
+        relative = {}
+        targets = {}
+        sizes = [4] * count
+        forms: List[Optional[Tuple[str, List[str]]]] = [None] * count
+        for index, (_, instruction, operands) in enumerate(parsed_lines):
+            if index in padding:
+                sizes[index] = 0
+                continue
+            if instruction in self.compressed_table:
+                sizes[index] = 2
+            elif auto:
+                forms[index] = self.compressed_form(instruction, operands)
+            jump = instruction in COMPRESSED_JUMPS or self.instructions.get(instruction, {}).get('type') in ('B', 'J')
+            if not jump or not operands:
+                pass
+            elif operands[-1][:1] == '.':
+                try:
+                    target = positions.get(written[index] + self.parse_immediate(operands[-1][1:]))
+                    if target is None:
+                        raise ValueError(f"Destino relativo entre dos instrucciones: {operands[-1]}")
+                except ValueError as e:
+                    raise self._line_error(line_table[index], e)
+                while target in padding:
+                    target += 1  # el relleno se regenera: el destino pasa a la instrucción alineada
+                relative[index] = target
+                targets[index] = target
+            elif operands[-1] in text_labels:
+                targets[index] = text_labels[operands[-1]]
+            if forms[index] is not None:
+                if forms[index][0] in COMPRESSED_JUMPS and index not in targets:
+                    forms[index] = None  # destino desconocido o fuera de .text
+                else:
+                    sizes[index] = 2
+        
+        def layout():
+            # Dirección de cada instrucción (el relleno, al inicio de su hueco) y relleno de cada '.align'
+            addresses = [0] * (count + 1)
+            fill = {}
+            address = 0
+            for index in range(count + 1):
+                if index in alignments:
+                    fill[index] = -address % alignments[index][0]
+                    address += fill[index]
+                addresses[index] = address
+                if index < count:
+                    address += sizes[index]
+            return addresses, fill
+        
+        changed = True
+        while changed:
+            changed = False
+            addresses, fill = layout()
+            for index, form in enumerate(forms):
+                if form is None or form[0] not in COMPRESSED_JUMPS:
+                    continue
+                offset = addresses[targets[index]] - addresses[index]
+                limit = 256 if form[0] in ('c.beqz', 'c.bnez') else 2048
+                if not -limit <= offset <= limit - 2:
+                    forms[index] = None
+                    sizes[index] = 4
+                    changed = True
+        
+        result = []
+        result_lines = array('I')
+        result_sizes = bytearray()
+        new_alignments = {}
+        compressed = 0
+        for index in range(count + 1):
+            if index in alignments:
+                # Relleno nuevo, atribuido a la línea del relleno anterior o a la alineada
+                boundary, old_count = alignments[index]
+                source = index - 1 if old_count or index == count else index
+                line = line_table[source] if 0 <= source < count else 0
+                nops = [(None, 'c.nop', [])] if fill[index] % 4 else []
+                nops += [(None, 'addi', ['x0', 'x0', '0'])] * (fill[index] // 4)
+                result.extend(nops)
+                result_lines.extend([line] * len(nops))
+                result_sizes.extend(2 if nop[1] == 'c.nop' else 4 for nop in nops)
+                new_alignments[len(result)] = (boundary, len(nops))
+            if index == count or index in padding:
+                continue
+            label, instruction, operands = parsed_lines[index]
+            if forms[index] is not None:
+                instruction, operands = forms[index]
+            if index in relative:
+                operands = operands[:-1] + [f".{addresses[relative[index]] - addresses[index]:+d}"]
+            if sizes[index] == 2:
+                compressed += 1
+            result.append((label, instruction, operands))
+            result_lines.append(line_table[index])
+            result_sizes.append(sizes[index])
+        
+        self.compress_stats = {
+            'instructions': count - len(padding),
+            'compressed': compressed,
+            'bytes_before': 4 * count,
+            'bytes_after': addresses[count],
+        }
+        self.text_alignments = new_alignments
+        self.line_table = result_lines
+        self.instruction_sizes = result_sizes
+        self.labels = {name: address if name in self.data_labels else addresses[address // 4]
+                       for name, address in self.labels.items()}
+        return result
 
-    def second_pass(self, parsed_lines: List[Tuple[Optional[str], str, List[str]]]) -> List[int]:
-        """Segunda pasada: generar código máquina"""
+    def _encode_mixed(self, parsed_lines: List[Tuple[Optional[str], str, List[str]]]) -> List[int]:
+        """Codifica un programa con instrucciones de 2 y 4 bytes (ver compress)"""
         machine_code = []
         self.current_address = 0
+        self._reset_word_memo()
+        compressed = self.compressed_table
+        for (_, instruction, operands), size in zip(parsed_lines, self.instruction_sizes):
+            try:
+                entry = compressed.get(instruction)
+                if entry is None:
+                    code = self._encode_word(instruction, operands)
+                else:
+                    encoder, base = entry
+                    code = encoder(base, operands)
+            except Exception as e:
+                raise AssemblyError(str(e), address=self.current_address)
+            machine_code.append(code)
+            self.current_address += size
+        return machine_code
+        
+    def _block_leaders(self, parsed_lines: List[Tuple[Optional[str], str, List[str]]]) -> Set[int]:
+        """
+        Índices que empiezan un bloque básico además de los que siguen a un
+        salto: labels de .text, destinos de '.±N' e instrucciones alineadas.
+        Antes de compress los labels están en múltiplos de 4 y los '.±N' se
+        miden con las c.* de 2 bytes (ver compress); después, con instruction_sizes.
+        """
+        count = len(parsed_lines)
+        if self.instruction_sizes is not None:
+            addresses = list(accumulate(self.instruction_sizes, initial=0))
+        else:
+            addresses = list(accumulate((2 if entry[1] in self.compressed_table else 4 for entry in parsed_lines),
+                                        initial=0))
+        positions = {address: index for index, address in enumerate(addresses)}
+        
+        leaders = {0}
+        leaders.update(self.text_alignments)
+        for name, address in self.labels.items():
+            if name not in self.data_labels:
+                leaders.add(address // 4 if self.instruction_sizes is None else positions.get(address, count))
+        for index, (_, instruction, operands) in enumerate(parsed_lines):
+            if operands and operands[-1][:1] == '.':
+                offset = self._known_immediate(operands[-1][1:])
+                if offset is not None and addresses[index] + offset in positions:
+                    leaders.add(positions[addresses[index] + offset])
+        return leaders
+
+    def schedule(self, parsed_lines: List[Tuple[Optional[str], str, List[str]]]
+                 ) -> List[Tuple[Optional[str], str, List[str]]]:
+        """
+        Planificación opcional (--schedule) entre las dos pasadas: reordena
+        instrucciones independientes dentro de cada bloque básico para que el
+        resultado de un load no se use en la instrucción siguiente (ver
+        hazards.py). Los saltos, los labels y el relleno de '.align' no se
+        mueven, así que las direcciones de los labels no cambian.
+        Las paradas load-use antes y después quedan en schedule_stats.
+        """
+        padding = set()
+        for aligned, (_, count) in self.text_alignments.items():
+            padding.update(range(aligned - count, aligned))
+        types = {name: info['type'] for name, info in self.instructions.items()}
+        order, before, after = schedule_instructions(parsed_lines, self._block_leaders(parsed_lines), padding,
+                                                     self.registers, types)
+        self.schedule_stats = {
+            'stalls_before': before,
+            'stalls_after': after,
+            'moved': sum(1 for position, index in enumerate(order) if position != index),
+        }
+        
+        # Cada posición conserva su label: los bloques empiezan y acaban donde antes
+        if len(self.line_table) == len(parsed_lines):
+            self.line_table = array('I', [self.line_table[index] for index in order])
+        if self.instruction_sizes is not None:
+            self.instruction_sizes = bytearray(self.instruction_sizes[index] for index in order)
+        return [(parsed_lines[position][0],) + tuple(parsed_lines[index][1:])
+                for position, index in enumerate(order)]
+
+    def hazard_report(self, parsed_lines: List[Tuple[Optional[str], str, List[str]]]) -> HazardReport:
+        """
+        Riesgos load-use y de control y ciclos estimados de cada bloque básico
+        del programa ya ensamblado (--hazards, ver hazards.py)
+        """
+        types = {name: info['type'] for name, info in self.instructions.items()}
+        return analyze_hazards(parsed_lines, self._block_leaders(parsed_lines), self.registers, types)
+
+    def second_pass(self, parsed_lines: List[Tuple[Optional[str], str, List[str]]],
+                    workers: int = 1) -> List[int]:
+        """
+        Segunda pasada: generar código máquina
+        workers > 1 reparte la codificación entre procesos si hay al menos
+        parallel_threshold instrucciones (no con instrucciones comprimidas)
+        """
+        if self.instruction_sizes is not None:
+            return self._encode_mixed(parsed_lines)
+        if self.has_compressed:
+            raise AssemblyError("Las instrucciones comprimidas (c.*) necesitan compress antes de la segunda pasada")
+        if workers > 1 and len(parsed_lines) >= self.parallel_threshold:
+            return self._parallel_second_pass(parsed_lines, workers)
+        return self._encode_lines(parsed_lines, 0)
+
+    def _parallel_second_pass(self, parsed_lines: List[Tuple[Optional[str], str, List[str]]],
+                              workers: int) -> List[int]:
+        """
+        Codifica parsed_lines por bloques en un pool de procesos. Con los labels
+        ya fijados cada instrucción sólo depende de su dirección, así que cada
+        bloque se codifica de forma independiente y los resultados se concatenan
+        en orden.
+        """
+        chunk_size = -(-len(parsed_lines) // (workers * 4))
+        bounds = [(start, min(start + chunk_size, len(parsed_lines)))
+                  for start in range(0, len(parsed_lines), chunk_size)]
+        
+        machine_code = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_encode_worker,
+                                 initargs=(type(self), self.memo_size, dict(self.labels), dict(self.constants),
+                                           self.data_base, parsed_lines)) as executor:
+            for codes in executor.map(_encode_chunk, bounds):
+                machine_code.extend(codes)
+        
+        self.current_address = len(parsed_lines) * 4
+        return machine_code
+
+    def _encode_lines(self, parsed_lines: Iterable[Tuple[Optional[str], str, List[str]]],
+                      start_address: int) -> List[int]:
+        """Codifica instrucciones consecutivas a partir de start_address"""
+        machine_code = []
+        self.current_address = start_address
+        
+        table = self.encoding_table
+        self._reset_word_memo()
+        memo = self._word_memo
+        memo_mnemonics = self._memo_mnemonics
+        memo_size = self.memo_size
+        hits = misses = 0
         
         for line_label, instruction, operands in parsed_lines:
             try:
-                if instruction not in self.instructions:
+                entry = table.get(instruction)
+                if entry is None:
                     raise ValueError(f"Instrucción no reconocida: {instruction}")
                 
-                info = self.instructions[instruction]
-                
-                if info['type'] == 'R':
-                    code = self.encode_r_type(info, operands)
-                elif info['type'] == 'I':
-                    code = self.encode_i_type(info, operands)
-                elif info['type'] == 'S':
-                    code = self.encode_s_type(info, operands)
-                elif info['type'] == 'B':
-                    code = self.encode_b_type(info, operands)
-                elif info['type'] == 'U':
-                    code = self.encode_u_type(info, operands)
-                elif info['type'] == 'J':
-                    code = self.encode_j_type(info, operands)
+                if instruction in memo_mnemonics:
+                    key = (instruction, *operands)
+                    code = memo.get(key)
+                    if code is None:
+                        misses += 1
+                        encoder, base = entry
+                        code = encoder(base, operands)
+                        if not operands or not operands[-1].startswith('%pcrel'):
+                            if len(memo) >= memo_size:
+                                memo.clear()
+                            memo[key] = code
+                        if misses % MEMO_PROBE == 0 and hits < (hits + misses) * MEMO_MIN_HIT_RATE:
+                            # Casi no acierta: el resto se codifica sin memo
+                            memo_mnemonics = self._memo_mnemonics = frozenset()
+                            memo.clear()
+                    else:
+                        hits += 1
                 else:
-                    raise ValueError(f"Tipo de instrucción desconocido: {info['type']}")
+                    encoder, base = entry
+                    code = encoder(base, operands)
                 
                 machine_code.append(code)
                 self.current_address += 4
                 
             except Exception as e:
-                addr = self.current_address
-                raise ValueError(f"Error en dirección 0x{addr:08x}: {e}")
+                raise AssemblyError(str(e), address=self.current_address)
         
+        self.memo_stats['word_hits'] += hits
+        self.memo_stats['word_misses'] += misses
         return machine_code
 
-    def assemble_file(self, input_file: str, output_base: str):
-        """Ensambla un archivo completo"""
-        try:
-            # Leer archivo de entrada
-            with open(input_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+    def one_pass(self, lines: Iterable[str]) -> Tuple[array, List[Tuple[Optional[str], str, List[str]]]]:
+        """
+        Ensamblado en una sola pasada con tabla de fixups.
+        
+        Cada instrucción se codifica al leerla. Las que dependen de un label
+        todavía no definido (branches, jal, 'la' y los operandos de memoria
+        label(reg)) se registran en una tabla de fixups por label y se vuelven
+        a codificar en su sitio cuando el label aparece. Un 'la' hacia delante reserva siempre lui + addi con
+        %hi/%lo, porque su tamaño no puede decidirse al emitirlo.
+        
+        Retorna (código máquina, líneas parseadas para el listado).
+        """
+        self.labels = {}
+        self.current_address = 0
+        self.data_image = bytearray()
+        self.has_compressed = False
+        self.instruction_sizes = None
+        machine_code = array('I')
+        parsed_lines = []
+        line_table = self.line_table = array('I')
+        fixups: Dict[str, List[int]] = {}  # label -> índices pendientes de codificar
+        table = self.encoding_table
+        
+        self.preprocessor = None
+        for line_num, (label, instruction, operands) in enumerate(self.tokenize_source(lines), 1):
+            try:
+                if label:
+                    if label in self.labels:
+                        raise ValueError(f"Label duplicado: {label}")
+                    self.labels[label] = self.current_address
+                
+                if instruction:
+                    if instruction[0] == '.':
+                        raise ValueError(f"Directiva no soportada en modo de una pasada: {instruction}")
+                    if instruction == 'la' and len(operands) == 2 and operands[1] not in self.labels:
+                        rd, target = operands
+                        expanded = [('lui', [rd, f"%hi({target})"]), ('addi', [rd, rd, f"%lo({target})"])]
+                    elif instruction in self.pseudo_instructions:
+                        expanded = self.expand_pseudo_instruction(instruction, operands)
+                    elif instruction in self.instructions:
+                        expanded = [(instruction, operands)]
+                    elif instruction in self.compressed_table:
+                        raise ValueError(f"Instrucción comprimida no soportada en modo de una pasada: {instruction}")
+                    else:
+                        raise ValueError(f"Instrucción desconocida: {instruction}")
+                    
+                    entry_label = label if instruction in self.instructions else None
+                    for exp_inst, exp_ops in expanded:
+                        target = self.label_reference(exp_inst, exp_ops) or self.memory_label(exp_ops)
+                        if target is not None and target not in self.labels:
+                            fixups.setdefault(target, []).append(len(machine_code))
+                            code = 0
+                        else:
+                            encoder, base = table[exp_inst]
+                            code = encoder(base, exp_ops)
+                        
+                        machine_code.append(code)
+                        parsed_lines.append((entry_label, exp_inst, exp_ops))
+                        line_table.append(line_num)
+                        self.current_address += 4
+                
+            except Exception as e:
+                raise self._line_error(line_num, e)
             
-            print(f"Procesando {len(lines)} líneas...")
+            if label and label in fixups:
+                self._apply_fixups(fixups.pop(label), machine_code, parsed_lines)
+        
+        # Labels nunca definidos: se codifican igual que en second_pass
+        for pending in fixups.values():
+            self._apply_fixups(pending, machine_code, parsed_lines)
+        
+        return machine_code, parsed_lines
+
+    def _apply_fixups(self, indices: List[int], machine_code: array,
+                      parsed_lines: List[Tuple[Optional[str], str, List[str]]]):
+        """Vuelve a codificar en su sitio las instrucciones pendientes de un label"""
+        end_address = self.current_address
+        
+        for index in indices:
+            _, instruction, operands = parsed_lines[index]
+            self.current_address = index * 4
+            try:
+                encoder, base = self.encoding_table[instruction]
+                machine_code[index] = encoder(base, operands)
+            except Exception as e:
+                raise AssemblyError(str(e), address=self.current_address)
+        
+        self.current_address = end_address
+
+    def assemble_stream(self, source: Union[str, Iterable[str], Callable[[], Iterable[str]]],
+                        sinks: List['OutputSink']) -> int:
+        """
+        Ensambla en modo streaming con memoria acotada.
+        
+        La primera pasada sólo conserva la tabla de labels y el tamaño de cada
+        instrucción relajable (ver relax); la segunda vuelve a leer la fuente y
+        envía cada palabra codificada a los sinks sin construir listas de
+        líneas, instrucciones ni código máquina.
+        
+        source puede ser una ruta, una función que devuelve un iterable nuevo de
+        líneas en cada llamada, o un iterable. Un iterador de un solo uso se
+        copia a un archivo temporal durante la primera pasada.
+        
+        Retorna el número de instrucciones generadas.
+        """
+        with ExitStack() as stack:
+            if isinstance(source, str):
+                path = source
+                source = lambda: stack.enter_context(open(path, 'r', encoding='utf-8'))
+            elif not callable(source):
+                if iter(source) is source:
+                    spool = stack.enter_context(tempfile.TemporaryFile('w+', encoding='utf-8'))
+                    source = _spooled_source(source, spool)
+                else:
+                    lines = source
+                    source = lambda: lines
             
-            # Primera pasada: recopilar labels
-            parsed_lines = self.first_pass(lines)
-            print(f"Labels encontrados: {list(self.labels.keys())}")
+            # Primera pasada: relajación (sólo se guardan los labels y el tamaño
+            # de cada instrucción relajable, no las líneas)
+            self.preprocessor = None
+            with self.stats.phase('first_pass'):
+                sizes, self.labels = self.relax(self.tokenize_source(source()))
+            self.stats.lines += self.preprocessor.line_count
             
-            # Segunda pasada: generar código máquina
-            machine_code = self.second_pass(parsed_lines)
-            print(f"Generadas {len(machine_code)} instrucciones")
+            self._feed_sinks(sinks, 'begin', self.labels)
             
-            # Escribir archivo binario
-            with open(f"{output_base}.bin", 'wb') as f:
-                for code in machine_code:
-                    # Escribir como little-endian de 32 bits
-                    f.write(code.to_bytes(4, byteorder='little'))
+            # Segunda pasada: expansión con los tamaños relajados, igual que first_pass
+            # Las palabras se acumulan en bloques acotados para escribirlas con write_many
+            # (el tiempo de los sinks se descuenta de second_pass)
+            self.stats.add('second_pass', 0.0)  # Antes que los write.<formato> en el informe
+            start = time.perf_counter()
+            writing = sum(seconds for name, seconds in self.stats.phases.items() if name.startswith('write.'))
+            self._reset_word_memo()
+            histogram = Counter()
+            count = 0
+            block_codes = array('I')
+            block_lines = []
+            for entry in self._iter_instructions(self.tokenize_source(source()), {}, (sizes, self.labels)):
+                address = self.current_address
+                try:
+                    code = self._encode_word(entry[1], entry[2])
+                except Exception as e:
+                    if entry[1] in self.compressed_table:
+                        e = f"Instrucción comprimida no soportada en modo streaming: {entry[1]}"
+                    raise AssemblyError(str(e), address=address)
+                
+                histogram[entry[1]] += 1
+                block_codes.append(code)
+                block_lines.append(entry)
+                if len(block_codes) == STREAM_BLOCK:
+                    self._feed_sinks(sinks, 'write_many', address - 4 * (STREAM_BLOCK - 1), block_codes, block_lines)
+                    count += STREAM_BLOCK
+                    block_codes = array('I')
+                    block_lines = []
             
-            # Escribir archivo hexadecimal
-            with open(f"{output_base}.hex", 'w') as f:
-                for i, code in enumerate(machine_code):
-                    addr = i * 4
-                    f.write(f"{addr:08x}: {code:08x}\n")
+            if block_codes:
+                self._feed_sinks(sinks, 'write_many', 4 * count, block_codes, block_lines)
+                count += len(block_codes)
             
-            # Escribir archivo de texto con información detallada
-            with open(f"{output_base}.txt", 'w') as f:
-                f.write("RISC-V Assembly to Machine Code\n")
-                f.write("=" * 50 + "\n\n")
+            self._feed_sinks(sinks, 'finish')
+            writing = sum(seconds for name, seconds in self.stats.phases.items()
+                          if name.startswith('write.')) - writing
+            self.stats.add('second_pass', time.perf_counter() - start - writing)
+            self.stats.histogram = dict(histogram)
+            self.stats.instructions = count
+        
+        return count
+
+    def assemble(self, source: Union[str, Iterable[str]], optimize: bool = False,
+                 source_dir: str = '', debug: bool = False, compress: bool = False,
+                 schedule: bool = False) -> AssemblyResult:
+        """
+        Ensambla en memoria, sin leer ni escribir archivos ni imprimir nada.
+        source: texto del programa o sus líneas
+        optimize: aplica peephole entre las dos pasadas (como -O)
+        source_dir: directorio desde el que se resuelven .include/.incbin
+        debug: calcula también las tablas de líneas y símbolos (debug_info)
+        compress: usa las formas comprimidas RV32C siempre que se pueda (como
+                  --auto-compress); las c.* escritas se admiten siempre
+        schedule: reordena instrucciones para evitar paradas load-use (como --schedule)
+        Cada llamada parte de cero (labels, constantes, .data), así que el
+        mismo ensamblador puede reutilizarse; sólo se conservan las memos.
+        Lanza AssemblyError con la línea o la dirección del error.
+        """
+        lines = source.splitlines(True) if isinstance(source, str) else list(source)
+        self.stats = AssemblyStats()
+        self.source_dir = source_dir
+        self.source_name = None
+        try:
+            parsed_lines = self.first_pass(lines)
+            if optimize:
+                parsed_lines = self.peephole(parsed_lines)
+            if schedule:
+                parsed_lines = self.schedule(parsed_lines)
+            if compress or self.has_compressed:
+                parsed_lines = self.compress(parsed_lines, compress)
+            machine_code = self.second_pass(parsed_lines)
+        except AssemblyError:
+            raise
+        except (ValueError, OSError) as e:
+            raise AssemblyError(str(e))
+        
+        self.stats.instructions = len(machine_code)
+        sizes = bytes(self.instruction_sizes) if self.instruction_sizes is not None else None
+        return AssemblyResult(array('I', machine_code), dict(self.labels), parsed_lines,
+                              bytes(self.data_image), self.data_base,
+                              self.debug_info() if debug else None, sizes)
+
+    def debug_info(self, base: int = 0) -> DebugInfo:
+        """Tablas de líneas y símbolos del último ensamblado (ver debuginfo.py)"""
+        if self.preprocessor is not None:
+            locate = self.preprocessor.locate
+        else:
+            locate = lambda line_num: (self.source_name, line_num, None)
+        return build_debug_info(self.line_table, locate, self.labels, base, self.instruction_sizes)
+
+    def assemble_file(self, input_file: str, output_base: str, stream: bool = False,
+                      one_pass: bool = False, cache: Optional['AssemblyCache'] = None,
+                      encode_workers: int = 1, emit_object: bool = False,
+                      formats: Sequence[str] = DEFAULT_FORMATS, optimize: bool = False,
+                      profile: bool = False, text: Optional[str] = None, debug: bool = False,
+                      compress: bool = False, hazards: bool = False, schedule: bool = False):
+        """
+        Ensambla un archivo completo
+        text: contenido del fuente; si se da no se lee input_file, que sólo se usa
+              en los mensajes y para resolver .include/.incbin
+        formats: formatos de salida a generar (ver OUTPUT_FORMATS)
+        optimize: aplica peephole entre las dos pasadas (sólo en modo de dos pasadas)
+        emit_object: genera sólo un archivo objeto reubicable <output_base>.o
+        cache: caché en disco opcional; no se usa en modo streaming ni con .incbin/.include
+        encode_workers: procesos para la segunda pasada (ver second_pass)
+        debug: genera además <output_base>.dbg con las tablas de líneas y símbolos
+        compress: pasa a RV32C (16 bits) todas las instrucciones que lo admiten;
+                  las c.* escritas en el fuente se admiten siempre (sólo en modo de dos pasadas)
+        hazards: anota en el listado los riesgos del pipeline y los ciclos de cada bloque
+        schedule: reordena instrucciones independientes para evitar paradas load-use
+        profile: mide además el pico de memoria con tracemalloc (más lento)
+        Los tiempos por fase y los contadores quedan en self.stats.
+        Retorna True si el ensamblado terminó sin errores
+        """
+        self.stats = stats = AssemblyStats()
+        tracing = profile and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        elif profile:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        
+        try:
+            if optimize and (stream or one_pass or emit_object):
+                raise ValueError("-O sólo está disponible en el modo de dos pasadas")
+            if debug and (stream or emit_object):
+                raise ValueError("-g no está disponible en modo streaming ni con -c")
+            if compress and (stream or one_pass or emit_object):
+                raise ValueError("--auto-compress sólo está disponible en el modo de dos pasadas")
+            if (hazards or schedule) and (stream or one_pass or emit_object):
+                raise ValueError("--hazards y --schedule sólo están disponibles en el modo de dos pasadas")
+            
+            self.source_dir = os.path.dirname(input_file)
+            self.source_name = input_file
+            self.has_compressed = False
+            self.instruction_sizes = None
+            
+            if stream:
+                with ExitStack() as stack:
+                    if text is not None:
+                        f = io.StringIO(text)
+                    else:
+                        f = stack.enter_context(open(input_file, 'r', encoding='utf-8'))
+                    
+                    def source():
+                        f.seek(0)
+                        return f
+                    
+                    print(f"Procesando {input_file} en modo streaming...")
+                    count = self.assemble_stream(source, open_sinks(stack, output_base, formats))
                 
-                f.write("LABELS:\n")
-                for label, addr in self.labels.items():
-                    f.write(f"  {label}: 0x{addr:08x}\n")
-                f.write("\n" + "=" * 50 + "\n\n")
+                print(f"Labels encontrados: {list(self.labels.keys())}")
+                print(f"Generadas {count} instrucciones")
+            else:
+                # Leer archivo de entrada
+                with stats.phase('read'):
+                    if text is not None:
+                        lines = text.splitlines(True)
+                    else:
+                        with open(input_file, 'r', encoding='utf-8') as f:
+                            lines = f.readlines()
                 
-                for i, (code, (_, instruction, operands)) in enumerate(zip(machine_code, parsed_lines)):
-                    addr = i * 4
-                    binary = f"{code:032b}"
-                    hex_code = f"{code:08x}"
+                print(f"Procesando {len(lines)} líneas...")
+                
+                if emit_object:
+                    from linker import assemble_object, write_object
+                    
+                    with stats.phase('assemble_object'):
+                        obj = assemble_object(lines, self)
+                    with stats.phase('write.o'):
+                        write_object(f"{output_base}.o", obj)
+                    stats.instructions = len(obj.code)
+                    print(f"Labels encontrados: {list(obj.symbols.keys())}")
+                    print(f"Generadas {len(obj.code)} instrucciones, {len(obj.relocations)} reubicaciones")
+                    print(f"Archivos generados:")
+                    print(f"  - {output_base}.o (objeto)")
+                    return True
+                
+                key = None
+                cached = None
+                uncached = debug or compress or hazards or schedule
+                source = ''.join(lines) if cache is not None and not uncached else ''
+                if cache is not None and not uncached and '.incbin' not in source and '.include' not in source:
+                    # Con .incbin/.include el resultado depende de archivos que la clave no cubre;
+                    # la caché no guarda la tabla de líneas que necesita -g, los tamaños de RV32C
+                    # ni el análisis de --hazards/--schedule (las c.* escritas se ven tras first_pass)
+                    with stats.phase('cache'):
+                        mode = 'one-pass' if one_pass else 'two-pass-O' if optimize else 'two-pass'
+                        key = cache.key(source, self, mode)
+                        cached = cache.get(key)
+                
+                if cached is not None:
+                    self.labels, machine_code, parsed_lines, self.data_image = cached
+                    stats.lines = len(lines)
+                    print(f"Resultado recuperado de la caché ({key[:12]})")
+                    print(f"Labels encontrados: {list(self.labels.keys())}")
+                elif one_pass:
+                    with stats.phase('one_pass'):
+                        machine_code, parsed_lines = self.one_pass(lines)
+                    stats.lines = self.preprocessor.line_count
+                    print(f"Labels encontrados: {list(self.labels.keys())}")
+                else:
+                    # Primera pasada: recopilar labels
+                    with stats.phase('first_pass'):
+                        parsed_lines = self.first_pass(lines)
+                    print(f"Labels encontrados: {list(self.labels.keys())}")
                     
-                    f.write(f"Address: 0x{addr:08x}\n")
-                    f.write(f"Assembly: {instruction} {', '.join(operands)}\n")
-                    f.write(f"Binary:   {binary}\n")
-                    f.write(f"Hex:      {hex_code}\n")
-                    f.write("-" * 40 + "\n")
+                    if optimize:
+                        before = len(parsed_lines)
+                        with stats.phase('peephole'):
+                            parsed_lines = self.peephole(parsed_lines)
+                        saved = before - len(parsed_lines)
+                        detail = ', '.join(f"{name}: {count}" for name, count in self.peephole_stats.items())
+                        print(f"Optimización -O: {saved} instrucciones eliminadas "
+                              f"({saved / max(before, 1):.1%}; {detail})")
+                    
+                    if schedule:
+                        with stats.phase('schedule'):
+                            parsed_lines = self.schedule(parsed_lines)
+                        summary = self.schedule_stats
+                        print(f"Planificación --schedule: paradas load-use de {summary['stalls_before']} "
+                              f"a {summary['stalls_after']} ({summary['moved']} instrucciones movidas)")
+                    
+                    if compress or self.has_compressed:
+                        with stats.phase('compress'):
+                            parsed_lines = self.compress(parsed_lines, compress)
+                        summary = self.compress_stats
+                        before, after = summary['bytes_before'], summary['bytes_after']
+                        print(f"Compresión RV32C: {summary['compressed']} de {summary['instructions']} "
+                              f"instrucciones en 16 bits; código de {before} a {after} bytes "
+                              f"({(before - after) / max(before, 1):.1%} menos)")
+                    
+                    # Segunda pasada: generar código máquina
+                    with stats.phase('second_pass'):
+                        machine_code = self.second_pass(parsed_lines, encode_workers)
+                    
+                    if hazards:
+                        with stats.phase('hazards'):
+                            report = self.hazard_report(parsed_lines)
+                        print(f"Riesgos del pipeline: {report.summary()}")
+                print(f"Generadas {len(machine_code)} instrucciones")
+                stats.instructions = len(machine_code)
+                stats.histogram = dict(Counter(entry[1] for entry in parsed_lines))
+                
+                if key is not None and cached is None and not self.has_compressed:
+                    with stats.phase('cache'):
+                        cache.put(key, self.labels, machine_code, parsed_lines, self.data_image)
+                
+                # Escribir archivos de salida
+                with ExitStack() as stack:
+                    sinks = open_sinks(stack, output_base, formats)
+                    self._feed_sinks(sinks, 'begin', self.labels)
+                    if hazards:
+                        offsets = (list(accumulate(self.instruction_sizes, initial=0))
+                                   if self.instruction_sizes is not None else range(0, 4 * len(parsed_lines), 4))
+                        self._feed_sinks(sinks, 'annotate', {offsets[index]: notes
+                                                             for index, notes in report.notes.items()})
+                    self._feed_sinks(sinks, 'write_many', 0, machine_code, parsed_lines,
+                                     self.instruction_sizes)
+                    self._feed_sinks(sinks, 'finish')
             
-            print(f"Archivos generados:")
-            print(f"  - {output_base}.bin (binario)")
-            print(f"  - {output_base}.hex (hexadecimal)")
-            print(f"  - {output_base}.txt (información detallada)")
+            print_generated(output_base, formats)
+            if self.data_image:
+                with stats.phase('write.data'), open(f"{output_base}.data.bin", 'wb') as f:
+                    f.write(self.data_image)
+                print(f"  - {output_base}.data.bin (sección .data, {len(self.data_image)} bytes "
+                      f"en 0x{self.data_base:08x})")
+            if debug:
+                with stats.phase('write.dbg'):
+                    write_debug_info(f"{output_base}.dbg", self.debug_info())
+                print(f"  - {output_base}.dbg (tabla de líneas y símbolos)")
+            return True
             
         except FileNotFoundError:
             print(f"Error: No se pudo encontrar el archivo {input_file}")
         except Exception as e:
             print(f"Error durante el ensamblado: {e}")
+        finally:
+            stats.total_seconds = time.perf_counter() - start
+            if profile:
+                stats.peak_memory = tracemalloc.get_traced_memory()[1]
+            if tracing:
+                tracemalloc.stop()
+        return False
+
+
+# Estado de cada proceso del pool de _parallel_second_pass
+_encode_worker = {}
+
+
+def _init_encode_worker(assembler_class, memo_size: int, labels: Dict[str, int], constants: Dict[str, int],
+                        data_base: int, parsed_lines: List[Tuple[Optional[str], str, List[str]]]):
+    """Crea el ensamblador del proceso con las tablas de labels y constantes (.equ) congeladas"""
+    assembler = assembler_class(memo_size=memo_size)
+    assembler.labels = labels
+    assembler.constants = constants
+    assembler.data_base = data_base
+    _encode_worker['assembler'] = assembler
+    _encode_worker['parsed_lines'] = parsed_lines
+
+
+def _encode_chunk(bounds: Tuple[int, int]) -> array:
+    """Codifica parsed_lines[start:end] en un proceso del pool"""
+    start, end = bounds
+    assembler = _encode_worker['assembler']
+    return array('I', assembler._encode_lines(_encode_worker['parsed_lines'][start:end], start * 4))
+
+
+def _spooled_source(lines: Iterable[str], spool) -> Callable[[], Iterable[str]]:
+    """Fuente reutilizable sobre un iterador de un solo uso, copiado a `spool` en la primera lectura"""
+    state = {'spooled': False}
+    
+    def first_read():
+        for line in lines:
+            spool.write(line if line.endswith('\n') else line + '\n')
+            yield line
+        state['spooled'] = True
+    
+    def source():
+        if not state['spooled']:
+            return first_read()
+        spool.seek(0)
+        return spool
+    
+    return source
+
+
+# Instrucciones por bloque en las escrituras en bloque
+WRITE_CHUNK = 65536
+
+
+class OutputSink:
+    """Destino de las palabras codificadas, recibidas en orden de dirección"""
+    
+    # Formato de OUTPUT_FORMATS con el que se abrió (ver open_sinks)
+    name = 'sink'
+    
+    def __init__(self, f):
+        self.f = f
+    
+    def begin(self, labels: Dict[str, int]):
+        """Se llama una vez, con la tabla de labels completa, antes de la primera palabra"""
+    
+    def annotate(self, notes: Dict[int, List[Tuple[str, str]]]):
+        """Notas (tipo, texto) por dirección, antes de la primera palabra; sólo las usa el listado"""
+    
+    def write(self, address: int, code: int, instruction: str, operands: List[str], size: int = 4):
+        raise NotImplementedError
+    
+    def write_many(self, address: int, codes: Sequence[int],
+                   parsed_lines: Sequence[Tuple[Optional[str], str, List[str]]],
+                   sizes: Optional[Sequence[int]] = None):
+        """
+        Escribe palabras consecutivas desde `address`; los sinks la reimplementan
+        en bloque. sizes: bytes de cada instrucción (2 o 4) si hay comprimidas
+        """
+        if sizes is None:
+            sizes = repeat(4, len(codes))
+        for code, (_, instruction, operands), size in zip(codes, parsed_lines, sizes):
+            self.write(address, code, instruction, operands, size)
+            address += size
+    
+    def finish(self):
+        """Se llama tras la última palabra"""
+
+
+class BinarySink(OutputSink):
+    """Código máquina binario little-endian de 32 bits"""
+    
+    def write(self, address, code, instruction, operands, size=4):
+        self.f.write(code.to_bytes(size, byteorder='little'))
+    
+    def write_many(self, address, codes, parsed_lines, sizes=None):
+        if sizes is not None:
+            self.f.write(mixed_bytes(codes, sizes))
+            return
+        words = codes if isinstance(codes, array) and codes.typecode == 'I' else array('I', codes)
+        if sys.byteorder == 'big':
+            words = array('I', words)
+            words.byteswap()
+        self.f.write(words.tobytes())
+
+
+class HexSink(OutputSink):
+    """Una línea 'dirección: código' por instrucción"""
+    
+    def write(self, address, code, instruction, operands, size=4):
+        self.f.write(f"{address:08x}: {code:0{2 * size}x}\n")
+    
+    def write_many(self, address, codes, parsed_lines, sizes=None):
+        if sizes is not None:
+            return super().write_many(address, codes, parsed_lines, sizes)
+        # Un único formateo '%' por bloque es más rápido que un f-string por línea
+        for start in range(0, len(codes), WRITE_CHUNK):
+            chunk = codes[start:start + WRITE_CHUNK]
+            addresses = range(address + start * 4, 2 ** 63, 4)
+            self.f.write(("%08x: %08x\n" * len(chunk)) % tuple(chain.from_iterable(zip(addresses, chunk))))
+
+
+class ListingSink(OutputSink):
+    """Listado detallado con labels, assembly, binario y hexadecimal"""
+    
+    SEPARATOR = "-" * 40
+    
+    def __init__(self, f):
+        super().__init__(f)
+        self.notes = {}  # dirección -> [(tipo, texto)] (ver annotate)
+    
+    def annotate(self, notes):
+        self.notes = notes
+    
+    def begin(self, labels):
+        self.f.write("RISC-V Assembly to Machine Code\n")
+        self.f.write("=" * 50 + "\n\n")
+        
+        self.f.write("LABELS:\n")
+        for label, addr in labels.items():
+            self.f.write(f"  {label}: 0x{addr:08x}\n")
+        self.f.write("\n" + "=" * 50 + "\n\n")
+    
+    def write(self, address, code, instruction, operands, size=4):
+        self.f.write(self._format(address, code, instruction, operands, size))
+    
+    def _format(self, address, code, instruction, operands, size=4):
+        notes = ''.join(f"{kind + ':':<10}{text}\n" for kind, text in self.notes.get(address, ()))
+        return (f"Address: 0x{address:08x}\n"
+                f"Assembly: {instruction} {', '.join(operands)}\n"
+                f"Binary:   {code:0{8 * size}b}\n"
+                f"Hex:      {code:0{2 * size}x}\n"
+                f"{notes}{self.SEPARATOR}\n")
+    
+    def write_many(self, address, codes, parsed_lines, sizes=None):
+        if sizes is not None or self.notes:
+            return super().write_many(address, codes, parsed_lines, sizes)
+        separator = self.SEPARATOR
+        for start in range(0, len(codes), WRITE_CHUNK):
+            chunk = zip(range(address + start * 4, 2 ** 63, 4), codes[start:start + WRITE_CHUNK],
+                        parsed_lines[start:start + WRITE_CHUNK])
+            self.f.write(''.join([
+                f"Address: 0x{addr:08x}\nAssembly: {instruction} {', '.join(operands)}\n"
+                f"Binary:   {code:032b}\nHex:      {code:08x}\n{separator}\n"
+                for addr, code, (_, instruction, operands) in chunk
+            ]))
+
+
+class IntelHexSink(OutputSink):
+    """Intel HEX: registros de datos de 16 bytes y registros de dirección lineal extendida"""
+    
+    def __init__(self, f):
+        super().__init__(f)
+        self.upper = 0  # 16 bits superiores de la dirección vigente
+    
+    def _record(self, address: int, kind: int, data: bytes):
+        fields = bytes([len(data), (address >> 8) & 0xFF, address & 0xFF, kind]) + data
+        checksum = (-sum(fields)) & 0xFF
+        self.f.write(f":{fields.hex().upper()}{checksum:02X}\n")
+    
+    def write(self, address, code, instruction, operands, size=4):
+        self.write_many(address, [code], None, [size])
+    
+    def write_many(self, address, codes, parsed_lines, sizes=None):
+        if sizes is not None:
+            data = mixed_bytes(codes, sizes)
+        else:
+            words = array('I', codes)
+            if sys.byteorder == 'big':
+                words.byteswap()
+            data = words.tobytes()
+        
+        pos = 0
+        while pos < len(data):
+            addr = address + pos
+            if addr >> 16 != self.upper:
+                self.upper = addr >> 16
+                self._record(0, 0x04, self.upper.to_bytes(2, 'big'))
+            # Un registro no cruza un límite de 64 KiB
+            size = min(16, len(data) - pos, 0x10000 - (addr & 0xFFFF))
+            self._record(addr & 0xFFFF, 0x00, data[pos:pos + size])
+            pos += size
+    
+    def finish(self):
+        self.f.write(":00000001FF\n")
+
+
+class VerilogMemSink(OutputSink):
+    """Archivo para $readmemh: una palabra hexadecimal por línea, '@' con la dirección de palabra"""
+    
+    def __init__(self, f):
+        super().__init__(f)
+        self.next_address = 0
+        self.pending = b''  # media palabra final de instrucciones comprimidas
+    
+    def write(self, address, code, instruction, operands, size=4):
+        self.write_many(address, [code], None, [size])
+    
+    def write_many(self, address, codes, parsed_lines, sizes=None):
+        if sizes is not None:
+            # Con instrucciones de 2 bytes se empaqueta la imagen en palabras de 32 bits
+            data = self.pending + mixed_bytes(codes, sizes)
+            address -= len(self.pending)
+            end = len(data) - len(data) % 4
+            self.pending = data[end:]
+            codes = array('I', data[:end])
+            if sys.byteorder == 'big':
+                codes.byteswap()
+        if address != self.next_address:
+            self.f.write(f"@{address // 4:08x}\n")
+        self.f.write(("%08x\n" * len(codes)) % tuple(codes))
+        self.next_address = address + 4 * len(codes)
+    
+    def finish(self):
+        if self.pending:
+            # Última media palabra, completada con ceros
+            self.f.write(f"{int.from_bytes(self.pending + bytes(2), 'little'):08x}\n")
+
+
+# Formatos de salida: nombre -> (extensión, modo de apertura, sink, descripción)
+OUTPUT_FORMATS = {
+    'bin': ('bin', 'wb', BinarySink, 'binario'),
+    'hex': ('hex', 'w', HexSink, 'hexadecimal'),
+    'txt': ('txt', 'w', ListingSink, 'información detallada'),
+    'ihex': ('ihex', 'w', IntelHexSink, 'Intel HEX'),
+    'verilog-mem': ('mem', 'w', VerilogMemSink, 'memoria para $readmemh'),
+}
+
+
+def parse_formats(text: str) -> List[str]:
+    """Convierte 'bin,hex' en una lista de formatos válidos"""
+    formats = [name.strip() for name in text.split(',') if name.strip()]
+    for name in formats:
+        if name not in OUTPUT_FORMATS:
+            raise ValueError(f"Formato de salida desconocido: {name} "
+                             f"(disponibles: {', '.join(OUTPUT_FORMATS)})")
+    return formats
+
+
+def open_sinks(stack: ExitStack, output_base: str, formats: Sequence[str] = DEFAULT_FORMATS) -> List[OutputSink]:
+    """Abre un archivo y su sink por cada formato pedido"""
+    sinks = []
+    for name in formats:
+        extension, mode, sink_class, _ = OUTPUT_FORMATS[name]
+        sink = sink_class(stack.enter_context(open(f"{output_base}.{extension}", mode)))
+        sink.name = name
+        sinks.append(sink)
+    return sinks
+
+
+def print_generated(output_base: str, formats: Sequence[str] = DEFAULT_FORMATS):
+    print(f"Archivos generados:")
+    for name in formats:
+        extension, _, _, description = OUTPUT_FORMATS[name]
+        print(f"  - {output_base}.{extension} ({description})")
+
+
+class AssemblyCache:
+    """
+    Caché en disco de resultados de ensamblado, direccionada por contenido.
+    
+    La clave es un hash del texto fuente, la versión del ensamblador, la
+    tabla de instrucciones, el modo de ensamblado y la base de .data. Cada
+    entrada guarda las palabras codificadas, los labels, las líneas parseadas
+    para el listado y la imagen de .data.
+    Cuando se superan max_entries o max_bytes se eliminan las entradas usadas
+    hace más tiempo (LRU según la fecha de modificación, que se actualiza en
+    cada acierto).
+    """
+    
+    def __init__(self, cache_dir: str, max_entries: int = 1024, max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def key(self, source: str, assembler: RISCVAssembler, mode: str = 'two-pass') -> str:
+        """Hash del fuente, la versión, la tabla de instrucciones, el modo y la base de .data"""
+        h = hashlib.sha256()
+        h.update(f"{__version__}\0{mode}\0{assembler.data_base}\0".encode('utf-8'))
+        h.update(repr(sorted(assembler.instructions.items())).encode('utf-8'))
+        h.update(b'\0')
+        h.update(source.encode('utf-8'))
+        return h.hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+    
+    def get(self, key: str) -> Optional[Tuple[Dict[str, int], List[int], List[Tuple[Optional[str], str, List[str]]],
+                                              bytearray]]:
+        """Retorna (labels, código máquina, líneas parseadas, imagen de .data) o None si no está en la caché"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        labels = dict(entry['labels'])
+        parsed_lines = [(label, instruction, operands) for label, instruction, operands in entry['lines']]
+        return labels, entry['code'], parsed_lines, bytearray.fromhex(entry.get('data', ''))
+    
+    def put(self, key: str, labels: Dict[str, int], machine_code: Iterable[int],
+            parsed_lines: List[Tuple[Optional[str], str, List[str]]], data: bytes = b''):
+        """Guarda un resultado de forma atómica y aplica la política de expulsión"""
+        entry = {
+            'version': __version__,
+            'labels': list(labels.items()),
+            'code': list(machine_code),
+            'lines': parsed_lines,
+            'data': data.hex(),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, separators=(',', ':'))
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        
+        self._evict()
+    
+    def _evict(self):
+        """Elimina las entradas más antiguas hasta respetar los límites"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # Eliminada por otro proceso
+            entries.append((st.st_mtime, st.st_size, path))
+        
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            _, size, path = entries.pop(0)
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def write_profile(destination: str, data):
+    """Escribe las estadísticas en JSON en un archivo, o por la salida estándar si es '-'"""
+    text = json.dumps(data, indent=2, ensure_ascii=False)
+    if destination == '-':
+        print(text)
+    else:
+        with open(destination, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"Perfil guardado en {destination}")
+
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """Expande globs; un patrón sin coincidencias se conserva para informar el error"""
+    inputs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else []
+        inputs.extend(matches or [pattern])
+    return inputs
+
+
+def _assemble_job(input_file: str, output_base: str, options: Dict) -> Dict:
+    """Ensambla un archivo con su propio ensamblador (ejecutable en un proceso del pool)"""
+    log = io.StringIO()
+    start = time.perf_counter()
+    assembler = RISCVAssembler(memo_size=options['memo_size'])
+    assembler.data_base = options['data_base']
+    cache = None
+    if options['cache_dir']:
+        cache = AssemblyCache(options['cache_dir'], options['cache_max_entries'], options['cache_max_bytes'])
+    
+    with redirect_stdout(log):
+        try:
+            ok = assembler.assemble_file(input_file, output_base, stream=options['stream'],
+                                         one_pass=options['one_pass'], cache=cache,
+                                         encode_workers=options['encode_workers'],
+                                         emit_object=options['emit_object'],
+                                         formats=options['formats'], optimize=options['optimize'],
+                                         profile=options['profile'], debug=options['debug'],
+                                         compress=options['compress'], hazards=options['hazards'],
+                                         schedule=options['schedule'])
+        except Exception as e:
+            print(f"Error inesperado: {e}")
+            ok = False
+    
+    return {
+        'input': input_file,
+        'ok': ok,
+        'log': log.getvalue(),
+        'seconds': time.perf_counter() - start,
+        'cache_hits': cache.hits if cache else 0,
+        'cache_misses': cache.misses if cache else 0,
+        'memo_stats': assembler.memo_stats,
+        'stats': assembler.stats.to_dict(),
+    }
+
+
+def assemble_batch(inputs: List[str], output_dir: Optional[str], jobs: int, options: Dict) -> List[Dict]:
+    """
+    Ensambla varios archivos independientes, en paralelo si jobs > 1.
+    Cada archivo se escribe como <output_dir>/<ruta relativa al directorio
+    común de las entradas> (o junto al fuente si output_dir es None), así que
+    d1/p.asm y d2/p.asm no se pisan. Los errores se recogen por archivo sin
+    detener el lote; dos entradas con la misma salida lanzan ValueError.
+    Retorna los resultados de _assemble_job en el orden de entrada.
+    """
+    stems = [os.path.splitext(os.path.abspath(input_file))[0] for input_file in inputs]
+    if output_dir:
+        root = os.path.commonpath([os.path.dirname(stem) for stem in stems])
+        bases = [os.path.join(output_dir, os.path.relpath(stem, root)) for stem in stems]
+    else:
+        bases = [os.path.splitext(input_file)[0] for input_file in inputs]
+    
+    seen = {}
+    for input_file, stem in zip(inputs, stems):
+        if stem in seen:
+            raise ValueError(f"{seen[stem]} y {input_file} escribirían la misma salida")
+        seen[stem] = input_file
+    for directory in {os.path.dirname(base) for base in bases}:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    if jobs <= 1:
+        return [_assemble_job(input_file, base, options) for input_file, base in zip(inputs, bases)]
+    
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_assemble_job, input_file, base, options)
+                   for input_file, base in zip(inputs, bases)]
+        results = []
+        for input_file, future in zip(inputs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:  # p. ej. el proceso del pool terminó abruptamente
+                results.append({'input': input_file, 'ok': False, 'log': f"Error en el proceso: {e}\n",
+                                'seconds': 0.0, 'cache_hits': 0, 'cache_misses': 0, 'memo_stats': {},
+                                'stats': AssemblyStats().to_dict()})
+        return results
+
+
+def _assemble_inputs(args, inputs: List[str], formats: List[str]) -> Tuple[bool, object]:
+    """
+    Ensambla las entradas de la línea de órdenes (una o un lote) e imprime
+    el progreso. Retorna (sin errores, datos del perfil)
+    """
+    if len(inputs) > 1:
+        options = {
+            'stream': args.stream,
+            'one_pass': args.one_pass,
+            'encode_workers': args.encode_workers,
+            'emit_object': args.compile_only,
+            'formats': formats,
+            'optimize': args.optimize,
+            'debug': args.debug_info,
+            'compress': args.auto_compress,
+            'hazards': args.hazards,
+            'schedule': args.schedule,
+            'profile': args.profile is not None,
+            'data_base': args.data_base,
+            'memo_size': args.memo_size,
+            'cache_dir': args.cache_dir,
+            'cache_max_entries': args.cache_max_entries,
+            'cache_max_bytes': args.cache_max_mb * 1024 * 1024,
+        }
+        start = time.perf_counter()
+        try:
+            results = assemble_batch(inputs, args.output, args.jobs, options)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return False, []
+        elapsed = time.perf_counter() - start
+        
+        for result in results:
+            print(f"== {result['input']}")
+            print(result['log'], end='')
+        
+        failed = [result for result in results if not result['ok']]
+        print(f"\nResumen: {len(results)} archivos, {len(failed)} con errores, "
+              f"{elapsed:.3f} s en total con {max(args.jobs, 1)} procesos")
+        for result in results:
+            status = 'ok' if result['ok'] else 'ERROR'
+            print(f"  {status:5} {result['seconds'] * 1000:10.1f} ms  {result['input']}")
+        
+        if args.memo_stats:
+            stats = {key: sum(result['memo_stats'].get(key, 0) for result in results)
+                     for key in ('line_hits', 'line_misses', 'word_hits', 'word_misses')}
+            line_rate = stats['line_hits'] / max(stats['line_hits'] + stats['line_misses'], 1)
+            word_rate = stats['word_hits'] / max(stats['word_hits'] + stats['word_misses'], 1)
+            print(f"Memo: líneas {line_rate:.1%} aciertos, palabras {word_rate:.1%} aciertos")
+        
+        if args.cache_dir:
+            hits = sum(result['cache_hits'] for result in results)
+            misses = sum(result['cache_misses'] for result in results)
+            print(f"Caché: {hits} aciertos, {misses} fallos")
+        
+        profile = [{'input': result['input'], **result['stats']} for result in results]
+        return not failed, profile
+    
+    cache = None
+    if args.cache_dir:
+        cache = AssemblyCache(args.cache_dir, args.cache_max_entries, args.cache_max_mb * 1024 * 1024)
+    
+    assembler = RISCVAssembler(memo_size=args.memo_size)
+    assembler.data_base = args.data_base
+    ok = assembler.assemble_file(inputs[0], args.output or 'output', stream=args.stream,
+                                 one_pass=args.one_pass, cache=cache, encode_workers=args.encode_workers,
+                                 emit_object=args.compile_only, formats=formats, optimize=args.optimize,
+                                 profile=args.profile is not None, debug=args.debug_info,
+                                 compress=args.auto_compress, hazards=args.hazards, schedule=args.schedule)
+    
+    if args.profile is not None:
+        print("Perfil:")
+        for row in assembler.stats.summary():
+            print(row)
+    
+    if args.memo_stats:
+        rates = assembler.memo_hit_rates()
+        print(f"Memo: líneas {rates['line']:.1%} aciertos, palabras {rates['word']:.1%} aciertos")
+    
+    if cache is not None:
+        print(f"Caché: {cache.hits} aciertos, {cache.misses} fallos")
+    
+    return ok, assembler.stats.to_dict()
+
 
 def main():
     parser = argparse.ArgumentParser(description='RISC-V 32-bit Assembler')
-    parser.add_argument('input_file', help='Archivo de código assembly (.s o .asm)')
-    parser.add_argument('-o', '--output', default='output', 
-                       help='Nombre base para archivos de salida (default: output)')
+    parser.add_argument('input_files', nargs='*', metavar='input_file',
+                       help='Archivos de código assembly (.s o .asm); se admiten globs')
+    parser.add_argument('-o', '--output',
+                       help='Nombre base para archivos de salida (default: output). '
+                            'Con varios archivos, directorio de salida (default: junto a cada fuente)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                       help='Procesos en paralelo al ensamblar varios archivos (default: 1)')
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS),
+                       help=f"Formatos de salida separados por comas: {', '.join(OUTPUT_FORMATS)} "
+                            f"(default: {','.join(DEFAULT_FORMATS)})")
+    parser.add_argument('-c', '--compile-only', action='store_true',
+                       help='Generar un archivo objeto reubicable (.o) por fuente, sin enlazar')
+    parser.add_argument('--link', action='store_true',
+                       help='Enlazar los archivos objeto de entrada en un único programa')
+    parser.add_argument('--base', type=lambda text: int(text, 0), default=0,
+                       help='Dirección base del programa enlazado (default: 0)')
+    parser.add_argument('--data-base', type=lambda text: int(text, 0), default=DATA_BASE,
+                       help=f'Dirección base de la sección .data (default: 0x{DATA_BASE:08x})')
+    parser.add_argument('--stream', action='store_true',
+                       help='Ensamblar en streaming con memoria acotada')
+    parser.add_argument('--one-pass', action='store_true',
+                       help='Ensamblar en una sola pasada resolviendo labels con fixups')
+    parser.add_argument('-O', '--optimize', action='store_true',
+                       help='Optimización peephole entre las dos pasadas (mv x,x, addi x,x,0, lui+addi, saltos a la siguiente)')
+    parser.add_argument('-g', '--debug-info', action='store_true',
+                       help='Generar <salida>.dbg con la tabla dirección -> línea del fuente y los símbolos')
+    parser.add_argument('--auto-compress', action='store_true',
+                       help='Usar instrucciones comprimidas RV32C (16 bits) siempre que se pueda')
+    parser.add_argument('--hazards', action='store_true',
+                       help='Anotar en el listado las paradas load-use, los saltos y los ciclos de cada bloque')
+    parser.add_argument('--schedule', action='store_true',
+                       help='Reordenar instrucciones independientes para evitar paradas load-use')
+    parser.add_argument('--encode-workers', type=int, default=1,
+                       help='Procesos para codificar en paralelo un archivo grande (default: 1)')
+    parser.add_argument('--cache-dir',
+                       help='Directorio de caché de resultados (se reutiliza si el fuente no cambia)')
+    parser.add_argument('--cache-max-entries', type=int, default=1024,
+                       help='Número máximo de entradas en la caché (default: 1024)')
+    parser.add_argument('--cache-max-mb', type=int, default=256,
+                       help='Tamaño máximo de la caché en MB (default: 256)')
+    parser.add_argument('--memo-size', type=int, default=65536,
+                       help='Entradas de la memo de líneas repetidas, 0 para desactivarla (default: 65536)')
+    parser.add_argument('--memo-stats', action='store_true',
+                       help='Mostrar la tasa de aciertos de la memo de líneas y palabras')
+    parser.add_argument('--profile', nargs='?', const='-', default=None, metavar='ARCHIVO',
+                       help='Tiempo por fase, líneas/s, instrucciones/s, histograma de mnemónicos y '
+                            'pico de memoria en JSON (en ARCHIVO o por la salida estándar)')
+    parser.add_argument('--server', nargs='?', const='', default=None, metavar='SOCKET',
+                       help='Quedarse escuchando peticiones JSON en un socket Unix (por defecto el de '
+                            'server.py) o, con "-", por la entrada/salida estándar; -j fija los procesos')
     
     args = parser.parse_args()
     
-    assembler = RISCVAssembler()
-    assembler.assemble_file(args.input_file, args.output)
+    if args.server is not None:
+        from server import DEFAULT_SOCKET, run_server
+        
+        options = {
+            'data_base': args.data_base,
+            'memo_size': args.memo_size,
+            'cache_dir': args.cache_dir,
+            'cache_max_entries': args.cache_max_entries,
+            'cache_max_bytes': args.cache_max_mb * 1024 * 1024,
+        }
+        socket_path = None if args.server == '-' else args.server or DEFAULT_SOCKET
+        run_server(socket_path, args.jobs, options)
+        return
+    if not args.input_files:
+        parser.error('falta el archivo de entrada')
+    
+    inputs = expand_inputs(args.input_files)
+    try:
+        formats = parse_formats(args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.link:
+        from linker import link_files
+        
+        if not link_files(inputs, args.output or 'output', args.base, formats):
+            sys.exit(1)
+        return
+    
+    # Con --profile sin archivo, la salida estándar queda sólo para el JSON:
+    # el progreso y los resúmenes van a la salida de errores
+    with redirect_stdout(sys.stderr) if args.profile == '-' else ExitStack():
+        ok, profile = _assemble_inputs(args, inputs, formats)
+    
+    if args.profile is not None:
+        write_profile(args.profile, profile)
+    if not ok:
+        sys.exit(1)
+
 
 # Función de utilidad para testing
 def test_assembler():
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la segunda pasada: despacho if/elif por tipo frente a la
+tabla de codificación precompilada.
+
+Uso: python benchmarks/bench_encoding.py [--lines 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from assembler import RISCVAssembler
+from generate import generate_program
+
+
+def legacy_second_pass(assembler: RISCVAssembler, parsed_lines):
+    """Segunda pasada con el despacho por cadena if/elif sobre info['type']"""
+    machine_code = []
+    assembler.current_address = 0
+    
+    for _, instruction, operands in parsed_lines:
+        info = assembler.instructions[instruction]
+        if info['type'] == 'R':
+            code = assembler.encode_r_type(info, operands)
+        elif info['type'] == 'I':
+            code = assembler.encode_i_type(info, operands)
+        elif info['type'] == 'S':
+            code = assembler.encode_s_type(info, operands)
+        elif info['type'] == 'B':
+            code = assembler.encode_b_type(info, operands)
+        elif info['type'] == 'U':
+            code = assembler.encode_u_type(info, operands)
+        else:
+            code = assembler.encode_j_type(info, operands)
+        machine_code.append(code)
+        assembler.current_address += 4
+    
+    return machine_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de codificación')
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    args = parser.parse_args()
+    
+    lines = generate_program(args.lines)
+    assembler = RISCVAssembler()
+    parsed_lines = assembler.first_pass(lines)
+    n = len(parsed_lines)
+    print(f"{n} instrucciones generadas a partir de {len(lines)} líneas")
+    
+    start = time.perf_counter()
+    before = legacy_second_pass(assembler, parsed_lines)
+    legacy_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    after = assembler.second_pass(parsed_lines)
+    table_time = time.perf_counter() - start
+    
+    if before != after:
+        raise SystemExit("Error: las dos rutas de codificación producen código distinto")
+    
+    print(f"if/elif por tipo: {n / legacy_time:12,.0f} instrucciones/s ({legacy_time:.2f} s)")
+    print(f"tabla compilada:  {n / table_time:12,.0f} instrucciones/s ({table_time:.2f} s)")
+    print(f"speedup:          {legacy_time / table_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Escalado de la segunda pasada en paralelo (second_pass con workers > 1).
+
+Uso: python benchmarks/bench_parallel_encode.py [--lines 1000000] [--workers 1,2,4,8,16]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from assembler import RISCVAssembler
+from generate import generate_program
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de codificación en paralelo')
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--workers', default='1,2,4,8,16',
+                        help='Lista de números de procesos a medir (default: 1,2,4,8,16)')
+    args = parser.parse_args()
+    
+    assembler = RISCVAssembler()
+    parsed_lines = assembler.first_pass(generate_program(args.lines))
+    n = len(parsed_lines)
+    print(f"{n} instrucciones, {os.cpu_count()} CPUs disponibles")
+    
+    reference = None
+    serial_time = None
+    for workers in (int(w) for w in args.workers.split(',')):
+        start = time.perf_counter()
+        machine_code = assembler.second_pass(parsed_lines, workers=workers)
+        elapsed = time.perf_counter() - start
+        
+        if reference is None:
+            reference = machine_code
+            serial_time = elapsed
+        elif machine_code != reference:
+            raise SystemExit(f"Error: resultado distinto con {workers} procesos")
+        
+        print(f"{workers:3} procesos: {n / elapsed:12,.0f} instrucciones/s "
+              f"({elapsed:.2f} s, speedup {serial_time / elapsed:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark del simulador: intérprete instrucción a instrucción frente al
+motor de bloques traducidos, sobre un programa con bucles, llamadas y
+accesos a memoria.
+
+Uso: python benchmarks/bench_simulator.py [--iterations 200000]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simulator import Simulator
+
+
+def kernel_program(iterations: int):
+    """
+    Rellena un buffer de 64 palabras, lo suma llamando a una función y repite
+    `iterations` veces; deja el resultado acumulado en a0
+    """
+    return f"""
+sum_buffer:
+        mv      t0, a0
+        addi    t1, a0, 256
+        li      a0, 0
+sum_loop:
+        lw      t2, 0(t0)
+        add     a0, a0, t2
+        addi    t0, t0, 4
+        bne     t0, t1, sum_loop
+        ret
+main:
+        addi    sp, sp, -272
+        sw      ra, 268(sp)
+        li      s0, {iterations}
+        li      s1, 0
+outer:
+        mv      t0, sp
+        li      t1, 64
+        mv      t2, s0
+fill:
+        sw      t2, 0(t0)
+        addi    t0, t0, 4
+        addi    t2, t2, 3
+        addi    t1, t1, -1
+        bnez    t1, fill
+        mv      a0, sp
+        call    sum_buffer
+        add     s1, s1, a0
+        addi    s0, s0, -1
+        bnez    s0, outer
+        mv      a0, s1
+        lw      ra, 268(sp)
+        addi    sp, sp, 272
+        ret
+""".splitlines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del simulador')
+    parser.add_argument('--iterations', type=int, default=2000,
+                       help='Repeticiones del bucle externo (~600 instrucciones cada una)')
+    args = parser.parse_args()
+
+    lines = kernel_program(args.iterations)
+    results = {}
+    for name, blocks in (('intérprete', False), ('bloques', True)):
+        simulator = Simulator.from_source(lines)
+        summary = simulator.run(blocks=blocks)
+        results[name] = (summary, list(simulator.regs))
+        print(f"{name:>10}: {summary['steps']} instrucciones en {summary['seconds']:.3f} s "
+              f"({summary['ips'] / 1e6:.2f} MIPS)")
+        if blocks:
+            print(f"{'':>10}  {simulator.block_stats['translated']} bloques traducidos")
+
+    interpreted, blocks = results['intérprete'], results['bloques']
+    if interpreted[1] != blocks[1] or interpreted[0]['steps'] != blocks[0]['steps']:
+        print("ERROR: los dos motores no terminan en el mismo estado")
+        sys.exit(1)
+    print(f"Aceleración: {blocks[0]['ips'] / interpreted[0]['ips']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks del ensamblador: mide por separado tokenize_line,
+first_pass, second_pass y cada formato de salida sobre programas generados
+(generate.py) de varios tamaños. Guarda los resultados en JSON y, si se le
+pasa un resultado anterior, marca como regresión cada fase que empeore más
+del umbral.
+
+Uso:
+    python benchmarks/bench_suite.py [--sizes 10K,100K,1M] [--repeat 3]
+                                     [--save resultados.json] [--compare base.json]
+
+Los tamaños admiten sufijos K y M; 10M necesita varios GB de memoria.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from assembler import RISCVAssembler, DEFAULT_FORMATS, open_sinks, parse_formats, __version__
+from generate import generate_program
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def parse_size(text: str) -> int:
+    """'10K' -> 10000, '1M' -> 1000000"""
+    text = text.strip().upper()
+    for suffix, factor in (('K', 1000), ('M', 1000000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+
+def best_of(repeat: int, function):
+    """Mejor tiempo de `repeat` ejecuciones y el resultado de la última"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_size(lines, repeat: int, formats, tmp: str):
+    """Segundos de cada fase para un programa"""
+    times = {}
+
+    # tokenize_line sin memo: el coste real de tokenizar cada línea
+    tokenizer = RISCVAssembler(memo_size=0)
+    times['tokenize_line'], _ = best_of(repeat, lambda: [tokenizer.tokenize_line(line) for line in lines])
+
+    def first_pass():
+        assembler = RISCVAssembler()
+        return assembler, assembler.first_pass(lines)
+    times['first_pass'], (assembler, parsed_lines) = best_of(repeat, first_pass)
+
+    times['second_pass'], machine_code = best_of(repeat, lambda: assembler.second_pass(parsed_lines))
+
+    for name in formats:
+        def write():
+            with ExitStack() as stack:
+                sink, = open_sinks(stack, os.path.join(tmp, 'bench'), [name])
+                sink.begin(assembler.labels)
+                sink.write_many(0, machine_code, parsed_lines)
+                sink.finish()
+        times[f'write.{name}'], _ = best_of(repeat, write)
+
+    return times, len(machine_code)
+
+
+def compare(results, baseline, threshold: float):
+    """Lista de (tamaño, fase, tiempo base, tiempo actual, cociente) que empeoran más del umbral"""
+    regressions = []
+    base_runs = {run['lines']: run for run in baseline['runs']}
+    for run in results['runs']:
+        base = base_runs.get(run['lines'])
+        if base is None:
+            continue
+        for phase, seconds in run['seconds'].items():
+            base_seconds = base['seconds'].get(phase)
+            if base_seconds and seconds / base_seconds > 1 + threshold:
+                regressions.append((run['lines'], phase, base_seconds, seconds, seconds / base_seconds))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suite de benchmarks del ensamblador')
+    parser.add_argument('--sizes', default='10K,100K,1M',
+                       help='Tamaños en líneas separados por comas (default: 10K,100K,1M)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones por fase; se toma la mejor (default: 3)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label-every', type=int, default=16)
+    parser.add_argument('--pseudo-ratio', type=float, default=0.2)
+    parser.add_argument('--forward-ratio', type=float, default=0.3)
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS),
+                       help='Formatos de salida a medir (default: bin,hex,txt)')
+    parser.add_argument('--save', default=None,
+                       help=f'Archivo JSON de resultados (default: {RESULTS_DIR}/bench_<versión>.json)')
+    parser.add_argument('--compare', default=None, help='Resultados anteriores con los que comparar')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                       help='Empeoramiento relativo que cuenta como regresión (default: 0.10)')
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    formats = parse_formats(args.formats)
+    params = {
+        'seed': args.seed,
+        'label_every': args.label_every,
+        'pseudo_ratio': args.pseudo_ratio,
+        'forward_ratio': args.forward_ratio,
+        'repeat': args.repeat,
+    }
+    results = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': params,
+        'runs': [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            lines = generate_program(size, args.seed, args.label_every, args.pseudo_ratio, args.forward_ratio)
+            times, instructions = bench_size(lines, args.repeat, formats, tmp)
+            del lines
+            results['runs'].append({'lines': size, 'instructions': instructions, 'seconds': times})
+
+            print(f"{size:>10} líneas, {instructions} instrucciones")
+            for phase, seconds in times.items():
+                print(f"  {phase:<15} {seconds:9.3f} s  {size / seconds:>12,.0f} líneas/s")
+
+    save = args.save or os.path.join(RESULTS_DIR, f"bench_{__version__}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(save)), exist_ok=True)
+    with open(save, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Resultados guardados en {save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != params:
+            print("Aviso: los parámetros del generador no coinciden con los de la comparación")
+        regressions = compare(results, baseline, args.threshold)
+        print(f"Comparación con {args.compare} (versión {baseline.get('version')}):")
+        if not regressions:
+            print(f"  sin regresiones por encima del {args.threshold:.0%}")
+            return
+        for size, phase, before, after, ratio in regressions:
+            print(f"  REGRESIÓN {size:>10} líneas {phase:<15} {before:8.3f} s -> {after:8.3f} s ({ratio:.2f}x)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de tokenize_line: tokenizador carácter a carácter original
+frente al actual basado en split, sobre programa_prueba.asm repetido.
+
+Uso: python benchmarks/bench_tokenizer.py [--lines 2000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from assembler import RISCVAssembler
+
+
+def legacy_tokenize_line(line):
+    """Tokenizador original: recorre los operandos carácter a carácter"""
+    line = line.split('#')[0].strip()
+    
+    if not line:
+        return None, '', []
+    
+    label = None
+    if ':' in line:
+        parts = line.split(':', 1)
+        label = parts[0].strip()
+        line = parts[1].strip()
+    
+    if not line:
+        return label, '', []
+    
+    parts = line.split(None, 1)
+    instruction = parts[0].lower()
+    
+    operands = []
+    if len(parts) > 1:
+        operand_str = parts[1]
+        current_operand = ""
+        paren_count = 0
+        
+        for char in operand_str + ",":
+            if char == ',' and paren_count == 0:
+                if current_operand.strip():
+                    operands.append(current_operand.strip())
+                current_operand = ""
+            else:
+                if char == '(':
+                    paren_count += 1
+                elif char == ')':
+                    paren_count -= 1
+                current_operand += char
+    
+    return label, instruction, operands
+
+
+def time_tokenizer(tokenize, lines):
+    """Segundos en tokenizar todas las líneas, sin conservar los resultados"""
+    start = time.perf_counter()
+    for line in lines:
+        tokenize(line)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de tokenize_line')
+    parser.add_argument('--lines', type=int, default=2_000_000)
+    args = parser.parse_args()
+    
+    with open(os.path.join(ROOT, 'programa_prueba.asm'), 'r', encoding='utf-8') as f:
+        sample = f.readlines()
+    lines = (sample * (args.lines // len(sample) + 1))[:args.lines]
+    
+    tokenize_line = RISCVAssembler().tokenize_line
+    
+    if [legacy_tokenize_line(line) for line in sample] != [tokenize_line(line) for line in sample]:
+        raise SystemExit("Error: los tokenizadores no producen el mismo resultado")
+    
+    legacy_time = time_tokenizer(legacy_tokenize_line, lines)
+    fast_time = time_tokenizer(tokenize_line, lines)
+    
+    n = len(lines)
+    print(f"carácter a carácter: {n / legacy_time:12,.0f} líneas/s ({legacy_time:.2f} s)")
+    print(f"split rápido:        {n / fast_time:12,.0f} líneas/s ({fast_time:.2f} s)")
+    print(f"speedup:             {legacy_time / fast_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tiempo de la etapa de salida (.bin, .hex, .txt): escritura palabra a
+palabra (OutputSink.write) frente a escritura en bloque (write_many).
+
+Uso: python benchmarks/bench_writers.py [--lines 1000000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from assembler import RISCVAssembler, BinarySink, HexSink, ListingSink
+from generate import generate_program
+
+SINKS = (('bin', 'wb', BinarySink), ('hex', 'w', HexSink), ('txt', 'w', ListingSink))
+
+
+def write_outputs(path_base, labels, machine_code, parsed_lines, bulk):
+    """Escribe los tres formatos y retorna el tiempo de cada uno"""
+    times = {}
+    for ext, mode, sink_class in SINKS:
+        start = time.perf_counter()
+        with open(f"{path_base}.{ext}", mode) as f:
+            sink = sink_class(f)
+            sink.begin(labels)
+            if bulk:
+                sink.write_many(0, machine_code, parsed_lines)
+            else:
+                for i, (code, (_, instruction, operands)) in enumerate(zip(machine_code, parsed_lines)):
+                    sink.write(i * 4, code, instruction, operands)
+            sink.finish()
+        times[ext] = time.perf_counter() - start
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de escritura de salidas')
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    args = parser.parse_args()
+    
+    assembler = RISCVAssembler()
+    parsed_lines = assembler.first_pass(generate_program(args.lines))
+    machine_code = assembler.second_pass(parsed_lines)
+    print(f"{len(machine_code)} instrucciones")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        per_word = write_outputs(os.path.join(tmp, 'word'), assembler.labels, machine_code, parsed_lines, False)
+        bulk = write_outputs(os.path.join(tmp, 'bulk'), assembler.labels, machine_code, parsed_lines, True)
+        
+        for ext, _, _ in SINKS:
+            with open(os.path.join(tmp, f'word.{ext}'), 'rb') as a, open(os.path.join(tmp, f'bulk.{ext}'), 'rb') as b:
+                if a.read() != b.read():
+                    raise SystemExit(f"Error: el archivo .{ext} no es idéntico")
+    
+    for ext, _, _ in SINKS:
+        print(f".{ext}: palabra a palabra {per_word[ext]:7.3f} s, en bloque {bulk[ext]:7.3f} s "
+              f"({per_word[ext] / bulk[ext]:.1f}x)")
+    total_word, total_bulk = sum(per_word.values()), sum(bulk.values())
+    print(f"total: palabra a palabra {total_word:7.3f} s, en bloque {total_bulk:7.3f} s "
+          f"({total_word / total_bulk:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
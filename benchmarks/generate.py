@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Generador determinista de programas RISC-V para benchmarks
+"""
+
+import argparse
+import random
+import sys
+from typing import List
+
+REGISTERS = ['zero', 'ra', 'sp', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5',
+             't0', 't1', 't2', 't3', 't4', 't5', 't6']
+
+R_OPS = ['add', 'sub', 'sll', 'slt', 'sltu', 'xor', 'srl', 'sra', 'or', 'and']
+I_OPS = ['addi', 'slti', 'sltiu', 'xori', 'ori', 'andi']
+SHIFT_OPS = ['slli', 'srli', 'srai']
+LOAD_OPS = ['lb', 'lh', 'lw', 'lbu', 'lhu']
+STORE_OPS = ['sb', 'sh', 'sw']
+BRANCH_OPS = ['beq', 'bne', 'blt', 'bge', 'bltu', 'bgeu']
+
+
+# Pseudo-instrucciones: (plantilla, necesita un label destino)
+PSEUDO_TEMPLATES = [
+    ("mv {rd}, {rs}", False),
+    ("not {rd}, {rs}", False),
+    ("neg {rd}, {rs}", False),
+    ("seqz {rd}, {rs}", False),
+    ("li {rd}, {small}", False),
+    ("li {rd}, {large}", False),
+    ("nop", False),
+    ("beqz {rs}, {label}", True),
+    ("bnez {rs}, {label}", True),
+    ("j {label}", True),
+    ("call {label}", True),
+    ("la {rd}, {label}", True),
+]
+
+
+def generate_program(n_lines: int, seed: int = 0, label_every: int = 16,
+                     pseudo_ratio: float = 0.0, forward_ratio: float = 0.0) -> List[str]:
+    """
+    Genera n_lines líneas de assembly con un label cada label_every líneas.
+    pseudo_ratio: fracción de líneas con pseudo-instrucciones (mv, li, la, call, ...)
+    forward_ratio: fracción de saltos a un label posterior (el resto van hacia atrás)
+    Con los valores por defecto el resultado es el de siempre para cada semilla.
+    """
+    rng = random.Random(seed)
+    reg = lambda: rng.choice(REGISTERS)
+    total_labels = (n_lines + label_every - 1) // label_every
+    lines = []
+    label_count = 0
+    
+    def target():
+        if forward_ratio and rng.random() < forward_ratio:
+            return min(label_count + rng.randint(0, 3), total_labels - 1)
+        return rng.randint(max(0, label_count - 4), label_count - 1)
+    
+    for i in range(n_lines):
+        if i % label_every == 0:
+            lines.append(f"L{label_count}:\n")
+            label_count += 1
+            continue
+        
+        if pseudo_ratio and rng.random() < pseudo_ratio:
+            template, needs_label = rng.choice(PSEUDO_TEMPLATES)
+            line = template.format(rd=reg(), rs=reg(), small=rng.randint(-2048, 2047),
+                                   large=rng.randint(-(1 << 31), (1 << 31) - 1),
+                                   label=f"L{target()}" if needs_label else '')
+            lines.append(f"    {line}\n")
+            continue
+        
+        kind = rng.random()
+        if kind < 0.25:
+            lines.append(f"    {rng.choice(R_OPS)} {reg()}, {reg()}, {reg()}\n")
+        elif kind < 0.45:
+            lines.append(f"    {rng.choice(I_OPS)} {reg()}, {reg()}, {rng.randint(-2048, 2047)}\n")
+        elif kind < 0.50:
+            lines.append(f"    {rng.choice(SHIFT_OPS)} {reg()}, {reg()}, {rng.randint(0, 31)}\n")
+        elif kind < 0.65:
+            lines.append(f"    {rng.choice(LOAD_OPS)} {reg()}, {rng.randint(-64, 64)}({reg()})\n")
+        elif kind < 0.78:
+            lines.append(f"    {rng.choice(STORE_OPS)} {reg()}, {rng.randint(-64, 64)}({reg()})\n")
+        elif kind < 0.88:
+            label = target()
+            lines.append(f"    {rng.choice(BRANCH_OPS)} {reg()}, {reg()}, L{label}\n")
+        elif kind < 0.93:
+            lines.append(f"    lui {reg()}, {rng.randint(0, 0xFFFFF)}\n")
+        else:
+            label = target()
+            lines.append(f"    jal ra, L{label}\n")
+    
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generador determinista de programas RISC-V')
+    parser.add_argument('--lines', type=int, default=100_000, help='Número de líneas (default: 100000)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label-every', type=int, default=16, help='Un label cada N líneas (default: 16)')
+    parser.add_argument('--pseudo-ratio', type=float, default=0.0,
+                       help='Fracción de pseudo-instrucciones (default: 0)')
+    parser.add_argument('--forward-ratio', type=float, default=0.0,
+                       help='Fracción de saltos hacia delante (default: 0)')
+    parser.add_argument('-o', '--output', default='-', help='Archivo de salida (default: salida estándar)')
+    args = parser.parse_args()
+    
+    lines = generate_program(args.lines, args.seed, args.label_every, args.pseudo_ratio, args.forward_ratio)
+    if args.output == '-':
+        sys.stdout.writelines(lines)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Información de depuración del ensamblador RISC-V 32-bit (archivo .dbg)
+Tabla de líneas (dirección -> archivo y línea del fuente) y tabla de símbolos
+(dirección -> label más cercano), con búsquedas por bisección.
+"""
+
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEBUG_MAGIC = b'RVD1'
+
+# magic, dirección base, tamaño del código en bytes, tramos, archivos, símbolos
+_HEADER = struct.Struct('<4s5I')
+_LENGTH = struct.Struct('<I')
+
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode: str, data: bytes, pos: int, count: int) -> Tuple[array, int]:
+    values = array(typecode)
+    end = pos + values.itemsize * count
+    values.frombytes(data[pos:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, end
+
+
+class DebugInfo:
+    """
+    Tablas de depuración de un programa:
+    - addresses: dirección de inicio de cada tramo de instrucciones que vienen
+      de una misma línea del fuente, en orden creciente
+    - files / lines: índice en file_names y número de línea de cada tramo
+    - symbol_addresses / symbol_names: labels ordenados por dirección
+    """
+
+    def __init__(self, base: int, code_size: int, addresses: array, files: array, lines: array,
+                 file_names: List[str], symbol_addresses: array, symbol_names: List[str]):
+        self.base = base
+        self.code_size = code_size
+        self.addresses = addresses
+        self.files = files
+        self.lines = lines
+        self.file_names = file_names
+        self.symbol_addresses = symbol_addresses
+        self.symbol_names = symbol_names
+
+    def line_for(self, address: int) -> Optional[Tuple[str, int]]:
+        """(archivo, línea) de la instrucción en `address`, o None fuera del código"""
+        if not self.base <= address < self.base + self.code_size:
+            return None
+        row = bisect_right(self.addresses, address) - 1
+        if row < 0:
+            return None
+        return self.file_names[self.files[row]], self.lines[row]
+
+    def symbol_for(self, address: int) -> Optional[Tuple[str, int]]:
+        """(label, desplazamiento) del label más cercano en o antes de `address`"""
+        index = bisect_right(self.symbol_addresses, address) - 1
+        if index < 0:
+            return None
+        return self.symbol_names[index], address - self.symbol_addresses[index]
+
+    def symbolize(self, addresses: Iterable[int]) -> List[Tuple[Optional[str], int, Optional[str], int]]:
+        """
+        (label, desplazamiento, archivo, línea) de cada dirección; los campos
+        que no se conocen quedan en None / 0. Pensado para trazas largas: cada
+        dirección distinta se busca una sola vez (los bucles repiten PCs).
+        """
+        row_addresses, files, lines, file_names = self.addresses, self.files, self.lines, self.file_names
+        symbol_addresses, symbol_names = self.symbol_addresses, self.symbol_names
+        start, end = self.base, self.base + self.code_size
+        seen = {}
+        result = []
+        append = result.append
+        for address in addresses:
+            entry = seen.get(address)
+            if entry is None:
+                index = bisect_right(symbol_addresses, address) - 1
+                if index >= 0:
+                    symbol, offset = symbol_names[index], address - symbol_addresses[index]
+                else:
+                    symbol, offset = None, 0
+                row = bisect_right(row_addresses, address) - 1 if start <= address < end else -1
+                if row >= 0:
+                    entry = (symbol, offset, file_names[files[row]], lines[row])
+                else:
+                    entry = (symbol, offset, None, 0)
+                seen[address] = entry
+            append(entry)
+        return result
+
+    def to_bytes(self) -> bytes:
+        """Serializa las tablas en formato binario little-endian"""
+        file_blob = '\0'.join(self.file_names).encode('utf-8')
+        symbol_blob = '\0'.join(self.symbol_names).encode('utf-8')
+        return b''.join([
+            _HEADER.pack(DEBUG_MAGIC, self.base, self.code_size, len(self.addresses),
+                         len(self.file_names), len(self.symbol_names)),
+            _to_bytes(self.addresses), _to_bytes(self.lines), _to_bytes(self.files),
+            _to_bytes(self.symbol_addresses),
+            _LENGTH.pack(len(file_blob)), file_blob,
+            _LENGTH.pack(len(symbol_blob)), symbol_blob,
+        ])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'DebugInfo':
+        """Reconstruye las tablas serializadas con to_bytes"""
+        magic, base, code_size, n_rows, n_files, n_symbols = _HEADER.unpack_from(data, 0)
+        if magic != DEBUG_MAGIC:
+            raise ValueError("Archivo de depuración inválido")
+        pos = _HEADER.size
+        addresses, pos = _from_bytes('I', data, pos, n_rows)
+        lines, pos = _from_bytes('I', data, pos, n_rows)
+        files, pos = _from_bytes('H', data, pos, n_rows)
+        symbol_addresses, pos = _from_bytes('I', data, pos, n_symbols)
+
+        names = []
+        for count in (n_files, n_symbols):
+            size, = _LENGTH.unpack_from(data, pos)
+            pos += _LENGTH.size
+            names.append(data[pos:pos + size].decode('utf-8').split('\0') if count else [])
+            pos += size
+        return cls(base, code_size, addresses, files, lines, names[0], symbol_addresses, names[1])
+
+
+def build_debug_info(line_table: Sequence[int], locate: Callable[[int], Tuple[Optional[str], int, Optional[str]]],
+                     labels: Dict[str, int], base: int = 0,
+                     sizes: Optional[Sequence[int]] = None) -> DebugInfo:
+    """
+    Construye las tablas a partir de la línea generada de cada instrucción
+    (line_table), la función que lleva una línea generada a (archivo, línea,
+    contexto) y los labels. Las instrucciones consecutivas de una misma línea
+    (pseudo-instrucciones expandidas, macros) comparten un único tramo.
+    sizes: bytes de cada instrucción con RV32C (por defecto, todas de 4)
+    """
+    addresses = array('I')
+    files = array('H')
+    lines = array('I')
+    file_index: Dict[str, int] = {}
+    previous_line = None
+    previous_location = None
+    offsets = accumulate(sizes, initial=0) if sizes is not None else range(0, 4 * len(line_table) + 4, 4)
+    for line_num, offset in zip(line_table, offsets):
+        if line_num == previous_line:
+            continue
+        previous_line = line_num
+        filename, line, _ = locate(line_num)
+        location = (filename or '', line)
+        if location == previous_location:
+            continue
+        previous_location = location
+        if location[0] not in file_index:
+            if len(file_index) > 0xFFFF:
+                raise ValueError("Demasiados archivos fuente para la tabla de líneas")
+            file_index[location[0]] = len(file_index)
+        addresses.append(base + offset)
+        files.append(file_index[location[0]])
+        lines.append(line)
+
+    symbols = sorted(labels.items(), key=lambda item: item[1])
+    code_size = sum(sizes) if sizes is not None else 4 * len(line_table)
+    return DebugInfo(base, code_size, addresses, files, lines, list(file_index),
+                     array('I', [address for _, address in symbols]), [name for name, _ in symbols])
+
+
+def write_debug_info(path: str, info: DebugInfo):
+    with open(path, 'wb') as f:
+        f.write(info.to_bytes())
+
+
+def read_debug_info(path: str) -> DebugInfo:
+    with open(path, 'rb') as f:
+        return DebugInfo.from_bytes(f.read())
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Desensamblador RV32I para el código generado por el ensamblador RISC-V 32-bit
+Convierte palabras de 32 bits (.bin, .hex) de vuelta a assembly
+"""
+
+import io
+import mmap
+import re
+import sys
+import time
+import argparse
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from assembler import RISCVAssembler
+
+# Prefijo de los labels sintéticos para destinos de salto sin nombre
+SYNTHETIC_PREFIX = 'L_'
+
+# Entradas de la memo palabra -> texto (sólo instrucciones sin destino relativo al PC)
+TEXT_MEMO_SIZE = 65536
+
+ABI_NAMES = ['zero', 'ra', 'sp', 'gp', 'tp', 't0', 't1', 't2', 's0', 's1',
+             'a0', 'a1', 'a2', 'a3', 'a4', 'a5', 'a6', 'a7',
+             's2', 's3', 's4', 's5', 's6', 's7', 's8', 's9', 's10', 's11',
+             't3', 't4', 't5', 't6']
+
+_SYMBOL_LINE = re.compile(r'^\s*([^\s:]+):?\s+(0[xX][0-9a-fA-F]+|\d+)\s*$')
+
+
+def branch_target_offset(word: int) -> int:
+    """Offset con signo de una instrucción tipo B"""
+    offset = (((word >> 31) & 0x1) << 12) | (((word >> 7) & 0x1) << 11) | \
+             (((word >> 25) & 0x3F) << 5) | (((word >> 8) & 0xF) << 1)
+    return offset - 0x2000 if offset & 0x1000 else offset
+
+
+def jump_target_offset(word: int) -> int:
+    """Offset con signo de una instrucción tipo J"""
+    offset = (((word >> 31) & 0x1) << 20) | (((word >> 12) & 0xFF) << 12) | \
+             (((word >> 20) & 0x1) << 11) | (((word >> 21) & 0x3FF) << 1)
+    return offset - 0x200000 if offset & 0x100000 else offset
+
+
+class Disassembler:
+    """
+    Decodifica palabras con el índice inverso de la tabla de instrucciones del
+    ensamblador (decode_index, clave (opcode, funct3, funct7)). El texto
+    generado usa la misma sintaxis que acepta RISCVAssembler, de modo que puede
+    volver a ensamblarse.
+    """
+
+    def __init__(self, symbols: Optional[Dict[str, int]] = None, abi: bool = False,
+                 assembler: Optional[RISCVAssembler] = None):
+        self.assembler = assembler or RISCVAssembler(memo_size=0)
+        self.symbols = dict(symbols or {})
+        self.names = ABI_NAMES if abi else [f'x{n}' for n in range(32)]
+
+        # Formato de cada mnemónico según su tipo en la tabla de instrucciones
+        self.formats = {}
+        for name, info in self.assembler.instructions.items():
+            if 'imm' in info:
+                self.formats[name] = 'system'
+            elif name == 'fence':
+                self.formats[name] = 'I'
+            elif info['type'] == 'I' and (info['opcode'] == 0b0000011 or name == 'jalr'):
+                self.formats[name] = 'load'
+            elif info['type'] == 'I' and 'funct7' in info:
+                self.formats[name] = 'shift'
+            else:
+                self.formats[name] = info['type']
+
+        # Tabla primaria indexada por opcode | funct3 << 7: (mnemónico, formato),
+        # o un dict extra -> (mnemónico, formato) cuando funct7 (o el inmediato
+        # fijo de ecall/ebreak) distingue la instrucción; _extra_shift da el
+        # desplazamiento para extraer ese campo
+        self._primary: List[object] = [None] * 1024
+        self._extra_shift = [25] * 1024
+        for (opcode, funct3, extra), name in self.assembler.decode_index.items():
+            entry = (name, self.formats[name])
+            for f3 in range(8) if funct3 is None else (funct3,):
+                slot = opcode | (f3 << 7)
+                if extra is None:
+                    self._primary[slot] = entry
+                else:
+                    if not isinstance(self._primary[slot], dict):
+                        self._primary[slot] = {}
+                    self._primary[slot][extra] = entry
+                    if opcode in self.assembler._decode_imm_opcodes:
+                        self._extra_shift[slot] = 20
+
+        self._labels_at: Dict[int, List[str]] = {}
+        for name, address in self.symbols.items():
+            self._labels_at.setdefault(address, []).append(name)
+        self._text_memo: Dict[int, str] = {}
+
+    def label_for(self, address: int) -> str:
+        """Nombre del label en una dirección (sintético si no hay símbolo)"""
+        names = self._labels_at.get(address)
+        if names:
+            return names[0]
+        return f"{SYNTHETIC_PREFIX}{address:08x}"
+
+    def collect_targets(self, words: Iterable[int], base: int = 0) -> Dict[int, str]:
+        """
+        Recorre las palabras buscando destinos de branches y jal, y asigna un
+        label sintético a los que no tienen símbolo. Retorna dirección -> nombre
+        de todos los labels que aparecerán en el código.
+        """
+        targets = {}
+        address = base
+        for word in words:
+            opcode = word & 0x7F
+            if opcode == 0b1100011:
+                target = (address + branch_target_offset(word)) & 0xFFFFFFFF
+                targets[target] = self.label_for(target)
+            elif opcode == 0b1101111:
+                target = (address + jump_target_offset(word)) & 0xFFFFFFFF
+                targets[target] = self.label_for(target)
+            address += 4
+        for address, names in self._labels_at.items():
+            targets.setdefault(address, names[0])
+        for address, name in targets.items():
+            if address not in self._labels_at:
+                self._labels_at[address] = [name]
+        return targets
+
+    def disassemble_word(self, word: int, address: int = 0) -> str:
+        """Texto assembly de una palabra; las no decodificables se emiten como .word"""
+        text = self._text_memo.get(word)
+        if text is not None:
+            return text
+
+        slot = (word & 0x7F) | ((word >> 5) & 0x380)
+        entry = self._primary[slot]
+        if entry.__class__ is dict:
+            entry = entry.get(word >> self._extra_shift[slot])
+        if entry is None:
+            return f".word 0x{word:08x}"
+
+        mnemonic, kind = entry
+        names = self.names
+        rd = names[(word >> 7) & 0x1F]
+        rs1 = names[(word >> 15) & 0x1F]
+        rs2 = names[(word >> 20) & 0x1F]
+        imm = (word >> 20) - 0x1000 if word & 0x80000000 else word >> 20
+
+        if kind == 'R':
+            text = f"{mnemonic} {rd}, {rs1}, {rs2}"
+        elif kind == 'I':
+            text = f"{mnemonic} {rd}, {rs1}, {imm}"
+        elif kind == 'load':
+            text = f"{mnemonic} {rd}, {imm}({rs1})"
+        elif kind == 'shift':
+            text = f"{mnemonic} {rd}, {rs1}, {(word >> 20) & 0x1F}"
+        elif kind == 'S':
+            offset = ((word >> 25) << 5) | ((word >> 7) & 0x1F)
+            offset = offset - 0x1000 if offset & 0x800 else offset
+            text = f"{mnemonic} {rs2}, {offset}({rs1})"
+        elif kind == 'U':
+            text = f"{mnemonic} {rd}, 0x{word >> 12:x}"
+        elif kind == 'B':
+            target = (address + branch_target_offset(word)) & 0xFFFFFFFF
+            return f"{mnemonic} {rs1}, {rs2}, {self.label_for(target)}"
+        elif kind == 'J':
+            target = (address + jump_target_offset(word)) & 0xFFFFFFFF
+            return f"{mnemonic} {rd}, {self.label_for(target)}"
+        else:
+            text = mnemonic
+
+        memo = self._text_memo
+        if len(memo) >= TEXT_MEMO_SIZE:
+            memo.clear()
+        memo[word] = text
+        return text
+
+    def disassemble(self, words: Sequence[int], base: int = 0,
+                    show_addresses: bool = False) -> Iterator[str]:
+        """
+        Genera el listado assembly: una línea 'label:' antes de cada dirección
+        con label y una línea indentada por instrucción. show_addresses añade
+        la dirección y la palabra como comentario.
+        words se recorre dos veces (destinos y texto), así que debe poder
+        iterarse de nuevo (lista, array, memoryview).
+        """
+        self.collect_targets(words, base)
+        labels_at = self._labels_at
+        disassemble_word = self.disassemble_word
+        address = base
+        for word in words:
+            if address in labels_at:
+                for name in labels_at[address]:
+                    yield name + ':'
+            if show_addresses:
+                yield '    %-32s # 0x%08x: %08x' % (disassemble_word(word, address), address, word)
+            else:
+                yield '    ' + disassemble_word(word, address)
+            address += 4
+
+    def labels(self) -> Dict[str, int]:
+        """Labels conocidos (símbolos y sintéticos) con su dirección"""
+        return {name: address for address, names in self._labels_at.items() for name in names}
+
+
+def disassemble(words: Sequence[int], base: int = 0, symbols: Optional[Dict[str, int]] = None,
+                abi: bool = False, show_addresses: bool = False) -> Iterator[str]:
+    """Desensambla una secuencia de palabras; ver Disassembler.disassemble"""
+    return Disassembler(symbols, abi).disassemble(words, base, show_addresses)
+
+
+def round_trip_check(words: Sequence[int], base: int = 0, symbols: Optional[Dict[str, int]] = None,
+                     max_reported: int = 20) -> Dict:
+    """
+    Comprueba que desensamblar y volver a ensamblar cada palabra da la misma
+    palabra. Las palabras que no son instrucciones RV32I se cuentan aparte.
+    Retorna {'checked', 'skipped', 'mismatches': [(dirección, palabra, texto, nueva)]}
+    con como máximo max_reported discrepancias listadas y 'mismatch_count' total.
+    """
+    disassembler = Disassembler(symbols)
+    disassembler.collect_targets(words, base)
+    assembler = RISCVAssembler()
+    assembler.labels = disassembler.labels()
+    assembler._reset_word_memo()
+
+    checked = skipped = mismatch_count = 0
+    mismatches = []
+    address = base
+    for word in words:
+        text = disassembler.disassemble_word(word, address)
+        if text.startswith('.word'):
+            skipped += 1
+        else:
+            checked += 1
+            _, instruction, operands = assembler.tokenize_line(text)
+            assembler.current_address = address
+            try:
+                encoded = assembler._encode_word(instruction, operands)
+            except ValueError:
+                encoded = None
+            if encoded != word:
+                mismatch_count += 1
+                if len(mismatches) < max_reported:
+                    mismatches.append((address, word, text, encoded))
+        address += 4
+
+    return {'checked': checked, 'skipped': skipped,
+            'mismatch_count': mismatch_count, 'mismatches': mismatches}
+
+
+def load_symbols(path: str) -> Dict[str, int]:
+    """
+    Lee labels de un listado .txt del ensamblador (sección LABELS), de un
+    archivo de depuración .dbg (-g) o de un mapa de símbolos con una entrada
+    'nombre dirección' o 'nombre: dirección' por línea
+    """
+    if path.endswith('.dbg'):
+        from debuginfo import read_debug_info
+
+        info = read_debug_info(path)
+        return dict(zip(info.symbol_names, info.symbol_addresses))
+
+    symbols = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        in_listing = False
+        for line in f:
+            stripped = line.strip()
+            if stripped == 'LABELS:':
+                in_listing = True
+                continue
+            if in_listing and stripped.startswith('='):
+                break  # Fin de la sección de labels del listado
+            if not stripped or stripped.startswith('#'):
+                continue
+            if in_listing:
+                # Los labels pueden contener espacios y ':' (p. ej. 'sum(int, int)')
+                name, _, value = stripped.rpartition(':')
+                symbols[name.strip()] = int(value.strip(), 0)
+            else:
+                match = _SYMBOL_LINE.match(line)
+                if match:
+                    symbols[match.group(1)] = int(match.group(2), 0)
+    return symbols
+
+
+def read_hex(path: str) -> array:
+    """Lee un .hex del ensamblador ('dirección: palabra' por línea)"""
+    words = array('I')
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            _, _, value = line.partition(':')
+            if value.strip():
+                words.append(int(value, 16))
+    return words
+
+
+@contextmanager
+def open_words(path: str):
+    """
+    Palabras de un .bin mapeado en memoria (sin copiarlo) o de un .hex.
+    El resultado admite varias pasadas.
+    """
+    if not path.endswith('.bin'):
+        yield read_hex(path)
+        return
+
+    with open(path, 'rb') as f:
+        f.seek(0, io.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            yield array('I')
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if sys.byteorder == 'little':
+                view = memoryview(mapped)[:size - size % 4].cast('I')
+                try:
+                    yield view
+                finally:
+                    view.release()
+            else:
+                words = array('I', mapped[:size - size % 4])
+                words.byteswap()
+                yield words
+        finally:
+            mapped.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Desensamblador RV32I')
+    parser.add_argument('input_file', help='Código máquina: .bin (little-endian) o .hex del ensamblador')
+    parser.add_argument('-o', '--output', help='Archivo assembly de salida (default: salida estándar)')
+    parser.add_argument('--symbols', help='Listado .txt o mapa de símbolos para recuperar los labels')
+    parser.add_argument('--base', type=lambda text: int(text, 0), default=0,
+                       help='Dirección de la primera palabra (default: 0)')
+    parser.add_argument('--abi', action='store_true', help='Usar nombres ABI de registros (a0, sp...)')
+    parser.add_argument('--no-addresses', action='store_true',
+                       help='No añadir dirección y palabra como comentario')
+    parser.add_argument('--check', action='store_true',
+                       help='Comprobar que cada instrucción vuelve a ensamblarse en la misma palabra')
+
+    args = parser.parse_args()
+    try:
+        symbols = load_symbols(args.symbols) if args.symbols else {}
+        with open_words(args.input_file) as words:
+            start = time.perf_counter()
+            if args.check:
+                result = round_trip_check(words, args.base, symbols)
+                elapsed = time.perf_counter() - start
+                print(f"Comprobadas {result['checked']} instrucciones en {elapsed:.3f} s, "
+                      f"{result['skipped']} palabras no decodificables, "
+                      f"{result['mismatch_count']} discrepancias")
+                for address, word, text, encoded in result['mismatches']:
+                    encoded = 'error' if encoded is None else f"{encoded:08x}"
+                    print(f"  0x{address:08x}: {word:08x} -> {text} -> {encoded}")
+                if result['mismatch_count']:
+                    sys.exit(1)
+                return
+
+            lines = disassemble(words, args.base, symbols, args.abi, not args.no_addresses)
+            out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+            try:
+                chunk = []
+                for line in lines:
+                    chunk.append(line)
+                    if len(chunk) >= 65536:
+                        out.write('\n'.join(chunk) + '\n')
+                        chunk.clear()
+                if chunk:
+                    out.write('\n'.join(chunk) + '\n')
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            if args.output:
+                print(f"Desensambladas {len(words)} palabras en {time.perf_counter() - start:.3f} s -> {args.output}")
+
+    except FileNotFoundError as e:
+        print(f"Error: No se pudo encontrar el archivo {e.filename}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error durante el desensamblado: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Análisis de riesgos del pipeline y planificación de instrucciones
+Modelo: núcleo en orden de 5 etapas (IF, ID, EX, MEM, WB) con forwarding. Una
+instrucción que usa el registro cargado por el load inmediatamente anterior se
+detiene LOAD_USE_STALL ciclos; un salto, o un branch tomado, descarta las
+BRANCH_PENALTY instrucciones ya buscadas (se resuelven en EX).
+"""
+
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+LOAD_USE_STALL = 1
+BRANCH_PENALTY = 2
+
+# Instrucciones que se planifican juntas como máximo (la búsqueda de dependencias es cuadrática)
+SCHEDULE_WINDOW = 64
+
+# Clases de instrucción
+ALU, LOAD, STORE, BRANCH, JUMP, BARRIER = 'alu', 'load', 'store', 'branch', 'jump', 'barrier'
+
+LOADS = frozenset({'lb', 'lh', 'lw', 'lbu', 'lhu', 'c.lw', 'c.lwsp'})
+STORES = frozenset({'sb', 'sh', 'sw', 'c.sw', 'c.swsp'})
+
+# No se mueven: auipc depende de su propia dirección y las de sistema de todo el estado
+BARRIERS = frozenset({'ecall', 'ebreak', 'fence', 'c.ebreak', 'auipc'})
+
+# RV32C: mnemónico -> (operandos escritos, operandos leídos, clase)
+_COMPRESSED_USAGE = {
+    'c.addi': ((0,), (0,), ALU), 'c.addi16sp': ((0,), (0,), ALU), 'c.slli': ((0,), (0,), ALU),
+    'c.srli': ((0,), (0,), ALU), 'c.srai': ((0,), (0,), ALU), 'c.andi': ((0,), (0,), ALU),
+    'c.li': ((0,), (), ALU), 'c.lui': ((0,), (), ALU), 'c.addi4spn': ((0,), (1,), ALU),
+    'c.mv': ((0,), (1,), ALU), 'c.add': ((0,), (0, 1), ALU), 'c.sub': ((0,), (0, 1), ALU),
+    'c.xor': ((0,), (0, 1), ALU), 'c.or': ((0,), (0, 1), ALU), 'c.and': ((0,), (0, 1), ALU),
+    'c.nop': ((), (), ALU), 'c.beqz': ((), (0,), BRANCH), 'c.bnez': ((), (0,), BRANCH),
+    'c.j': ((), (), JUMP), 'c.jal': ((), (), JUMP), 'c.jr': ((), (0,), JUMP), 'c.jalr': ((), (0,), JUMP),
+}
+
+Usage = Tuple[str, FrozenSet[int], FrozenSet[int]]
+
+_NO_REGISTERS = frozenset()
+
+
+def instruction_usage(instruction: str, operands: Sequence[str], registers: Dict[str, int],
+                      types: Dict[str, str]) -> Usage:
+    """
+    (clase, registros escritos, registros leídos) de una instrucción real o
+    comprimida; x0 no cuenta. Lo que no se reconoce se trata como BARRIER.
+    types: mnemónico -> formato ('R', 'I', ...) de las instrucciones RV32I
+    """
+    def register(operand):
+        return registers.get(operand.strip().lower())
+
+    def base(operand):
+        _, _, rest = operand.partition('(')
+        return register(rest.rstrip(') ')) if rest else None
+
+    if instruction in BARRIERS or any(operand[:7] == '%pcrel_' for operand in operands):
+        return BARRIER, _NO_REGISTERS, _NO_REGISTERS
+    try:
+        if instruction in LOADS:
+            kind, defs, uses = LOAD, [register(operands[0])], [base(operands[1])]
+        elif instruction in STORES:
+            kind, defs, uses = STORE, [], [register(operands[0]), base(operands[1])]
+        elif instruction in _COMPRESSED_USAGE:
+            written, read, kind = _COMPRESSED_USAGE[instruction]
+            defs = [register(operands[i]) for i in written]
+            uses = [register(operands[i]) for i in read]
+            if instruction == 'c.jal' or instruction == 'c.jalr':
+                defs.append(1)
+        else:
+            info_type = types.get(instruction)
+            if info_type == 'R':
+                kind, defs, uses = ALU, [register(operands[0])], [register(operands[1]), register(operands[2])]
+            elif instruction == 'jalr':
+                if len(operands) == 3:
+                    rs1 = register(operands[1])
+                elif '(' in operands[-1]:
+                    rs1 = base(operands[-1])
+                else:
+                    rs1 = register(operands[-1])
+                kind, defs, uses = JUMP, [register(operands[0]) if len(operands) > 1 else 1], [rs1]
+            elif info_type == 'I':
+                kind, defs = ALU, [register(operands[0])]
+                uses = [register(operands[1])] if len(operands) == 3 else []
+            elif info_type == 'B':
+                kind, defs, uses = BRANCH, [], [register(operands[0]), register(operands[1])]
+            elif info_type == 'U':
+                kind, defs, uses = ALU, [register(operands[0])], []
+            elif info_type == 'J':
+                kind, defs, uses = JUMP, [register(operands[0]) if len(operands) == 2 else 1], []
+            else:
+                return BARRIER, _NO_REGISTERS, _NO_REGISTERS
+    except IndexError:
+        return BARRIER, _NO_REGISTERS, _NO_REGISTERS
+    if None in defs or None in uses:
+        return BARRIER, _NO_REGISTERS, _NO_REGISTERS
+    return kind, frozenset(defs) - {0}, frozenset(uses) - {0}
+
+
+def basic_blocks(usages: Sequence[Usage], leaders: Iterable[int]) -> List[Tuple[int, int]]:
+    """Tramos [inicio, fin) de instrucciones: empiezan en un leader o tras un salto o branch"""
+    leaders = set(leaders)
+    blocks = []
+    start = 0
+    for index, (kind, _, _) in enumerate(usages):
+        if index > start and index in leaders:
+            blocks.append((start, index))
+            start = index
+        if kind == BRANCH or kind == JUMP:
+            blocks.append((start, index + 1))
+            start = index + 1
+    if start < len(usages):
+        blocks.append((start, len(usages)))
+    return blocks
+
+
+def _load_use(usages: Sequence[Usage], previous: Optional[int], index: Optional[int]) -> FrozenSet[int]:
+    """Registros que `index` lee y que cargó el load `previous` justo antes"""
+    if previous is None or index is None or usages[previous][0] != LOAD:
+        return _NO_REGISTERS
+    return usages[previous][1] & usages[index][2]
+
+
+def count_stalls(order: Sequence[Optional[int]], usages: Sequence[Usage]) -> int:
+    """Ciclos de parada load-use de una secuencia de instrucciones (None se ignora)"""
+    order = [index for index in order if index is not None]
+    return sum(LOAD_USE_STALL for previous, index in zip(order, order[1:]) if _load_use(usages, previous, index))
+
+
+class HazardReport:
+    """
+    Resultado de analyze_hazards:
+    - blocks: (inicio, fin, ciclos, paradas, clase de la última instrucción) de cada bloque
+    - notes: índice de instrucción -> [(tipo, texto)] para el listado
+    - load_use / branches / jumps / cycles: totales del programa
+    """
+
+    def __init__(self):
+        self.blocks: List[Tuple[int, int, int, int, str]] = []
+        self.notes: Dict[int, List[Tuple[str, str]]] = {}
+        self.load_use = 0
+        self.branches = 0
+        self.jumps = 0
+        self.cycles = 0
+
+    def note(self, index: int, kind: str, text: str):
+        self.notes.setdefault(index, []).append((kind, text))
+
+    def summary(self) -> str:
+        return (f"{self.load_use} load-use, {self.branches} branches, {self.jumps} saltos; "
+                f"{self.cycles} ciclos estimados en {len(self.blocks)} bloques")
+
+
+def analyze_hazards(parsed_lines: Sequence[Tuple[Optional[str], str, List[str]]], leaders: Iterable[int],
+                    registers: Dict[str, int], types: Dict[str, str]) -> HazardReport:
+    """
+    Marca los riesgos load-use y de control de cada instrucción y estima los
+    ciclos de cada bloque básico ejecutado una vez: una por instrucción, más
+    las paradas load-use y la penalización del salto final (la del branch se
+    indica aparte, porque depende de si se toma)
+    """
+    usages = [instruction_usage(instruction, operands, registers, types)
+              for _, instruction, operands in parsed_lines]
+    names = {}
+    for name, number in registers.items():
+        if name[0] != 'x':
+            names.setdefault(number, name)
+    report = HazardReport()
+
+    for start, end in basic_blocks(usages, leaders):
+        stalls = 0
+        for index in range(start, end):
+            conflict = _load_use(usages, index - 1 if index > 0 else None, index)
+            if conflict:
+                stalls += LOAD_USE_STALL
+                used = ', '.join(names.get(reg, f"x{reg}") for reg in sorted(conflict))
+                report.note(index, 'Hazard', f"load-use: {used} viene del load anterior "
+                                             f"(+{LOAD_USE_STALL} ciclo de parada)")
+            kind = usages[index][0]
+            if kind == BRANCH:
+                report.branches += 1
+                report.note(index, 'Hazard', f"control: +{BRANCH_PENALTY} ciclos si se toma el branch")
+            elif kind == JUMP:
+                report.jumps += 1
+                report.note(index, 'Hazard', f"control: salto, +{BRANCH_PENALTY} ciclos")
+
+        last = usages[end - 1][0]
+        cycles = end - start + stalls + (BRANCH_PENALTY if last == JUMP else 0)
+        count = end - start
+        text = f"{count} {'instrucción' if count == 1 else 'instrucciones'}, {cycles} ciclos estimados"
+        if last == BRANCH:
+            text += f" ({cycles + BRANCH_PENALTY} si se toma el branch)"
+        report.note(end - 1, 'Bloque', text)
+        report.blocks.append((start, end, cycles, stalls, last))
+        report.load_use += stalls // LOAD_USE_STALL
+        report.cycles += cycles
+    return report
+
+
+def _schedule_window(window: List[int], usages: Sequence[Usage],
+                     previous: Optional[int], following: Optional[int]) -> List[int]:
+    """
+    Reordena una ventana de instrucciones movibles (planificación por lista):
+    en cada paso elige, entre las que ya tienen sus dependencias colocadas, una
+    que no use el load recién colocado, y entre ellas la del camino crítico
+    más largo. Se queda con el orden nuevo sólo si tiene menos paradas.
+    """
+    if len(window) < 2:
+        return window
+
+    # Dependencias: RAW, WAR y WAW de registros, y el orden de los accesos a memoria con stores
+    predecessors = {index: 0 for index in window}
+    successors: Dict[int, List[int]] = {index: [] for index in window}
+    for position, first in enumerate(window):
+        first_kind, first_defs, first_uses = usages[first]
+        first_memory = first_kind == LOAD or first_kind == STORE
+        for second in window[position + 1:]:
+            second_kind, second_defs, second_uses = usages[second]
+            memory = (first_memory and (second_kind == LOAD or second_kind == STORE)
+                      and STORE in (first_kind, second_kind))
+            if memory or first_defs & second_uses or first_uses & second_defs or first_defs & second_defs:
+                predecessors[second] += 1
+                successors[first].append(second)
+
+    # Longitud del camino crítico (ciclos hasta el final de la ventana)
+    height = {}
+    for index in reversed(window):
+        paths = [1 + (LOAD_USE_STALL if _load_use(usages, index, following) else 0)]
+        for successor in successors[index]:
+            stall = LOAD_USE_STALL if _load_use(usages, index, successor) else 0
+            paths.append(1 + stall + height[successor])
+        height[index] = max(paths)
+
+    ready = [index for index in window if not predecessors[index]]
+    order = []
+    last = previous
+    while ready:
+        best = min(ready, key=lambda index: (bool(_load_use(usages, last, index)), -height[index], index))
+        ready.remove(best)
+        order.append(best)
+        last = best
+        for successor in successors[best]:
+            predecessors[successor] -= 1
+            if not predecessors[successor]:
+                ready.append(successor)
+
+    if count_stalls([previous] + order + [following], usages) < count_stalls([previous] + window + [following], usages):
+        return order
+    return window
+
+
+def schedule_instructions(parsed_lines: Sequence[Tuple[Optional[str], str, List[str]]], leaders: Iterable[int],
+                          fixed: Set[int], registers: Dict[str, int], types: Dict[str, str]
+                          ) -> Tuple[List[int], int, int]:
+    """
+    Orden nuevo de las instrucciones (permutación de índices) que evita usar el
+    resultado de un load en la instrucción siguiente. Sólo se mueven
+    instrucciones dentro de su bloque básico: el salto o branch final, las
+    barreras (auipc, %pcrel, ecall, fence...) y los índices de `fixed` (p. ej.
+    el relleno de '.align') no cambian de sitio, así que el inicio de cada
+    bloque, y por tanto cada label, conserva su dirección.
+    Retorna (orden, paradas load-use antes, paradas después).
+    """
+    usages = [instruction_usage(instruction, operands, registers, types)
+              for _, instruction, operands in parsed_lines]
+    count = len(usages)
+    order = []
+    for start, end in basic_blocks(usages, leaders):
+        window = []
+        for index in range(start, end + 1):
+            movable = index < end and usages[index][0] in (ALU, LOAD, STORE) and index not in fixed
+            if movable and len(window) < SCHEDULE_WINDOW:
+                window.append(index)
+                continue
+            if window:
+                previous = order[-1] if order else None
+                order.extend(_schedule_window(window, usages, previous, index if index < count else None))
+            window = [index] if movable else []
+            if index < end and not movable:
+                order.append(index)
+    return order, count_stalls(range(count), usages), count_stalls(order, usages)
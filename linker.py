@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Archivos objeto y enlazador para el ensamblador RISC-V 32-bit
+Permite ensamblar cada módulo por separado y combinarlos después
+"""
+
+import struct
+import sys
+from array import array
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from assembler import (RISCVAssembler, DEFAULT_FORMATS, open_sinks, print_generated,
+                       branch_immediate, jump_immediate, hi20, lo12)
+
+OBJECT_MAGIC = b'RVO1'
+
+# Tipos de reubicación
+RELOC_BRANCH = 0  # Offset relativo de 13 bits (tipo B)
+RELOC_JUMP = 1    # Offset relativo de 21 bits (tipo J)
+RELOC_HI20 = 2    # %hi(símbolo) en lui/auipc
+RELOC_LO12 = 3    # %lo(símbolo) en instrucciones tipo I
+
+RELOC_NAMES = {RELOC_BRANCH: 'B', RELOC_JUMP: 'J', RELOC_HI20: 'HI20', RELOC_LO12: 'LO12'}
+
+# Bits de inmediato de cada tipo de reubicación dentro de la palabra
+RELOC_MASKS = {
+    RELOC_BRANCH: 0xFE000F80,
+    RELOC_JUMP: 0xFFFFF000,
+    RELOC_HI20: 0xFFFFF000,
+    RELOC_LO12: 0xFFF00000,
+}
+
+_HEADER = struct.Struct('<4s4I')
+_SYMBOL = struct.Struct('<IH')
+_RELOC = struct.Struct('<IBH')
+
+
+class ObjectFile:
+    """
+    Módulo ensamblado con direcciones relativas a 0:
+    - code: palabras de 32 bits
+    - symbols: labels definidos en el módulo -> offset
+    - relocations: (offset, tipo, símbolo) que se resuelven al enlazar
+    - listing: texto de cada instrucción para el listado
+    """
+
+    def __init__(self, code: array, symbols: Dict[str, int],
+                 relocations: List[Tuple[int, int, str]], listing: List[str]):
+        self.code = code
+        self.symbols = symbols
+        self.relocations = relocations
+        self.listing = listing
+
+    def to_bytes(self) -> bytes:
+        """Serializa el objeto en formato binario little-endian"""
+        code = array('I', self.code)
+        if sys.byteorder == 'big':
+            code.byteswap()
+        listing = '\n'.join(self.listing).encode('utf-8')
+
+        parts = [_HEADER.pack(OBJECT_MAGIC, len(code), len(self.symbols), len(self.relocations), len(listing)),
+                 code.tobytes()]
+        for name, value in self.symbols.items():
+            encoded = name.encode('utf-8')
+            parts.append(_SYMBOL.pack(value, len(encoded)) + encoded)
+        for offset, kind, symbol in self.relocations:
+            encoded = symbol.encode('utf-8')
+            parts.append(_RELOC.pack(offset, kind, len(encoded)) + encoded)
+        parts.append(listing)
+
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ObjectFile':
+        """Reconstruye un objeto serializado con to_bytes"""
+        magic, n_code, n_symbols, n_relocs, listing_size = _HEADER.unpack_from(data, 0)
+        if magic != OBJECT_MAGIC:
+            raise ValueError("Archivo objeto inválido")
+        pos = _HEADER.size
+
+        code = array('I')
+        code.frombytes(data[pos:pos + 4 * n_code])
+        if sys.byteorder == 'big':
+            code.byteswap()
+        pos += 4 * n_code
+
+        symbols = {}
+        for _ in range(n_symbols):
+            value, size = _SYMBOL.unpack_from(data, pos)
+            pos += _SYMBOL.size
+            symbols[data[pos:pos + size].decode('utf-8')] = value
+            pos += size
+
+        relocations = []
+        for _ in range(n_relocs):
+            offset, kind, size = _RELOC.unpack_from(data, pos)
+            pos += _RELOC.size
+            relocations.append((offset, kind, data[pos:pos + size].decode('utf-8')))
+            pos += size
+
+        listing = data[pos:pos + listing_size].decode('utf-8').split('\n') if listing_size else []
+        return cls(code, symbols, relocations, listing)
+
+
+def write_object(path: str, obj: ObjectFile):
+    with open(path, 'wb') as f:
+        f.write(obj.to_bytes())
+
+
+def read_object(path: str) -> ObjectFile:
+    with open(path, 'rb') as f:
+        return ObjectFile.from_bytes(f.read())
+
+
+def assemble_object(lines: List[str], assembler: Optional[RISCVAssembler] = None) -> ObjectFile:
+    """
+    Ensambla un módulo como código reubicable. Los branches y saltos a labels
+    locales se resuelven ya; los que apuntan a símbolos externos y todos los
+    %hi/%lo (incluido 'la', que depende de la dirección final del módulo)
+    quedan como reubicaciones con el inmediato a 0.
+    """
+    if assembler is None:
+        assembler = RISCVAssembler()
+
+    assembler.labels = {}
+    assembler.relocatable = True
+    try:
+        parsed_lines = assembler.first_pass(lines)
+    finally:
+        assembler.relocatable = False
+
+    labels = assembler.labels
+    code = array('I')
+    relocations = []
+    listing = []
+    assembler._reset_word_memo()
+
+    for index, (_, instruction, operands) in enumerate(parsed_lines):
+        address = index * 4
+        assembler.current_address = address
+        try:
+            symbol = assembler.label_reference(instruction, operands)
+            if symbol is not None:
+                kind = assembler.instructions[instruction]['type']
+                if kind == 'B' or kind == 'J':
+                    if symbol not in labels:
+                        relocations.append((address, RELOC_BRANCH if kind == 'B' else RELOC_JUMP, symbol))
+                elif operands[-1].startswith('%pcrel'):
+                    # Relativo al PC: sólo se resuelve dentro del módulo
+                    if symbol not in labels:
+                        raise ValueError(f"%pcrel a un símbolo externo no soportado: {symbol}")
+                else:
+                    reloc = RELOC_HI20 if operands[-1].startswith('%hi') else RELOC_LO12
+                    relocations.append((address, reloc, symbol))
+                    operands = operands[:-1] + ['0']
+
+            code.append(assembler._encode_word(instruction, operands))
+        except Exception as e:
+            raise ValueError(f"Error en dirección 0x{address:08x}: {e}")
+
+        listing.append(f"{instruction} {', '.join(parsed_lines[index][2])}")
+
+    return ObjectFile(code, dict(labels), relocations, listing)
+
+
+def patch_word(word: int, kind: int, target: int, pc: int) -> int:
+    """Aplica una reubicación a una palabra ya codificada"""
+    word &= ~RELOC_MASKS[kind] & 0xFFFFFFFF
+    if kind == RELOC_BRANCH:
+        return word | branch_immediate(target - pc)
+    if kind == RELOC_JUMP:
+        return word | jump_immediate(target - pc)
+    if kind == RELOC_HI20:
+        return word | (hi20(target) << 12)
+    return word | ((lo12(target) & 0xFFF) << 20)
+
+
+def link(objects: List[ObjectFile], names: Optional[List[str]] = None,
+         base: int = 0) -> Tuple[array, Dict[str, int], List[str]]:
+    """
+    Enlaza los módulos uno tras otro a partir de `base`. Cada reubicación se
+    resuelve primero contra los símbolos del propio módulo y después contra
+    los de los demás; un símbolo externo definido en varios módulos es un error.
+
+    Retorna (código máquina, labels con su dirección final, listado).
+    """
+    if names is None:
+        names = [f"módulo {i}" for i in range(len(objects))]
+
+    bases = []
+    address = base
+    for obj in objects:
+        bases.append(address)
+        address += 4 * len(obj.code)
+
+    definitions: Dict[str, List[int]] = {}
+    for obj, module_base in zip(objects, bases):
+        for name, value in obj.symbols.items():
+            definitions.setdefault(name, []).append(module_base + value)
+
+    code = array('I')
+    listing = []
+    for obj in objects:
+        code.extend(obj.code)
+        listing.extend(obj.listing)
+
+    for obj, name, module_base in zip(objects, names, bases):
+        for offset, kind, symbol in obj.relocations:
+            if symbol in obj.symbols:
+                target = module_base + obj.symbols[symbol]
+            else:
+                candidates = definitions.get(symbol)
+                if not candidates:
+                    raise ValueError(f"Símbolo no definido: {symbol} (en {name})")
+                if len(candidates) > 1:
+                    raise ValueError(f"Símbolo definido en varios módulos: {symbol} (usado en {name})")
+                target = candidates[0]
+
+            pc = module_base + offset
+            index = (pc - base) // 4
+            try:
+                code[index] = patch_word(code[index], kind, target, pc)
+            except ValueError as e:
+                raise ValueError(f"Error en dirección 0x{pc:08x} ({name}): {e}")
+
+    # Labels finales; los nombres repetidos en varios módulos se califican con el módulo
+    labels = {}
+    for obj, name, module_base in zip(objects, names, bases):
+        for symbol, value in obj.symbols.items():
+            key = symbol if len(definitions[symbol]) == 1 else f"{symbol}@{name}"
+            labels[key] = module_base + value
+
+    return code, labels, listing
+
+
+def link_files(object_paths: List[str], output_base: str, base: int = 0,
+               formats: Sequence[str] = DEFAULT_FORMATS) -> bool:
+    """Enlaza archivos .o y genera los archivos de salida pedidos"""
+    try:
+        objects = [read_object(path) for path in object_paths]
+        code, labels, listing = link(objects, object_paths, base)
+        print(f"Enlazados {len(objects)} módulos, {len(code)} instrucciones")
+
+        with ExitStack() as stack:
+            sinks = open_sinks(stack, output_base, formats)
+            parsed_lines = []
+            for text in listing:
+                instruction, _, operands = text.partition(' ')
+                parsed_lines.append((None, instruction, [operands] if operands else []))
+            for sink in sinks:
+                sink.begin(labels)
+                sink.write_many(base, code, parsed_lines)
+                sink.finish()
+
+        print_generated(output_base, formats)
+        return True
+
+    except FileNotFoundError as e:
+        print(f"Error: No se pudo encontrar el archivo {e.filename}")
+    except Exception as e:
+        print(f"Error durante el enlazado: {e}")
+    return False
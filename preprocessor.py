@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Preprocesador del ensamblador RISC-V 32-bit: .include, .macro/.endm y
+.rept/.endr. Trabaja sobre las líneas ya tokenizadas y conserva, para cada
+línea generada, el archivo y la línea de origen para los mensajes de error.
+"""
+
+import os
+import re
+from bisect import bisect_right
+from itertools import chain, repeat
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+Tokens = Tuple[Optional[str], str, List[str]]
+
+# Directivas que abren un cuerpo y la que lo cierra
+BLOCK_CLOSERS = {'.macro': '.endm', '.rept': '.endr'}
+
+# Directivas que consume el preprocesador; el resto pasa al ensamblador
+PREPROCESSOR_DIRECTIVES = frozenset({'.include', '.macro', '.endm', '.rept', '.endr'})
+
+# Profundidad máxima de .include y expansiones anidadas (evita la recursión infinita)
+MAX_DEPTH = 64
+
+
+class PreprocessorError(ValueError):
+    """Error del preprocesador con su origen: archivo, línea y macro/.rept en curso"""
+
+    def __init__(self, message: str, filename: Optional[str], line: int, context: Optional[str],
+                 location: str):
+        super().__init__(f"Error en {location}: {message}")
+        self.message = message
+        self.filename = filename
+        self.line = line
+        self.context = context
+        self.location = location
+
+
+class Macro:
+    """Macro definida con .macro: parámetros (con su valor por defecto) y cuerpo"""
+
+    def __init__(self, name: str, params: List[Tuple[str, Optional[str]]], body: List[str]):
+        self.name = name
+        self.params = params
+        self.body = body
+        names = '|'.join(re.escape(name) for name, _ in sorted(params, key=lambda p: -len(p[0])))
+        self.pattern = re.compile(r'\\(@|' + names + r')(?!\w)' if names else r'\\(@)')
+        # Sin \@ el resultado sólo depende de los argumentos y puede memoizarse
+        self.unique = any('\\@' in line for line in body)
+
+    def bind(self, operands: List[str]) -> Dict[str, str]:
+        """Argumentos de una invocación por nombre de parámetro"""
+        if len(operands) > len(self.params):
+            raise ValueError(f"Demasiados argumentos para la macro {self.name}")
+        values = {}
+        for index, (name, default) in enumerate(self.params):
+            if index < len(operands):
+                values[name] = operands[index]
+            elif default is not None:
+                values[name] = default
+            else:
+                raise ValueError(f"Falta el argumento '{name}' de la macro {self.name}")
+        return values
+
+
+class Preprocessor:
+    """
+    Expande .include, .macro y .rept delante del ensamblador. Cada archivo
+    incluido se lee y tokeniza una sola vez por ejecución; las expansiones de
+    una macro con los mismos argumentos se reutilizan.
+
+    tokenize: función línea -> (label, instrucción, operandos)
+    source_dir: directorio del fuente principal, para resolver los .include
+    source_name: nombre del fuente principal (no se muestra en los errores)
+    """
+
+    def __init__(self, tokenize: Callable[[str], Tokens], source_dir: str = '',
+                 source_name: Optional[str] = None):
+        self.tokenize = tokenize
+        self.source_dir = source_dir
+        self.source_name = source_name
+        self.macros: Dict[str, Macro] = {}
+        self._files: Dict[str, List[Tuple[str, Tokens]]] = {}
+        self._expansions: Dict[Tuple[str, Tuple[str, ...]], List[Tuple[str, Tokens]]] = {}
+        self._unique = 0
+        self._count = 0
+        # Mapa de líneas por tramos: la línea generada i (desde 1) del tramo k
+        # viene de (archivo, línea + paso * (i - inicio), contexto)
+        self._starts: List[int] = []
+        self._segments: List[Tuple[str, int, int, Optional[str]]] = []
+
+    def process(self, lines: Iterable[str]) -> Iterator[Tokens]:
+        """
+        Tokens del fuente ya preprocesado, una entrada por línea generada. Las
+        macros definidas y el mapa de líneas se reinician en cada llamada; la
+        caché de archivos incluidos se conserva.
+        """
+        self.macros = {}
+        self._expansions = {}
+        self._unique = 0
+        self._count = 0
+        self._starts = []
+        self._segments = []
+        entries = ((line, self.tokenize(line)) for line in lines)
+        return self._walk(entries, self.source_name, 1, 1, None, 0)
+
+    @property
+    def line_count(self) -> int:
+        """Líneas generadas hasta ahora por el último process"""
+        return self._count
+
+    def locate(self, line_num: int) -> Tuple[Optional[str], int, Optional[str]]:
+        """(archivo, línea, macro/.rept) de origen de la línea generada line_num"""
+        segment = bisect_right(self._starts, line_num) - 1
+        if segment < 0:
+            return self.source_name, line_num, None
+        filename, line, step, context = self._segments[segment]
+        return filename, line + step * (line_num - self._starts[segment]), context
+
+    def describe(self, line_num: int) -> str:
+        """Origen de la línea generada line_num: 'línea N', con el archivo y la macro si corresponde"""
+        return self._where(*self.locate(line_num))
+
+    def _walk(self, entries: Iterable[Tuple[str, Tokens]], filename: Optional[str], first_line: int,
+              step: int, context: Optional[str], depth: int) -> Iterator[Tokens]:
+        """
+        Recorre (texto, tokens) numerando desde first_line con el paso dado (0
+        en las expansiones, que se atribuyen a la línea que las invoca)
+        """
+        if depth > MAX_DEPTH:
+            raise self._error("anidamiento de .include/.macro/.rept demasiado profundo", filename, first_line)
+
+        macros = self.macros
+        mapped = False
+        line = first_line - step
+        entries = iter(entries)
+        for text, tokens in entries:
+            line += step
+            label, instruction, operands = tokens
+            if instruction not in PREPROCESSOR_DIRECTIVES and instruction not in macros:
+                if not mapped:
+                    self._starts.append(self._count + 1)
+                    self._segments.append((filename, line, step, context))
+                    mapped = True
+                self._count += 1
+                yield tokens
+                continue
+            if instruction == '.endm' or instruction == '.endr':
+                raise self._error(f"{instruction} sin apertura", filename, line, context)
+
+            # Directiva del preprocesador o invocación de macro: el label de la
+            # línea queda en una línea propia y el mapa se reanuda después
+            mapped = False
+            if label:
+                self._starts.append(self._count + 1)
+                self._segments.append((filename, line, step, context))
+                self._count += 1
+                yield label, '', []
+
+            try:
+                if instruction == '.include':
+                    path, included = self._load(operands, filename)
+                    nested = (path, 1, 1, None)
+                elif instruction in BLOCK_CLOSERS:
+                    body, consumed = self._collect(entries, instruction)
+                    nested = None
+                    if instruction == '.macro':
+                        self._define(operands, body)
+                    else:
+                        count = self._repeat_count(operands)
+                        body_entries = [(body_line, self.tokenize(body_line)) for body_line in body]
+                        included = chain.from_iterable(repeat(body_entries, count))
+                        nested = (filename, line, 0, '.rept')
+                    line += step * consumed
+                else:
+                    included = self._expand(macros[instruction], operands)
+                    nested = (filename, line, 0, f"macro {instruction}")
+            except ValueError as e:
+                raise self._error(str(e), filename, line, context)
+
+            if nested is not None:
+                nested_file, nested_line, nested_step, nested_context = nested
+                yield from self._walk(included, nested_file, nested_line, nested_step,
+                                      nested_context or context, depth + 1)
+
+    def _where(self, filename: Optional[str], line: int, context: Optional[str] = None) -> str:
+        text = f"línea {line}"
+        if filename != self.source_name:
+            text += f" de {filename}"
+        return f"{text} ({context})" if context else text
+
+    def _error(self, message: str, filename: Optional[str], line: int,
+               context: Optional[str] = None) -> PreprocessorError:
+        return PreprocessorError(message, filename, line, context, self._where(filename, line, context))
+
+    def _load(self, operands: List[str], filename: Optional[str]) -> Tuple[str, List[Tuple[str, Tokens]]]:
+        """Lee y tokeniza un archivo incluido, una sola vez por ejecución"""
+        if len(operands) != 1:
+            raise ValueError(".include requiere una ruta")
+        if filename is None or filename == self.source_name:
+            directory = self.source_dir
+        else:
+            directory = os.path.dirname(filename)
+        path = os.path.normpath(os.path.join(directory, operands[0].strip('"\'')))
+        if path not in self._files:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._files[path] = [(line, self.tokenize(line)) for line in f]
+            except OSError:
+                raise ValueError(f"No se pudo leer el archivo incluido: {path}")
+        return path, self._files[path]
+
+    def _collect(self, entries: Iterator[Tuple[str, Tokens]], opener: str) -> Tuple[List[str], int]:
+        """Cuerpo de un .macro/.rept hasta su cierre (admite anidamiento); retorna (líneas, consumidas)"""
+        body = []
+        stack = [BLOCK_CLOSERS[opener]]
+        consumed = 0
+        for text, (_, instruction, _) in entries:
+            consumed += 1
+            if instruction in BLOCK_CLOSERS:
+                stack.append(BLOCK_CLOSERS[instruction])
+            elif instruction in ('.endm', '.endr'):
+                if instruction != stack.pop():
+                    raise ValueError(f"{instruction} no corresponde con el bloque abierto")
+                if not stack:
+                    return body, consumed
+            body.append(text)
+        raise ValueError(f"{opener} sin {BLOCK_CLOSERS[opener]}")
+
+    def _define(self, operands: List[str], body: List[str]):
+        """.macro nombre p1, p2=defecto (los parámetros pueden separarse con espacios o comas)"""
+        words = ' '.join(operands).replace(',', ' ').split()
+        if not words:
+            raise ValueError(".macro requiere un nombre")
+        name = words[0].lower()
+        if name.startswith('.'):
+            raise ValueError(f"Nombre de macro inválido: {name}")
+        params = []
+        for word in words[1:]:
+            param, has_default, default = word.partition('=')
+            params.append((param, default if has_default else None))
+        self.macros[name] = Macro(name, params, body)
+
+    def _repeat_count(self, operands: List[str]) -> int:
+        if len(operands) != 1:
+            raise ValueError(".rept requiere un número de repeticiones")
+        try:
+            count = int(operands[0], 0)
+        except ValueError:
+            raise ValueError(f"Número de repeticiones inválido: {operands[0]}")
+        if count < 0:
+            raise ValueError(f"Número de repeticiones inválido: {count}")
+        return count
+
+    def _expand(self, macro: Macro, operands: List[str]) -> List[Tuple[str, Tokens]]:
+        """Cuerpo de la macro con los argumentos sustituidos (\\param y \\@)"""
+        key = (macro.name, tuple(operands))
+        if not macro.unique and key in self._expansions:
+            return self._expansions[key]
+
+        values = macro.bind(operands)
+        values['@'] = str(self._unique)
+        self._unique += 1
+        substitute = lambda match: values[match.group(1)]
+        expansion = [(line, self.tokenize(line))
+                     for line in (macro.pattern.sub(substitute, text) for text in macro.body)]
+        if not macro.unique:
+            self._expansions[key] = expansion
+        return expansion
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Servidor persistente del ensamblador RISC-V 32-bit y su cliente
+Mantiene ensambladores ya inicializados (tablas, memos y caché) para no pagar
+el arranque del intérprete y de RISCVAssembler en cada invocación.
+
+Protocolo: una petición JSON por línea y una respuesta JSON por línea, por
+un socket Unix o por la entrada/salida estándar. Petición:
+    {"id": 1, "input": "/ruta/prog.asm", "output": "/ruta/prog",
+     "formats": ["bin", "hex"], "optimize": false, "one_pass": false,
+     "stream": false, "debug": false, "compress": false, "hazards": false,
+     "schedule": false, "data_base": 268435456,
+     "source": "texto opcional"}
+Respuesta:
+    {"id": 1, "ok": true, "log": "...", "seconds": 0.002, "stats": {...}}
+Las órdenes {"command": "ping"} y {"command": "shutdown"} consultan y detienen
+el servidor. Las peticiones de una misma conexión se atienden en paralelo y
+pueden responderse en otro orden; el campo id permite emparejarlas.
+
+El cliente (main de este módulo) no importa el ensamblador salvo que no haya
+servidor escuchando, en cuyo caso ensambla en el propio proceso.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+from typing import Dict, Optional
+
+# Socket por defecto, uno por usuario
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"riscv-asm-{os.getuid()}.sock")
+
+# Tamaño máximo de una línea del protocolo (las peticiones pueden llevar el fuente)
+MAX_REQUEST = 64 * 1024 * 1024
+
+# Campos de una petición que se pasan a assemble_file
+REQUEST_FLAGS = ('optimize', 'one_pass', 'stream', 'debug', 'compress', 'hazards', 'schedule')
+
+# Ensamblador precalentado de cada proceso del servidor
+_server_state = {}
+
+
+def _init_server_worker(options: Dict):
+    """Crea el ensamblador (y la caché) que reutilizarán todas las peticiones del proceso"""
+    from assembler import RISCVAssembler, AssemblyCache
+
+    _server_state['assembler'] = RISCVAssembler(memo_size=options.get('memo_size', 65536))
+    _server_state['options'] = options
+    _server_state['cache'] = None
+    if options.get('cache_dir'):
+        _server_state['cache'] = AssemblyCache(options['cache_dir'], options['cache_max_entries'],
+                                               options['cache_max_bytes'])
+
+
+def _warm_up() -> int:
+    """Tarea vacía para arrancar los procesos del pool antes de la primera petición"""
+    return os.getpid()
+
+
+def _serve_job(request: Dict) -> Dict:
+    """Atiende una petición de ensamblado con el ensamblador del proceso"""
+    from assembler import DEFAULT_FORMATS, DATA_BASE, parse_formats
+
+    start = time.perf_counter()
+    assembler = _server_state['assembler']
+    options = _server_state['options']
+    log = io.StringIO()
+    with redirect_stdout(log):
+        try:
+            input_file = request.get('input', '<fuente>')
+            if 'input' not in request and 'source' not in request:
+                raise ValueError("La petición necesita 'input' o 'source'")
+            formats = request.get('formats', DEFAULT_FORMATS)
+            if isinstance(formats, str):
+                formats = parse_formats(formats)
+            assembler.data_base = request.get('data_base', options.get('data_base', DATA_BASE))
+            flags = {flag: bool(request.get(flag, False)) for flag in REQUEST_FLAGS}
+            ok = assembler.assemble_file(input_file, request.get('output', 'output'),
+                                         cache=_server_state['cache'], formats=formats,
+                                         text=request.get('source'), **flags)
+        except Exception as e:
+            print(f"Error: {e}")
+            ok = False
+
+    return {
+        'id': request.get('id'),
+        'ok': ok,
+        'log': log.getvalue(),
+        'seconds': time.perf_counter() - start,
+        'stats': assembler.stats.to_dict(),
+    }
+
+
+class AssemblyServer:
+    """
+    Atiende peticiones con asyncio y reparte el ensamblado (CPU) entre
+    `jobs` procesos, cada uno con su ensamblador ya inicializado
+    """
+
+    def __init__(self, jobs: int = 1, options: Optional[Dict] = None):
+        self.jobs = max(jobs, 1)
+        self.options = options or {}
+        self.executor = None
+        self.served = 0
+        self.stopping = None
+
+    def _new_executor(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_server_worker,
+                                   initargs=(self.options,))
+
+    async def start(self):
+        import asyncio
+
+        self.stopping = asyncio.Event()
+        self.executor = self._new_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm_up) for _ in range(self.jobs)))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def handle(self, request: Dict) -> Dict:
+        """Respuesta a una petición ya decodificada"""
+        import asyncio
+        from concurrent.futures.process import BrokenProcessPool
+
+        command = request.get('command')
+        if command == 'ping':
+            return {'id': request.get('id'), 'ok': True, 'pid': os.getpid(),
+                    'jobs': self.jobs, 'served': self.served}
+        if command == 'shutdown':
+            self.stopping.set()
+            return {'id': request.get('id'), 'ok': True}
+        if command is not None:
+            return {'id': request.get('id'), 'ok': False, 'log': f"Error: orden desconocida: {command}\n"}
+
+        loop = asyncio.get_running_loop()
+        try:
+            response = await loop.run_in_executor(self.executor, _serve_job, request)
+        except BrokenProcessPool as e:
+            # Un proceso terminó abruptamente: se rehace el pool para las siguientes
+            self.executor.shutdown(wait=False)
+            self.executor = self._new_executor()
+            response = {'id': request.get('id'), 'ok': False, 'log': f"Error en el proceso: {e}\n"}
+        self.served += 1
+        return response
+
+    async def serve_lines(self, reader, write):
+        """Lee peticiones línea a línea y escribe cada respuesta en cuanto está lista"""
+        import asyncio
+
+        async def answer(line: bytes):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("la petición debe ser un objeto JSON")
+            except ValueError as e:
+                response = {'id': None, 'ok': False, 'log': f"Error: petición inválida: {e}\n"}
+            else:
+                response = await self.handle(request)
+            await write((json.dumps(response, ensure_ascii=False) + '\n').encode('utf-8'))
+
+        tasks = set()
+        while not self.stopping.is_set():
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.ensure_future(answer(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def serve_unix(self, path: str):
+        import asyncio
+
+        if os.path.exists(path):
+            if _server_alive(path):
+                raise RuntimeError(f"Ya hay un servidor escuchando en {path}")
+            os.unlink(path)  # socket abandonado por un servidor anterior
+
+        async def connection(reader, writer):
+            lock = asyncio.Lock()
+
+            async def write(data: bytes):
+                async with lock:
+                    writer.write(data)
+                    await writer.drain()
+
+            try:
+                await self.serve_lines(reader, write)
+            except (ConnectionError, asyncio.CancelledError):
+                pass  # cliente desconectado o servidor deteniéndose
+            finally:
+                writer.close()
+
+        server = await asyncio.start_unix_server(connection, path, limit=MAX_REQUEST)
+        print(f"Servidor escuchando en {path} con {self.jobs} procesos", file=sys.stderr)
+        try:
+            async with server:
+                await self.stopping.wait()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def serve_stdio(self):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_REQUEST)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        stdout = sys.stdout.buffer
+
+        async def write(data: bytes):
+            stdout.write(data)
+            stdout.flush()
+
+        await self.serve_lines(reader, write)
+
+
+def run_server(socket_path: Optional[str], jobs: int = 1, options: Optional[Dict] = None):
+    """Arranca el servidor en un socket Unix, o en la entrada/salida estándar si socket_path es None"""
+    import asyncio
+
+    server = AssemblyServer(jobs, options)
+
+    async def main():
+        await server.start()
+        if socket_path is None:
+            await server.serve_stdio()
+        else:
+            await server.serve_unix(socket_path)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+def _server_alive(path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+        return True
+    except OSError:
+        return False
+
+
+def send_request(request: Dict, socket_path: str = DEFAULT_SOCKET, timeout: Optional[float] = None) -> Dict:
+    """Envía una petición al servidor; lanza OSError si no hay servidor escuchando"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request, ensure_ascii=False) + '\n').encode('utf-8'))
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("El servidor cerró la conexión sin responder")
+    return json.loads(line)
+
+
+def request_assembly(request: Dict, socket_path: str = DEFAULT_SOCKET,
+                     options: Optional[Dict] = None) -> Dict:
+    """
+    Ensambla con el servidor si está escuchando y, si no, en este proceso.
+    La respuesta indica en 'server' quién la atendió.
+    """
+    try:
+        response = send_request(request, socket_path)
+        response['server'] = True
+        return response
+    except (FileNotFoundError, ConnectionRefusedError):
+        if 'assembler' not in _server_state:
+            _init_server_worker(options or {})
+        response = _serve_job(request)
+        response['server'] = False
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cliente del servidor del ensamblador RISC-V 32-bit')
+    parser.add_argument('input_file', nargs='?', help='Archivo de código assembly')
+    parser.add_argument('-o', '--output', default='output', help='Nombre base de los archivos de salida (default: output)')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f'Socket del servidor (default: {DEFAULT_SOCKET})')
+    parser.add_argument('--formats', default=None, help='Formatos de salida separados por comas (default: bin,hex,txt)')
+    parser.add_argument('-O', '--optimize', action='store_true', help='Optimización peephole')
+    parser.add_argument('--one-pass', action='store_true', help='Ensamblar en una sola pasada')
+    parser.add_argument('--stream', action='store_true', help='Ensamblar en streaming')
+    parser.add_argument('-g', '--debug-info', action='store_true', help='Generar la tabla de líneas (.dbg)')
+    parser.add_argument('--auto-compress', action='store_true', help='Usar instrucciones comprimidas RV32C')
+    parser.add_argument('--hazards', action='store_true', help='Anotar los riesgos del pipeline en el listado')
+    parser.add_argument('--schedule', action='store_true', help='Reordenar instrucciones para evitar paradas load-use')
+    parser.add_argument('--data-base', type=lambda text: int(text, 0), default=None,
+                       help='Dirección base de la sección .data')
+    parser.add_argument('--ping', action='store_true', help='Comprobar si el servidor está escuchando')
+    parser.add_argument('--shutdown', action='store_true', help='Detener el servidor')
+
+    args = parser.parse_args()
+    if args.ping or args.shutdown:
+        try:
+            response = send_request({'command': 'shutdown' if args.shutdown else 'ping'}, args.socket)
+        except OSError:
+            print(f"No hay ningún servidor escuchando en {args.socket}")
+            sys.exit(1)
+        if args.ping:
+            print(f"Servidor activo (pid {response['pid']}, {response['jobs']} procesos, "
+                  f"{response['served']} peticiones atendidas)")
+        return
+    if args.input_file is None:
+        parser.error('falta el archivo de entrada')
+
+    # Rutas absolutas: el servidor puede tener otro directorio de trabajo
+    request = {'input': os.path.abspath(args.input_file), 'output': os.path.abspath(args.output),
+               'optimize': args.optimize, 'one_pass': args.one_pass, 'stream': args.stream,
+               'debug': args.debug_info, 'compress': args.auto_compress, 'hazards': args.hazards,
+               'schedule': args.schedule}
+    if args.formats is not None:
+        request['formats'] = args.formats
+    if args.data_base is not None:
+        request['data_base'] = args.data_base
+
+    response = request_assembly(request, args.socket)
+    print(response['log'], end='')
+    if not response['ok']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
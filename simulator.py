@@ -0,0 +1,698 @@
+#!/usr/bin/env python3
+"""
+Simulador RV32I para el código generado por el ensamblador RISC-V 32-bit
+Permite ejecutar programas ensamblados dentro del mismo proceso de Python
+"""
+
+import os
+import struct
+import sys
+import time
+import argparse
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from assembler import RISCVAssembler
+
+MASK = 0xFFFFFFFF
+SIGN = 0x80000000
+
+# Tamaño de memoria por defecto (1 MiB); sp empieza en el tope
+DEFAULT_MEMORY_SIZE = 1 << 20
+
+# Identificadores de operación del predecodificado, en el orden de la cadena
+# de despacho de run() (las más frecuentes primero)
+OPERATIONS = (
+    'addi', 'lw', 'sw', 'add', 'beq', 'bne', 'jal', 'jalr', 'lui', 'auipc',
+    'blt', 'bge', 'bltu', 'bgeu', 'sub', 'slli', 'srli', 'srai', 'andi', 'ori',
+    'xori', 'slti', 'sltiu', 'lb', 'lbu', 'lh', 'lhu', 'sb', 'sh',
+    'sll', 'slt', 'sltu', 'xor', 'srl', 'sra', 'or', 'and',
+    'fence', 'ecall', 'ebreak', 'nop', 'illegal',
+)
+OP = {name: index for index, name in enumerate(OPERATIONS)}
+
+(OP_ADDI, OP_LW, OP_SW, OP_ADD, OP_BEQ, OP_BNE, OP_JAL, OP_JALR, OP_LUI, OP_AUIPC,
+ OP_BLT, OP_BGE, OP_BLTU, OP_BGEU, OP_SUB, OP_SLLI, OP_SRLI, OP_SRAI, OP_ANDI, OP_ORI,
+ OP_XORI, OP_SLTI, OP_SLTIU, OP_LB, OP_LBU, OP_LH, OP_LHU, OP_SB, OP_SH,
+ OP_SLL, OP_SLT, OP_SLTU, OP_XOR, OP_SRL, OP_SRA, OP_OR, OP_AND,
+ OP_FENCE, OP_ECALL, OP_EBREAK, OP_NOP, OP_ILLEGAL) = range(len(OPERATIONS))
+
+# Operaciones que sólo escriben rd: con rd = x0 se predecodifican como nop
+_PURE_OPERATIONS = frozenset(OP[name] for name in (
+    'addi', 'add', 'lui', 'auipc', 'sub', 'slli', 'srli', 'srai', 'andi', 'ori',
+    'xori', 'slti', 'sltiu', 'sll', 'slt', 'sltu', 'xor', 'srl', 'sra', 'or', 'and',
+))
+
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+
+# Máximo de instrucciones por bloque traducido
+BLOCK_MAX = 64
+
+# Plantillas de código para la traducción por bloques. Campos: rd, rs1, rs2,
+# imm (con signo), uimm (imm en 32 bits sin signo), dest (r[rd] o _ si rd = x0)
+_BLOCK_TEMPLATES = {
+    OP['addi']: 'r[{rd}] = (r[{rs1}] + {imm}) & 0xFFFFFFFF',
+    OP['add']: 'r[{rd}] = (r[{rs1}] + r[{rs2}]) & 0xFFFFFFFF',
+    OP['sub']: 'r[{rd}] = (r[{rs1}] - r[{rs2}]) & 0xFFFFFFFF',
+    OP['lui']: 'r[{rd}] = {uimm}',
+    OP['slli']: 'r[{rd}] = (r[{rs1}] << {imm}) & 0xFFFFFFFF',
+    OP['srli']: 'r[{rd}] = r[{rs1}] >> {imm}',
+    OP['srai']: 'r[{rd}] = (((r[{rs1}] ^ 0x80000000) - 0x80000000) >> {imm}) & 0xFFFFFFFF',
+    OP['andi']: 'r[{rd}] = r[{rs1}] & {uimm}',
+    OP['ori']: 'r[{rd}] = r[{rs1}] | {uimm}',
+    OP['xori']: 'r[{rd}] = r[{rs1}] ^ {uimm}',
+    OP['slti']: 'r[{rd}] = int((r[{rs1}] ^ 0x80000000) - 0x80000000 < {imm})',
+    OP['sltiu']: 'r[{rd}] = int(r[{rs1}] < {uimm})',
+    OP['sll']: 'r[{rd}] = (r[{rs1}] << (r[{rs2}] & 0x1F)) & 0xFFFFFFFF',
+    OP['slt']: 'r[{rd}] = int((r[{rs1}] ^ 0x80000000) < (r[{rs2}] ^ 0x80000000))',
+    OP['sltu']: 'r[{rd}] = int(r[{rs1}] < r[{rs2}])',
+    OP['xor']: 'r[{rd}] = r[{rs1}] ^ r[{rs2}]',
+    OP['srl']: 'r[{rd}] = r[{rs1}] >> (r[{rs2}] & 0x1F)',
+    OP['sra']: 'r[{rd}] = (((r[{rs1}] ^ 0x80000000) - 0x80000000) >> (r[{rs2}] & 0x1F)) & 0xFFFFFFFF',
+    OP['or']: 'r[{rd}] = r[{rs1}] | r[{rs2}]',
+    OP['and']: 'r[{rd}] = r[{rs1}] & r[{rs2}]',
+    OP['lw']: '{dest} = u32(mem, (r[{rs1}] + {imm}) & 0xFFFFFFFF)[0]',
+    OP['lh']: '{dest} = ((u16(mem, (r[{rs1}] + {imm}) & 0xFFFFFFFF)[0] ^ 0x8000) - 0x8000) & 0xFFFFFFFF',
+    OP['lhu']: '{dest} = u16(mem, (r[{rs1}] + {imm}) & 0xFFFFFFFF)[0]',
+    OP['lb']: '{dest} = ((mem[(r[{rs1}] + {imm}) & 0xFFFFFFFF] ^ 0x80) - 0x80) & 0xFFFFFFFF',
+    OP['lbu']: '{dest} = mem[(r[{rs1}] + {imm}) & 0xFFFFFFFF]',
+}
+
+# Stores: (escritura, bytes escritos); la dirección está en `a`
+_STORE_TEMPLATES = {
+    OP['sw']: ('p32(mem, a, r[{rs2}])', 4),
+    OP['sh']: ('p16(mem, a, r[{rs2}] & 0xFFFF)', 2),
+    OP['sb']: ('mem[a] = r[{rs2}] & 0xFF', 1),
+}
+
+# Instrucciones que terminan un bloque además de los branches
+_BLOCK_EXITS = frozenset((OP_JAL, OP_JALR, OP_ECALL, OP_EBREAK))
+
+_BRANCH_CONDITIONS = {
+    OP['beq']: 'r[{rs1}] == r[{rs2}]',
+    OP['bne']: 'r[{rs1}] != r[{rs2}]',
+    OP['blt']: '(r[{rs1}] ^ 0x80000000) < (r[{rs2}] ^ 0x80000000)',
+    OP['bge']: '(r[{rs1}] ^ 0x80000000) >= (r[{rs2}] ^ 0x80000000)',
+    OP['bltu']: 'r[{rs1}] < r[{rs2}]',
+    OP['bgeu']: 'r[{rs1}] >= r[{rs2}]',
+}
+
+
+class SimulationError(Exception):
+    """Error de ejecución (instrucción ilegal, acceso fuera de memoria, ...)"""
+
+
+def _sign_extend(value: int, bits: int) -> int:
+    sign = 1 << (bits - 1)
+    return (value ^ sign) - sign
+
+
+def decode_word(word: int, assembler: RISCVAssembler) -> Tuple[int, int, int, int, int]:
+    """
+    Predecodifica una palabra en (op, rd, rs1, rs2, imm) con el inmediato ya
+    extendido en signo. Las palabras que no son RV32I dan OP_ILLEGAL, que sólo
+    falla si llega a ejecutarse.
+    """
+    mnemonic = assembler.decode_mnemonic(word)
+    if mnemonic is None:
+        return OP_ILLEGAL, 0, 0, 0, word - ((word & SIGN) << 1)
+
+    rd = (word >> 7) & 0x1F
+    rs1 = (word >> 15) & 0x1F
+    rs2 = (word >> 20) & 0x1F
+    kind = assembler.instructions[mnemonic]['type']
+
+    if kind == 'I':
+        imm = rs2 if mnemonic in ('slli', 'srli', 'srai') else _sign_extend(word >> 20, 12)
+    elif kind == 'S':
+        imm = _sign_extend(((word >> 25) << 5) | ((word >> 7) & 0x1F), 12)
+    elif kind == 'B':
+        imm = _sign_extend(((word >> 31) << 12) | (((word >> 7) & 0x1) << 11) |
+                           (((word >> 25) & 0x3F) << 5) | (((word >> 8) & 0xF) << 1), 13)
+    elif kind == 'U':
+        imm = _sign_extend(word & 0xFFFFF000, 32)
+    elif kind == 'J':
+        imm = _sign_extend(((word >> 31) << 20) | (((word >> 12) & 0xFF) << 12) |
+                           (((word >> 20) & 0x1) << 11) | (((word >> 21) & 0x3FF) << 1), 21)
+    else:
+        imm = 0
+
+    op = OP[mnemonic]
+    if rd == 0 and op in _PURE_OPERATIONS:
+        op = OP_NOP
+    return op, rd, rs1, rs2, imm
+
+
+class Simulator:
+    """
+    Máquina RV32I con memoria plana en un bytearray (direcciones 0..memory_size).
+    El código se copia a memoria en `base` y se predecodifica una sola vez en
+    arrays paralelos (op, rd, rs1, rs2, imm). Hay dos motores de ejecución:
+    - intérprete: despacha instrucción a instrucción sobre esos arrays; los
+      stores sobre el propio código no cambian lo que se ejecuta
+    - bloques: traduce cada bloque básico (hasta el siguiente branch, salto,
+      ecall/ebreak o BLOCK_MAX instrucciones) a una función de Python generada
+      y la guarda por PC de inicio; un store sobre un bloque en caché lo
+      invalida, así que el código automodificable se ejecuta correctamente
+
+    La ejecución termina con ecall/ebreak, al salir el PC del código (p. ej.
+    al volver con ret desde el punto de entrada, porque ra empieza apuntando
+    al final del programa) o al alcanzar el límite de pasos.
+    """
+
+    def __init__(self, words: Sequence[int], base: int = 0, entry: Optional[int] = None,
+                 memory_size: int = DEFAULT_MEMORY_SIZE, assembler: Optional[RISCVAssembler] = None):
+        if base % 4 != 0:
+            raise ValueError("La dirección base debe estar alineada a 4 bytes")
+        if base + 4 * len(words) > memory_size:
+            raise ValueError("El programa no cabe en la memoria del simulador")
+        if assembler is None:
+            assembler = RISCVAssembler(memo_size=0)
+
+        self.base = base
+        self.end = base + 4 * len(words)
+        self.memory = bytearray(memory_size)
+        code = array('I', words)
+        if sys.byteorder == 'big':
+            code.byteswap()
+        self.memory[base:self.end] = code.tobytes()
+
+        # Predecodificado en arrays paralelos
+        self.ops = array('B')
+        self.rds = array('B')
+        self.rs1s = array('B')
+        self.rs2s = array('B')
+        self.imms = array('i')
+        for word in words:
+            op, rd, rs1, rs2, imm = decode_word(word, assembler)
+            self.ops.append(op)
+            self.rds.append(rd)
+            self.rs1s.append(rs1)
+            self.rs2s.append(rs2)
+            self.imms.append(imm)
+
+        self._assembler = assembler
+
+        # Caché de bloques traducidos: pc de inicio -> (función, instrucciones)
+        self.blocks = {}
+        self._block_ends = {}
+        self._watch = [MASK, 0]  # Rango [lo, hi) cubierto por bloques traducidos
+        self.block_stats = {'translated': 0, 'invalidated': 0}
+        self._block_globals = {
+            'u16': _U16.unpack_from, 'p16': _U16.pack_into,
+            'u32': _U32.unpack_from, 'p32': _U32.pack_into,
+            'watch': self._watch, 'invalidate': self._invalidate,
+            'SimulationError': SimulationError,
+        }
+
+        self.regs = [0] * 32
+        self.regs[1] = self.end               # ra: volver del punto de entrada termina
+        self.regs[2] = memory_size & ~0xF     # sp en el tope de la memoria
+        self.pc = base if entry is None else entry
+        self.steps = 0
+        self.halted = False
+        self.reason = None
+        self.exit_code = None
+
+    @classmethod
+    def from_source(cls, lines: Sequence[str], entry: Union[str, int, None] = None,
+                    memory_size: int = DEFAULT_MEMORY_SIZE, data_base: Optional[int] = None,
+                    source_dir: str = '') -> 'Simulator':
+        """
+        Ensambla un programa y prepara su ejecución. entry puede ser un label o
+        una dirección; por defecto 'main' si existe y si no el inicio del código.
+        La sección .data se ensambla en data_base (por defecto, la mitad de la
+        memoria) y se carga allí; las rutas de .incbin son relativas a source_dir.
+        """
+        assembler = RISCVAssembler()
+        assembler.data_base = memory_size // 2 if data_base is None else data_base
+        assembler.source_dir = source_dir
+        parsed_lines = assembler.first_pass(lines)
+        if assembler.has_compressed:
+            raise ValueError("El simulador no ejecuta instrucciones comprimidas (c.*)")
+        machine_code = assembler.second_pass(parsed_lines)
+        simulator = cls(machine_code, 0, resolve_entry(entry, assembler.labels), memory_size, assembler)
+        simulator.load_data(assembler.data_base, assembler.data_image)
+        simulator.labels = dict(assembler.labels)
+        return simulator
+
+    def load_data(self, address: int, data: bytes):
+        """Copia una imagen de datos (p. ej. la sección .data) a la memoria"""
+        if address < 0 or address + len(data) > len(self.memory):
+            raise ValueError("Los datos no caben en la memoria del simulador")
+        if data and address < self.end and address + len(data) > self.base:
+            raise ValueError("Los datos se solapan con el código")
+        self.memory[address:address + len(data)] = data
+
+    def register(self, reg: Union[str, int], signed: bool = False) -> int:
+        """Valor de un registro por número o nombre (ABI o xN)"""
+        if isinstance(reg, str):
+            if reg.strip().lower() not in _ABI_NUMBERS:
+                raise ValueError(f"Registro inválido: {reg}")
+            reg = _ABI_NUMBERS[reg.strip().lower()]
+        value = self.regs[reg]
+        return value - ((value & SIGN) << 1) if signed else value
+
+    def run(self, max_steps: Optional[int] = None, blocks: bool = False) -> Dict:
+        """
+        Ejecuta hasta terminar o hasta max_steps instrucciones.
+        blocks: usar el motor de bloques traducidos en lugar del intérprete
+        Retorna un resumen: pasos ejecutados, segundos, instrucciones por segundo,
+        motivo de parada y código de salida (a0 en ecall).
+        """
+        if self.halted:
+            return self._summary(0, 0.0)
+        if blocks:
+            return self._run_blocks(max_steps)
+
+        # Indexar listas es más rápido que indexar arrays (no hay que crear el int)
+        ops, rds, rs1s, rs2s, imms = (self.ops.tolist(), self.rds.tolist(), self.rs1s.tolist(),
+                                      self.rs2s.tolist(), self.imms.tolist())
+        regs = self.regs
+        mem = self.memory
+        base = self.base
+        count = len(ops)
+        u16_unpack, u16_pack = _U16.unpack_from, _U16.pack_into
+        u32_unpack, u32_pack = _U32.unpack_from, _U32.pack_into
+        pc = self.pc
+        limit = -1 if max_steps is None else max_steps
+        steps = 0
+        reason = 'límite de pasos'
+
+        start = time.perf_counter()
+        try:
+            while steps != limit:
+                i = (pc - base) >> 2
+                if i < 0 or i >= count:
+                    reason = 'fin del programa'
+                    self.halted = True
+                    break
+                if pc & 3:
+                    raise SimulationError(f"PC desalineado: 0x{pc:08x}")
+                op = ops[i]
+                steps += 1
+
+                if op == OP_ADDI:
+                    regs[rds[i]] = (regs[rs1s[i]] + imms[i]) & MASK
+                elif op == OP_LW:
+                    regs[rds[i]] = u32_unpack(mem, (regs[rs1s[i]] + imms[i]) & MASK)[0]
+                    regs[0] = 0
+                elif op == OP_SW:
+                    u32_pack(mem, (regs[rs1s[i]] + imms[i]) & MASK, regs[rs2s[i]])
+                elif op == OP_ADD:
+                    regs[rds[i]] = (regs[rs1s[i]] + regs[rs2s[i]]) & MASK
+                elif op == OP_BEQ:
+                    if regs[rs1s[i]] == regs[rs2s[i]]:
+                        pc = (pc + imms[i]) & MASK
+                        continue
+                elif op == OP_BNE:
+                    if regs[rs1s[i]] != regs[rs2s[i]]:
+                        pc = (pc + imms[i]) & MASK
+                        continue
+                elif op == OP_JAL:
+                    regs[rds[i]] = (pc + 4) & MASK
+                    regs[0] = 0
+                    pc = (pc + imms[i]) & MASK
+                    continue
+                elif op == OP_JALR:
+                    target = (regs[rs1s[i]] + imms[i]) & 0xFFFFFFFE
+                    regs[rds[i]] = (pc + 4) & MASK
+                    regs[0] = 0
+                    pc = target
+                    continue
+                elif op == OP_LUI:
+                    regs[rds[i]] = imms[i] & MASK
+                elif op == OP_AUIPC:
+                    regs[rds[i]] = (pc + imms[i]) & MASK
+                elif op == OP_BLT:
+                    if (regs[rs1s[i]] ^ SIGN) < (regs[rs2s[i]] ^ SIGN):
+                        pc = (pc + imms[i]) & MASK
+                        continue
+                elif op == OP_BGE:
+                    if (regs[rs1s[i]] ^ SIGN) >= (regs[rs2s[i]] ^ SIGN):
+                        pc = (pc + imms[i]) & MASK
+                        continue
+                elif op == OP_BLTU:
+                    if regs[rs1s[i]] < regs[rs2s[i]]:
+                        pc = (pc + imms[i]) & MASK
+                        continue
+                elif op == OP_BGEU:
+                    if regs[rs1s[i]] >= regs[rs2s[i]]:
+                        pc = (pc + imms[i]) & MASK
+                        continue
+                elif op == OP_SUB:
+                    regs[rds[i]] = (regs[rs1s[i]] - regs[rs2s[i]]) & MASK
+                elif op == OP_SLLI:
+                    regs[rds[i]] = (regs[rs1s[i]] << imms[i]) & MASK
+                elif op == OP_SRLI:
+                    regs[rds[i]] = regs[rs1s[i]] >> imms[i]
+                elif op == OP_SRAI:
+                    regs[rds[i]] = (((regs[rs1s[i]] ^ SIGN) - SIGN) >> imms[i]) & MASK
+                elif op == OP_ANDI:
+                    regs[rds[i]] = regs[rs1s[i]] & imms[i] & MASK
+                elif op == OP_ORI:
+                    regs[rds[i]] = (regs[rs1s[i]] | imms[i]) & MASK
+                elif op == OP_XORI:
+                    regs[rds[i]] = (regs[rs1s[i]] ^ imms[i]) & MASK
+                elif op == OP_SLTI:
+                    regs[rds[i]] = int((regs[rs1s[i]] ^ SIGN) - SIGN < imms[i])
+                elif op == OP_SLTIU:
+                    regs[rds[i]] = int(regs[rs1s[i]] < (imms[i] & MASK))
+                elif op == OP_LB:
+                    regs[rds[i]] = ((mem[(regs[rs1s[i]] + imms[i]) & MASK] ^ 0x80) - 0x80) & MASK
+                    regs[0] = 0
+                elif op == OP_LBU:
+                    regs[rds[i]] = mem[(regs[rs1s[i]] + imms[i]) & MASK]
+                    regs[0] = 0
+                elif op == OP_LH:
+                    value = u16_unpack(mem, (regs[rs1s[i]] + imms[i]) & MASK)[0]
+                    regs[rds[i]] = ((value ^ 0x8000) - 0x8000) & MASK
+                    regs[0] = 0
+                elif op == OP_LHU:
+                    regs[rds[i]] = u16_unpack(mem, (regs[rs1s[i]] + imms[i]) & MASK)[0]
+                    regs[0] = 0
+                elif op == OP_SB:
+                    mem[(regs[rs1s[i]] + imms[i]) & MASK] = regs[rs2s[i]] & 0xFF
+                elif op == OP_SH:
+                    u16_pack(mem, (regs[rs1s[i]] + imms[i]) & MASK, regs[rs2s[i]] & 0xFFFF)
+                elif op == OP_SLL:
+                    regs[rds[i]] = (regs[rs1s[i]] << (regs[rs2s[i]] & 0x1F)) & MASK
+                elif op == OP_SLT:
+                    regs[rds[i]] = int((regs[rs1s[i]] ^ SIGN) < (regs[rs2s[i]] ^ SIGN))
+                elif op == OP_SLTU:
+                    regs[rds[i]] = int(regs[rs1s[i]] < regs[rs2s[i]])
+                elif op == OP_XOR:
+                    regs[rds[i]] = regs[rs1s[i]] ^ regs[rs2s[i]]
+                elif op == OP_SRL:
+                    regs[rds[i]] = regs[rs1s[i]] >> (regs[rs2s[i]] & 0x1F)
+                elif op == OP_SRA:
+                    regs[rds[i]] = (((regs[rs1s[i]] ^ SIGN) - SIGN) >> (regs[rs2s[i]] & 0x1F)) & MASK
+                elif op == OP_OR:
+                    regs[rds[i]] = regs[rs1s[i]] | regs[rs2s[i]]
+                elif op == OP_AND:
+                    regs[rds[i]] = regs[rs1s[i]] & regs[rs2s[i]]
+                elif op == OP_ECALL:
+                    reason = 'ecall'
+                    self.exit_code = regs[10]
+                    self.halted = True
+                    pc += 4
+                    break
+                elif op == OP_EBREAK:
+                    reason = 'ebreak'
+                    self.halted = True
+                    pc += 4
+                    break
+                elif op == OP_ILLEGAL:
+                    raise SimulationError(f"Instrucción ilegal 0x{imms[i] & MASK:08x} en pc=0x{pc:08x}")
+                # OP_NOP y OP_FENCE no hacen nada
+
+                pc += 4
+        except (IndexError, struct.error):
+            raise SimulationError(f"Acceso a memoria fuera de rango en pc=0x{pc:08x}")
+        finally:
+            elapsed = time.perf_counter() - start
+            self.pc = pc
+            self.steps += steps
+
+        self.reason = reason
+        return self._summary(steps, elapsed)
+
+    def _run_blocks(self, max_steps: Optional[int]) -> Dict:
+        """Motor de bloques: ejecuta funciones traducidas y cacheadas por PC"""
+        blocks = self.blocks
+        regs = self.regs
+        mem = self.memory
+        base, end = self.base, self.end
+        pc = self.pc
+        limit = -1 if max_steps is None else max_steps
+        unlimited = 1 << 62
+        steps = 0
+        reason = 'límite de pasos'
+
+        start = time.perf_counter()
+        try:
+            while steps != limit:
+                if pc < base or pc >= end:
+                    reason = 'fin del programa'
+                    self.halted = True
+                    break
+                if pc & 3:
+                    raise SimulationError(f"PC desalineado: 0x{pc:08x}")
+
+                block = blocks.get(pc)
+                if block is None:
+                    block = self._cache_block(pc)
+                function, length = block
+                budget = unlimited if limit < 0 else limit - steps
+                if length > budget:
+                    # El límite de pasos cae dentro del bloque: traducción recortada sin cachear
+                    function = self._translate(pc, budget)[0]
+
+                pc, executed, halt = function(regs, mem, budget)
+                steps += executed
+                if halt is not None:
+                    reason = halt
+                    if halt == 'ecall':
+                        self.exit_code = regs[10]
+                    self.halted = True
+                    break
+        except (IndexError, struct.error):
+            raise SimulationError(f"Acceso a memoria fuera de rango en el bloque 0x{pc:08x}")
+        finally:
+            elapsed = time.perf_counter() - start
+            self.pc = pc
+            self.steps += steps
+
+        self.reason = reason
+        return self._summary(steps, elapsed)
+
+    def _cache_block(self, pc: int) -> Tuple[Callable, int]:
+        function, length, end = self._translate(pc)
+        self.blocks[pc] = (function, length)
+        self._block_ends[pc] = end
+        self.block_stats['translated'] += 1
+        return function, length
+
+    def _translate(self, pc: int, max_length: int = BLOCK_MAX) -> Tuple[Callable, int, int]:
+        """
+        Genera la función de un bloque que empieza en pc, leyendo las palabras
+        de la memoria actual. La función recibe (regs, mem, budget) y retorna
+        (siguiente pc, instrucciones ejecutadas, motivo de parada o None).
+        Un bloque que termina en un branch hacia su propio inicio itera dentro
+        de la función mientras no supere `budget` instrucciones.
+        Retorna (función, instrucciones, dirección final del bloque).
+        """
+        decoded = []
+        address = pc
+        while len(decoded) < max_length and self.base <= address < self.end:
+            word = _U32.unpack_from(self.memory, address)[0]
+            fields = decode_word(word, self._assembler)
+            if fields[0] == OP_ILLEGAL:
+                if not decoded:
+                    source = (f"def block(r, mem, budget):\n"
+                              f"    raise SimulationError('Instrucción ilegal 0x{word:08x} en pc=0x{address:08x}')\n")
+                    address += 4
+                    decoded = None
+                break
+            decoded.append(fields)
+            address += 4
+            if fields[0] in _BRANCH_CONDITIONS or fields[0] in _BLOCK_EXITS:
+                break
+
+        # El rango leído queda vigilado: un store sobre él invalida el bloque
+        self._watch[0] = min(self._watch[0], pc)
+        self._watch[1] = max(self._watch[1], address)
+        if decoded is None:
+            return self._compile_block(pc, source), 0, address
+
+        length = len(decoded)
+        last_op, _, _, _, last_imm = decoded[-1]
+        loops = last_op in _BRANCH_CONDITIONS and address - 4 + last_imm == pc
+        count = 'n + ' if loops else ''
+
+        lines = []
+        terminated = False
+        address = pc
+        for index, (op, rd, rs1, rs2, imm) in enumerate(decoded, 1):
+            fields = {'rd': rd, 'rs1': rs1, 'rs2': rs2, 'imm': imm, 'uimm': imm & MASK,
+                      'dest': f'r[{rd}]' if rd else '_'}
+            next_pc = (address + 4) & MASK
+
+            if op in _BLOCK_TEMPLATES:
+                lines.append(_BLOCK_TEMPLATES[op].format(**fields))
+            elif op in _STORE_TEMPLATES:
+                store, size = _STORE_TEMPLATES[op]
+                lines.append(f'a = (r[{rs1}] + {imm}) & 0xFFFFFFFF')
+                lines.append(store.format(**fields))
+                # Store sobre código traducido: invalidar y salir del bloque
+                lines.append(f'if a < watch[1] and a + {size} > watch[0]:')
+                lines.append(f'    if invalidate(a, {size}): return ({next_pc}, {count}{index}, None)')
+            elif op == OP_AUIPC:
+                lines.append(f'r[{rd}] = {(address + imm) & MASK}')
+            elif op in _BRANCH_CONDITIONS:
+                condition = _BRANCH_CONDITIONS[op].format(**fields)
+                if loops:
+                    lines.append(f'n += {length}')
+                    lines.append(f'if {condition}:')
+                    lines.append(f'    if n + {length} <= budget: continue')
+                    lines.append(f'    return ({pc}, n, None)')
+                    lines.append(f'return ({next_pc}, n, None)')
+                else:
+                    lines.append(f'if {condition}: return ({(address + imm) & MASK}, {index}, None)')
+                    lines.append(f'return ({next_pc}, {index}, None)')
+                terminated = True
+            elif op == OP_JAL:
+                if rd:
+                    lines.append(f'r[{rd}] = {next_pc}')
+                lines.append(f'return ({(address + imm) & MASK}, {index}, None)')
+                terminated = True
+            elif op == OP_JALR:
+                lines.append(f't = (r[{rs1}] + {imm}) & 0xFFFFFFFE')
+                if rd:
+                    lines.append(f'r[{rd}] = {next_pc}')
+                lines.append(f'return (t, {index}, None)')
+                terminated = True
+            elif op == OP_ECALL or op == OP_EBREAK:
+                lines.append(f"return ({next_pc}, {index}, '{OPERATIONS[op]}')")
+                terminated = True
+            # OP_NOP y OP_FENCE no generan código
+
+            address += 4
+
+        if not terminated:
+            lines.append(f'return ({address}, {length}, None)')
+
+        if loops:
+            body = '    n = 0\n    while True:\n' + ''.join(f'        {line}\n' for line in lines)
+        else:
+            body = ''.join(f'    {line}\n' for line in lines)
+        return self._compile_block(pc, 'def block(r, mem, budget):\n' + body), length, address
+
+    def _compile_block(self, pc: int, source: str) -> Callable:
+        namespace = dict(self._block_globals)
+        exec(compile(source, f'<bloque 0x{pc:08x}>', 'exec'), namespace)
+        return namespace['block']
+
+    def _invalidate(self, address: int, size: int) -> bool:
+        """Descarta los bloques que contienen [address, address + size)"""
+        stale = [start for start, end in self._block_ends.items()
+                 if start < address + size and end > address]
+        for start in stale:
+            del self.blocks[start]
+            del self._block_ends[start]
+        self.block_stats['invalidated'] += len(stale)
+        return bool(stale)
+
+    def _summary(self, steps: int, elapsed: float) -> Dict:
+        return {
+            'steps': steps,
+            'seconds': elapsed,
+            'ips': steps / elapsed if elapsed > 0 else 0.0,
+            'reason': self.reason,
+            'exit_code': self.exit_code,
+            'pc': self.pc,
+        }
+
+
+# Números de registro por nombre ABI (los mismos que usa el ensamblador)
+_ABI_NUMBERS = RISCVAssembler(memo_size=0).registers
+
+ABI_NAMES = ['zero', 'ra', 'sp', 'gp', 'tp', 't0', 't1', 't2', 's0', 's1',
+             'a0', 'a1', 'a2', 'a3', 'a4', 'a5', 'a6', 'a7',
+             's2', 's3', 's4', 's5', 's6', 's7', 's8', 's9', 's10', 's11',
+             't3', 't4', 't5', 't6']
+
+
+def resolve_entry(entry: Union[str, int, None], labels: Dict[str, int]) -> int:
+    """Dirección de entrada: un label, una dirección, o 'main' si existe"""
+    if entry is None:
+        return labels.get('main', 0)
+    if isinstance(entry, int):
+        return entry
+    if entry in labels:
+        return labels[entry]
+    try:
+        return int(entry, 0)
+    except ValueError:
+        raise ValueError(f"Label no definido: {entry}")
+
+
+def load_binary(path: str) -> array:
+    """Lee un .bin generado por el ensamblador (palabras little-endian)"""
+    words = array('I')
+    with open(path, 'rb') as f:
+        words.frombytes(f.read())
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return words
+
+
+def format_registers(regs: List[int]) -> List[str]:
+    """Volcado de registros en filas de cuatro"""
+    rows = []
+    for row in range(0, 32, 4):
+        rows.append('  '.join(f"x{n:<2} {ABI_NAMES[n]:>4} = 0x{regs[n]:08x}" for n in range(row, row + 4)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulador RV32I')
+    parser.add_argument('program', help='Programa a ejecutar: fuente (.s/.asm) o binario (.bin)')
+    parser.add_argument('--steps', type=int, default=None,
+                       help='Máximo de instrucciones a ejecutar (default: sin límite)')
+    parser.add_argument('--entry', default=None,
+                       help='Label o dirección de entrada (default: main si existe, si no el inicio)')
+    parser.add_argument('--base', type=lambda text: int(text, 0), default=0,
+                       help='Dirección de carga de un .bin (default: 0)')
+    parser.add_argument('--memory', type=lambda text: int(text, 0), default=DEFAULT_MEMORY_SIZE,
+                       help=f'Tamaño de memoria en bytes (default: {DEFAULT_MEMORY_SIZE})')
+    parser.add_argument('--blocks', action='store_true',
+                       help='Ejecutar con el motor de bloques traducidos en lugar del intérprete')
+    parser.add_argument('--regs', action='store_true',
+                       help='Mostrar todos los registros al terminar')
+    parser.add_argument('--data', default=None,
+                       help='Imagen de datos (.data.bin) a cargar junto a un .bin')
+    parser.add_argument('--data-base', type=lambda text: int(text, 0), default=None,
+                       help='Dirección de la sección .data (default: la mitad de la memoria)')
+
+    args = parser.parse_args()
+    try:
+        if args.program.endswith('.bin'):
+            words = load_binary(args.program)
+            entry = resolve_entry(args.entry, {}) if args.entry is not None else args.base
+            simulator = Simulator(words, args.base, entry, args.memory)
+            if args.data is not None:
+                with open(args.data, 'rb') as f:
+                    data_base = args.memory // 2 if args.data_base is None else args.data_base
+                    simulator.load_data(data_base, f.read())
+        else:
+            with open(args.program, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            simulator = Simulator.from_source(lines, args.entry, args.memory, args.data_base,
+                                              os.path.dirname(args.program))
+
+        summary = simulator.run(args.steps, blocks=args.blocks)
+    except FileNotFoundError:
+        print(f"Error: No se pudo encontrar el archivo {args.program}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error durante la simulación: {e}")
+        sys.exit(1)
+
+    print(f"Ejecutadas {summary['steps']} instrucciones en {summary['seconds'] * 1000:.3f} ms "
+          f"({summary['ips'] / 1e6:.2f} MIPS)")
+    print(f"Parada: {summary['reason']} en pc=0x{summary['pc']:08x}")
+    if args.blocks:
+        print(f"Bloques: {simulator.block_stats['translated']} traducidos, "
+              f"{simulator.block_stats['invalidated']} invalidados")
+    if summary['exit_code'] is not None:
+        print(f"Código de salida (a0): {summary['exit_code']}")
+    print(f"a0 = {simulator.register('a0', signed=True)}")
+    if args.regs:
+        for row in format_registers(simulator.regs):
+            print(row)
+
+
+if __name__ == "__main__":
+    main()